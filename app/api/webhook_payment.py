@@ -1,15 +1,20 @@
 """Webhook endpoint для приема данных об оплатах с платформы."""
 
 import asyncio
-from asyncio import Semaphore
 import hashlib
 import hmac
-import json
 import logging
 import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable
 
-from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter, ValidationError
+from slowapi import Limiter
+from slowapi.util import get_remote_address
 
 from app.core.settings import settings
 from app.models.payment_webhook import PaymentWebhook
@@ -19,13 +24,141 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhook", tags=["webhook"])
 
+# Ограничение входящих запросов по IP клиента (подключается в app.main)
+limiter = Limiter(key_func=get_remote_address)
 
+# Секрет читается из settings один раз при импорте: байты для HMAC и фрагменты для логов
+_WEBHOOK_SECRET_BYTES = settings.WEBHOOK_SECRET.encode("utf-8")
+_WEBHOOK_SECRET_PREFIX = settings.WEBHOOK_SECRET[:5]
+_WEBHOOK_SECRET_SUFFIX = settings.WEBHOOK_SECRET[-5:]
+
+_BATCH_ADAPTER = TypeAdapter(list[PaymentWebhook])
+
+# HMAC-SHA256 в hex от PHP hash_hmac: 64 символа (регистр не важен)
+_SIGNATURE_HEX_LENGTH = 64
+_HEX_CHARS = frozenset("0123456789abcdefABCDEF")
+
+# Лимиты размера тела запроса (байт)
+_MAX_PAYMENT_BODY_BYTES = 256 * 1024
+_MAX_BATCH_BODY_BYTES = 64 * 1024 * 1024
+
+# Батчи меньше этого размера валидируются прямо в event loop (поток дороже самой валидации)
+_BATCH_INLINE_VALIDATION_MAX = 10
+
+# Размер очереди пула обработки батча (backpressure для продюсера).
+# Число воркеров задается settings.BATCH_MAX_CONCURRENCY
+_BATCH_QUEUE_SIZE = 16
+
+# Сколько batch задач может выполняться одновременно; пока все слоты заняты, новые батчи получают 429
+_BATCH_JOBS = asyncio.Semaphore(settings.MAX_CONCURRENT_BATCH_JOBS)
+
+
+@lru_cache(maxsize=1)
 def get_payment_processor() -> PaymentProcessor:
-    """Dependency injection для PaymentProcessor."""
+    """
+    Dependency injection для PaymentProcessor.
+
+    Процессор создается один раз на процесс и переиспользуется всеми запросами.
+    В тестах подменяется через app.dependency_overrides.
+    """
     return PaymentProcessor()
 
 
-def verify_hmac_signature(body: bytes, signature: str, secret: str) -> bool:
+@lru_cache(maxsize=4)
+def _keyed_hmac(key: bytes) -> hmac.HMAC:
+    """
+    Создать HMAC-SHA256 с заданным ключом без данных.
+
+    Ключ постоянный, поэтому объект создается один раз,
+    а на каждый запрос только клонируется через .copy().
+
+    Args:
+        key: Секретный ключ в байтах
+
+    Returns:
+        Объект hmac.HMAC, в который еще не передавались данные
+    """
+    return hmac.new(key, digestmod=hashlib.sha256)
+
+
+async def read_capped(
+    request: Request,
+    limit: int,
+    on_chunk: Callable[[bytes], Any] | None = None,
+) -> memoryview:
+    """
+    Прочитать тело запроса потоком с ограничением размера.
+
+    Запрос отклоняется сразу, как только прочитано больше limit байт,
+    не дожидаясь буферизации всего тела.
+
+    Args:
+        request: FastAPI Request
+        limit: Максимальный размер тела в байтах
+        on_chunk: Callback для каждого прочитанного куска (например, hash.update)
+
+    Returns:
+        memoryview над буфером с телом запроса (без копирования в bytes);
+        orjson и hashlib принимают его напрямую
+
+    Raises:
+        HTTPException: 413 если тело больше limit
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        logger.error("Request body too large: Content-Length=%s, limit=%d", content_length, limit)
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Request body exceeds limit of {limit} bytes",
+        )
+
+    buf = bytearray()
+    async for chunk in request.stream():
+        if not chunk:
+            continue
+        buf += chunk
+        if len(buf) > limit:
+            logger.error("Request body too large: more than %d bytes", limit)
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                detail=f"Request body exceeds limit of {limit} bytes",
+            )
+        if on_chunk is not None:
+            on_chunk(chunk)
+
+    return memoryview(buf)
+
+
+def is_signature_well_formed(signature: str) -> bool:
+    """
+    Проверить, что подпись похожа на HMAC-SHA256 от PHP hash_hmac.
+
+    Проверяется только форма заголовка (64 hex символа в любом регистре),
+    а не значение, поэтому постоянство времени сравнения digest не страдает.
+
+    Args:
+        signature: Подпись из заголовка
+
+    Returns:
+        True если подпись имеет корректную длину и алфавит
+    """
+    return len(signature) == _SIGNATURE_HEX_LENGTH and _HEX_CHARS.issuperset(signature)
+
+
+def new_hmac(secret: bytes) -> hmac.HMAC:
+    """
+    Создать HMAC-SHA256 для потокового хеширования тела.
+
+    Args:
+        secret: Секретный ключ
+
+    Returns:
+        Объект hmac.HMAC, в который можно передавать куски тела через update()
+    """
+    return _keyed_hmac(secret).copy()
+
+
+def verify_hmac_signature(body: bytes | memoryview, signature: str, secret: bytes, mac: hmac.HMAC | None = None) -> bool:
     """
     Проверить HMAC-SHA256 подпись запроса.
 
@@ -33,141 +166,208 @@ def verify_hmac_signature(body: bytes, signature: str, secret: str) -> bool:
     hash_hmac('sha256', json_encode($jsonBody), $key)
 
     Args:
-        body: Тело запроса (сырые байты)
+        body: Тело запроса (сырые байты или memoryview)
         signature: Подпись из заголовка (hex строка)
         secret: Секретный ключ
+        mac: HMAC из new_hmac(), уже получивший все тело
+            (если None, тело хешируется здесь)
 
     Returns:
         True если подпись верна, False если нет
     """
-    logger.debug(f"Verifying HMAC with key: {secret[:5]}...{secret[-5:]}")
-    logger.debug(f"Body length: {len(body)} bytes")
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    if debug_enabled:
+        logger.debug("Verifying HMAC with key: %r...%r", secret[:5], secret[-5:])
+        logger.debug("Body length: %d bytes", len(body))
 
-    expected_signature = hmac.new(
-        key=secret.encode("utf-8"),
-        msg=body,
-        digestmod=hashlib.sha256,
-    ).hexdigest()
+    # Проверка формы подписи до хеширования тела: O(1) для заведомо неверных заголовков
+    if not is_signature_well_formed(signature):
+        return False
+    received_digest = bytes.fromhex(signature)
 
-    logger.debug(f"Expected signature: {expected_signature}")
-    logger.debug(f"Received signature: {signature}")
+    if mac is None:
+        mac = new_hmac(secret)
+        mac.update(body)
+    expected_digest = mac.digest()
 
-    is_valid = hmac.compare_digest(expected_signature, signature)
+    is_valid = hmac.compare_digest(expected_digest, received_digest)
 
-    if is_valid:
-        logger.debug("Signatures match")
-    else:
-        logger.debug("Signatures do not match")
+    if debug_enabled:
+        logger.debug("Expected signature: %s", expected_digest.hex())
+        logger.debug("Received signature: %s", signature)
+        logger.debug("Signatures match" if is_valid else "Signatures do not match")
 
     return is_valid
 
 
+class PaymentLogSummary:
+    """Ленивое однострочное описание оплаты для логов (форматируется только при выводе)."""
+
+    __slots__ = ("payment",)
+
+    def __init__(self, payment: PaymentWebhook) -> None:
+        """
+        Инициализация описания.
+
+        Args:
+            payment: Данные об оплате
+        """
+        self.payment = payment
+
+    def __str__(self) -> str:
+        """Собрать строку с ключевыми полями оплаты."""
+        payment = self.payment
+        order = payment.course_order
+        user = order.user
+        utm = order.utm
+        return (
+            f"payment_id={payment.payment_id or 'unknown'} amount={payment.total_cost} {order.currency} "
+            f"status={order.status} user={f'{user.first_name} {user.last_name}'.strip()!r} "
+            f"phone={user.phone} email={user.email} tg_id={user.telegram_id} tg_tag={user.telegram_tag} "
+            f"subjects={payment.subjects_str!r} method={order.payment_method} "
+            f"utm={utm.source}/{utm.medium}/{utm.campaign}"
+        )
+
+
+async def process_payment_background(payload: PaymentWebhook, processor: PaymentProcessor) -> None:
+    """
+    Обработать одну оплату в фоне и залогировать результат.
+
+    Args:
+        payload: Данные об оплате
+        processor: PaymentProcessor для обработки
+    """
+    payment_id = payload.payment_id or "unknown"
+
+    try:
+        result = await processor.process_payment(payload)
+    except Exception as e:
+        logger.error("Background payment processing failed: %s - %s", payment_id, e, exc_info=True)
+        return
+
+    if result.status in ("success", "duplicate", "skipped"):
+        logger.info("Background payment processed: %s - status=%s", payment_id, result.status)
+    else:
+        logger.error(
+            "Background payment processing error: %s - status=%s, %s",
+            payment_id,
+            result.status,
+            result.error or result.message,
+        )
+
+
 @router.post("/payment")
+@limiter.limit(settings.RATE_LIMIT_PAYMENT)
 async def receive_payment_webhook(
     request: Request,
+    background_tasks: BackgroundTasks,
     x_webhook_secret: str = Header(None, alias="X-WEBHOOK-SECRET", description="HMAC-SHA256 подпись тела запроса"),
+    async_: bool = Query(False, alias="async", description="Принять оплату и обработать ее в фоне (сразу 202)"),
     processor: PaymentProcessor = Depends(get_payment_processor),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Webhook endpoint для приема данных об успешных оплатах с платформы.
 
     Аутентификация: HMAC-SHA256 подпись в заголовке X-WEBHOOK-SECRET
 
+    По умолчанию оплата обрабатывается в рамках запроса и возвращается
+    итоговый статус. С ?async=1 оплата ставится в фоновую обработку
+    (в памяти процесса, без персистентной очереди) и сразу возвращается
+    202 Accepted; результат обработки при этом попадает только в логи.
+
     Args:
         request: FastAPI Request для получения сырого тела
+        background_tasks: FastAPI background tasks для фоновой обработки
         x_webhook_secret: HMAC-SHA256 подпись тела запроса (hex строка)
+        async_: Обработать оплату в фоне (query параметр async)
         processor: PaymentProcessor для обработки оплаты (dependency injection)
 
     Returns:
-        JSONResponse с результатом обработки
+        ORJSONResponse с результатом обработки (202 при ?async=1)
 
     Raises:
         HTTPException: 401 если подпись неверная
         HTTPException: 400 если данные некорректные
+        HTTPException: 413 если тело запроса больше 256 КБ
         HTTPException: 409 если оплата уже обработана (дубликат)
         HTTPException: 404 если контакт/сделка не найдены (при CREATE_IF_NOT_FOUND=False)
         HTTPException: 500 при внутренней ошибке
     """
-    logger.info("=" * 80)
-    logger.info("Received webhook request")
-    logger.info("=" * 80)
-
-    body = await request.body()
-
-    logger.debug(f"Request body size: {len(body)} bytes")
-    logger.debug(f"Request body preview: {body[:200].decode('utf-8', errors='ignore')}...")
-
-    logger.info(f"FULL REQUEST BODY (RAW JSON):\n{body.decode('utf-8')}")
-
     if not x_webhook_secret:
         logger.error("Missing X-WEBHOOK-SECRET header")
-        logger.error("Available headers: %s", dict(request.headers))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Available headers: %s", dict(request.headers))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing X-WEBHOOK-SECRET header",
         )
 
-    logger.info(f"Received signature: {x_webhook_secret[:20]}...{x_webhook_secret[-20:]}")
-    logger.debug(f"Full signature: {x_webhook_secret}")
+    # Заведомо неверную подпись отклоняем до чтения и хеширования тела
+    if not is_signature_well_formed(x_webhook_secret):
+        logger.warning("Malformed HMAC signature: length=%d", len(x_webhook_secret))
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid HMAC signature",
+        )
+
+    # HMAC считается параллельно с чтением тела
+    body_mac = new_hmac(_WEBHOOK_SECRET_BYTES)
+    body = await read_capped(request, _MAX_PAYMENT_BODY_BYTES, body_mac.update)
 
-    logger.info("Verifying HMAC-SHA256 signature...")
-    if not verify_hmac_signature(body, x_webhook_secret, settings.WEBHOOK_SECRET):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Request body (%d bytes): %s", len(body), str(body, "utf-8", errors="replace"))
+
+    if not verify_hmac_signature(body, x_webhook_secret, _WEBHOOK_SECRET_BYTES, mac=body_mac):
         logger.warning("Invalid HMAC signature")
-        logger.warning(f"Expected key: {settings.WEBHOOK_SECRET[:5]}...{settings.WEBHOOK_SECRET[-5:]}")
+        logger.warning("Expected key: %s...%s", _WEBHOOK_SECRET_PREFIX, _WEBHOOK_SECRET_SUFFIX)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid HMAC signature",
         )
 
-    logger.info("✓ HMAC signature verified successfully")
-
     try:
-        payload_dict = json.loads(body.decode("utf-8"))
-        payload = PaymentWebhook(**payload_dict)
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON: {e}")
+        # Разбор JSON и валидация одним вызовом pydantic-core, без промежуточного dict.
+        # pydantic не принимает memoryview, поэтому передаем исходный bytearray (без копии)
+        payload = PaymentWebhook.model_validate_json(body.obj)  # type: ignore[arg-type]
+    except ValidationError as e:
+        if e.errors(include_url=False)[0]["type"] == "json_invalid":
+            logger.error("Invalid JSON: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON: {str(e)}",
+            ) from e
+        logger.error("Validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid JSON: {str(e)}",
+            detail=f"Validation error: {str(e)}",
         ) from e
     except Exception as e:
-        logger.error(f"Validation error: {e}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Validation error: {str(e)}",
         ) from e
 
     payment_id = payload.payment_id or "unknown"
-    amount = payload.total_cost
-    user_name = f"{payload.course_order.user.first_name} {payload.course_order.user.last_name}".strip()
-    phone = payload.course_order.user.phone
-    email = payload.course_order.user.email
 
-    logger.info("=" * 80)
-    logger.info("Payment webhook data parsed successfully")
-    logger.info("=" * 80)
-    logger.info(f"Payment ID: {payment_id}")
-    logger.info(f"Amount: {amount} {payload.course_order.currency}")
-    logger.info(f"Status: {payload.course_order.status}")
-    logger.info(f"User: {user_name}")
-    logger.info(f"Phone: {phone}")
-    logger.info(f"Email: {email}")
-    logger.info(f"Telegram ID: {payload.course_order.user.telegram_id or 'not provided'}")
-    logger.info(f"Telegram tag: {payload.course_order.user.telegram_tag or 'not provided'}")
-    logger.info(f"Subjects: {payload.subjects_str}")
-    logger.info(f"Payment method: {payload.course_order.payment_method or 'not specified'}")
-    logger.info(f"UTM source: {payload.course_order.utm.source or 'not specified'}")
-    logger.info(f"UTM medium: {payload.course_order.utm.medium or 'not specified'}")
-    logger.info(f"UTM campaign: {payload.course_order.utm.campaign or 'not specified'}")
-    logger.info("=" * 80)
+    # Одна запись на запрос; строка собирается, только если INFO включен
+    logger.info("Payment webhook verified: %s", PaymentLogSummary(payload))
+
+    if async_:
+        background_tasks.add_task(process_payment_background, payload, processor)
+        logger.info("Payment accepted for background processing: %s", payment_id)
+        return ORJSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "accepted", "payment_id": payment_id},
+        )
 
     logger.info("Starting payment processing...")
     result = await processor.process_payment(payload)
-    logger.info(f"Payment processing completed: status={result.status}")
+    logger.info("Payment processing completed: status=%s", result.status)
 
     if result.status == "success":
-        logger.info(f"Payment processed successfully: contact_id={result.contact_id}, lead_id={result.lead_id}")
-        return JSONResponse(
+        logger.info("Payment processed successfully: contact_id=%s, lead_id=%s", result.contact_id, result.lead_id)
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 "status": "success",
@@ -179,29 +379,29 @@ async def receive_payment_webhook(
         )
 
     if result.status == "duplicate":
-        logger.warning(f"Payment duplicate detected: {payment_id}")
+        logger.warning("Payment duplicate detected: %s", payment_id)
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail=result.message,
         )
 
     if result.status == "contact_not_found":
-        logger.error(f"Contact not found for payment: {payment_id}")
+        logger.error("Contact not found for payment: %s", payment_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=result.message,
         )
 
     if result.status == "lead_not_found":
-        logger.error(f"Lead not found for payment: {payment_id}")
+        logger.error("Lead not found for payment: %s", payment_id)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=result.message,
         )
 
     if result.status == "skipped":
-        logger.info(f"Payment skipped: {payment_id} - {result.message}")
-        return JSONResponse(
+        logger.info("Payment skipped: %s - %s", payment_id, result.message)
+        return ORJSONResponse(
             status_code=status.HTTP_202_ACCEPTED,
             content={
                 "status": "skipped",
@@ -210,7 +410,7 @@ async def receive_payment_webhook(
             },
         )
 
-    logger.error(f"Payment processing error: {payment_id} - {result.error}")
+    logger.error("Payment processing error: %s - %s", payment_id, result.error)
     raise HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail=result.error or "Internal server error",
@@ -224,13 +424,14 @@ async def process_payment_batch_parallel(
     """
     Параллельная обработка батча оплат с контролем rate limit.
 
-    Использует asyncio.gather для параллельной обработки с ограничением
-    через Semaphore для соблюдения rate limit AmoCRM (7 запросов/сек).
+    Оплаты обрабатывает пул из нескольких воркеров, читающих ограниченную
+    очередь, поэтому одновременно выполняются только оплаты в работе
+    и в очереди, а статистика считается по мере завершения. Частоту запросов
+    к AmoCRM (7 запросов/сек) ограничивает общий token bucket в AmoCRMClient.
 
     Каждая оплата делает ~6 API запросов (матчинг + обновление).
-    Semaphore(1) = 1 оплата одновременно = ~6 запросов/сек (безопасно).
 
-    Для 1000 оплат время обработки: ~60-70 минут.
+    Для 1000 оплат время обработки: ~15-20 минут.
 
     Args:
         payments: Список оплат для обработки
@@ -240,8 +441,12 @@ async def process_payment_batch_parallel(
         Результаты обработки с детальной статистикой
     """
     logger.info("=" * 80)
-    logger.info(f"Starting PARALLEL batch processing: {len(payments)} payments")
-    logger.info(f"Rate limit: 1 concurrent task (AmoCRM safe mode: ~6 req/sec)")
+    logger.info("Starting PARALLEL batch processing: %d payments", len(payments))
+    logger.info(
+        "Concurrency: %d workers, AmoCRM rate limit: %s req/sec",
+        settings.BATCH_MAX_CONCURRENCY,
+        settings.AMO_RATE_LIMIT_PER_SECOND,
+    )
     logger.info("=" * 80)
 
     if not payments:
@@ -258,13 +463,13 @@ async def process_payment_batch_parallel(
             "results": [],
         }
 
-    semaphore = Semaphore(2)
+    total = len(payments)
 
     start_time = time.time()
 
     async def process_one(payment: PaymentWebhook, idx: int) -> dict:
         """
-        Обработать одну оплату с ограничением через semaphore.
+        Обработать одну оплату.
 
         Args:
             payment: Данные об оплате
@@ -273,102 +478,130 @@ async def process_payment_batch_parallel(
         Returns:
             Результат обработки
         """
-        async with semaphore:
-            payment_id = payment.payment_id or f"batch_{idx}"
+        payment_id = payment.payment_id or f"batch_{idx}"
+
+        try:
+            logger.info(
+                "[%d/%d] Processing payment_id=%s, amount=%s, user=%s",
+                idx,
+                total,
+                payment_id,
+                payment.total_cost,
+                payment.course_order.user.phone,
+            )
 
-            try:
+            result = await processor.process_payment(payment)
+
+            if result.status == "success":
                 logger.info(
-                    f"[{idx}/{len(payments)}] Processing payment_id={payment_id}, "
-                    f"amount={payment.total_cost}, user={payment.course_order.user.phone}"
+                    "[%d/%d] ✓ SUCCESS: %s -> contact %s, lead %s",
+                    idx,
+                    total,
+                    payment_id,
+                    result.contact_id,
+                    result.lead_id,
                 )
+                return {
+                    "payment_id": payment_id,
+                    "status": "success",
+                    "contact_id": result.contact_id,
+                    "lead_id": result.lead_id,
+                }
 
-                result = await processor.process_payment(payment)
-
-                if result.status == "success":
-                    logger.info(
-                        f"[{idx}/{len(payments)}] ✓ SUCCESS: {payment_id} -> "
-                        f"contact {result.contact_id}, lead {result.lead_id}"
-                    )
-                    return {
-                        "payment_id": payment_id,
-                        "status": "success",
-                        "contact_id": result.contact_id,
-                        "lead_id": result.lead_id,
-                    }
-
-                elif result.status == "duplicate":
-                    logger.info(f"[{idx}/{len(payments)}] ⊗ DUPLICATE: {payment_id}")
-                    return {
-                        "payment_id": payment_id,
-                        "status": "duplicate",
-                        "message": result.message,
-                    }
-
-                elif result.status == "skipped":
-                    logger.info(f"[{idx}/{len(payments)}] ⊘ SKIPPED: {payment_id} - {result.message}")
-                    return {
-                        "payment_id": payment_id,
-                        "status": "skipped",
-                        "message": result.message,
-                    }
-
-                else:
-                    logger.warning(f"[{idx}/{len(payments)}] ⚠ {result.status.upper()}: {payment_id} - {result.message}")
-                    return {
-                        "payment_id": payment_id,
-                        "status": result.status,
-                        "message": result.message,
-                    }
-
-            except Exception as e:
-                logger.error(
-                    f"[{idx}/{len(payments)}] ✗ ERROR processing {payment_id}: {e}",
-                    exc_info=True,
-                )
+            elif result.status == "duplicate":
+                logger.info("[%d/%d] ⊗ DUPLICATE: %s", idx, total, payment_id)
                 return {
                     "payment_id": payment_id,
-                    "status": "error",
-                    "error": str(e),
+                    "status": "duplicate",
+                    "message": result.message,
                 }
 
-    logger.info("Starting parallel execution...")
+            elif result.status == "skipped":
+                logger.info("[%d/%d] ⊘ SKIPPED: %s - %s", idx, total, payment_id, result.message)
+                return {
+                    "payment_id": payment_id,
+                    "status": "skipped",
+                    "message": result.message,
+                }
 
-    all_results = await asyncio.gather(
-        *[process_one(payment, idx) for idx, payment in enumerate(payments, start=1)],
-        return_exceptions=True,
-    )
+            else:
+                logger.warning("[%d/%d] ⚠ %s: %s - %s", idx, total, result.status.upper(), payment_id, result.message)
+                return {
+                    "payment_id": payment_id,
+                    "status": result.status,
+                    "message": result.message,
+                }
+
+        except Exception as e:
+            logger.error(
+                "[%d/%d] ✗ ERROR processing %s: %s",
+                idx,
+                total,
+                payment_id,
+                e,
+                exc_info=True,
+            )
+            return {
+                "payment_id": payment_id,
+                "status": "error",
+                "error": str(e),
+            }
+
+    status_counts: Counter[str] = Counter()
+    # Результаты по каждой оплате в порядке входного списка
+    results: list[dict] = [{"payment_id": None, "status": "error", "error": "not processed"}] * total
+
+    queue: asyncio.Queue[tuple[int, PaymentWebhook] | None] = asyncio.Queue(maxsize=_BATCH_QUEUE_SIZE)
+
+    async def worker() -> None:
+        """Забирать оплаты из очереди и сразу учитывать результат в счетчиках."""
+        payment: PaymentWebhook | None
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+
+                idx, payment = item
+                # Не держим ссылку на модель оплаты дольше, чем нужно для обработки
+                item = None
+                result = await process_one(payment, idx)
+                payment = None
+
+                results[idx - 1] = result
+                status_counts[result["status"]] += 1
+            finally:
+                queue.task_done()
+
+    logger.info("Starting parallel execution...")
 
-    succeeded = 0
-    failed = 0
-    duplicates = 0
-    skipped = 0
-    results = []
-
-    for result in all_results:
-        if isinstance(result, dict):
-            results.append(result)
-            result_status = result.get("status")
-            if result_status == "success":
-                succeeded += 1
-            elif result_status == "duplicate":
-                duplicates += 1
-            elif result_status == "skipped":
-                skipped += 1
-            elif result_status in ("error", "contact_not_found", "lead_not_found"):
-                failed += 1
-        elif isinstance(result, Exception):
-            logger.error(f"Unhandled exception in task: {result}")
-            failed += 1
-            results.append({"payment_id": None, "status": "error", "error": str(result)})
+    workers = [asyncio.create_task(worker()) for _ in range(min(settings.BATCH_MAX_CONCURRENCY, len(payments)))]
+    try:
+        for idx, payment in enumerate(payments, start=1):
+            await queue.put((idx, payment))
+        for _ in workers:
+            await queue.put(None)
+
+        for worker_result in await asyncio.gather(*workers, return_exceptions=True):
+            if isinstance(worker_result, Exception):
+                logger.error("Unhandled exception in worker: %s", worker_result)
+    finally:
+        for task in workers:
+            task.cancel()
+
+    succeeded = status_counts["success"]
+    duplicates = status_counts["duplicate"]
+    skipped = status_counts["skipped"]
+    failed = status_counts["error"] + status_counts["contact_not_found"] + status_counts["lead_not_found"]
 
     elapsed_time = time.time() - start_time
     items_per_sec = len(payments) / elapsed_time if elapsed_time > 0 else 0
 
     logger.info("=" * 80)
     logger.info("PARALLEL batch processing COMPLETED")
-    logger.info(f"Total time: {elapsed_time:.1f} seconds ({elapsed_time/60:.1f} minutes)")
-    logger.info(f"Speed: {items_per_sec:.2f} payments/sec")
-    logger.info(f"Results: {succeeded} succeeded, {duplicates} duplicates, {skipped} skipped, {failed} failed")
+    logger.info("Total time: %.1f seconds (%.1f minutes)", elapsed_time, elapsed_time / 60)
+    logger.info("Speed: %.2f payments/sec", items_per_sec)
+    logger.info("Results: %d succeeded, %d duplicates, %d skipped, %d failed", succeeded, duplicates, skipped, failed)
     logger.info("=" * 80)
 
     return {
@@ -386,12 +619,31 @@ async def process_payment_batch_parallel(
     }
 
 
+async def run_payment_batch_job(payments: list[PaymentWebhook], processor: PaymentProcessor) -> None:
+    """
+    Выполнить batch задачу в слоте _BATCH_JOBS.
+
+    Слот занимает сама задача, а не обработчик запроса: если фоновая задача
+    не запустится (например, клиент отключился до отправки ответа), слот не теряется.
+
+    Args:
+        payments: Список оплат для обработки
+        processor: PaymentProcessor для обработки
+    """
+    async with _BATCH_JOBS:
+        try:
+            await process_payment_batch_parallel(payments, processor)
+        except Exception as e:
+            logger.error("Batch job failed: %s", e, exc_info=True)
+
+
 @router.post("/payment-batch")
+@limiter.limit(settings.RATE_LIMIT_BATCH)
 async def receive_payment_batch(
     request: Request,
     background_tasks: BackgroundTasks,
     processor: PaymentProcessor = Depends(get_payment_processor),
-) -> JSONResponse:
+) -> ORJSONResponse:
     """
     Batch endpoint для массовой обработки оплат (до 1000 за раз).
 
@@ -409,21 +661,19 @@ async def receive_payment_batch(
         processor: PaymentProcessor для обработки оплат (dependency injection)
 
     Returns:
-        JSONResponse с подтверждением принятия задачи
+        ORJSONResponse с подтверждением принятия задачи
 
     Raises:
         HTTPException: 400 если данные некорректные или батч > 1000
+        HTTPException: 413 если тело запроса больше 64 МБ
+        HTTPException: 429 если уже выполняется максимум batch задач
     """
-    logger.info("=" * 80)
-    logger.info("Received BATCH webhook request (no HMAC)")
-    logger.info("=" * 80)
+    body = await read_capped(request, _MAX_BATCH_BODY_BYTES)
 
-    body = await request.body()
-
-    logger.debug(f"Request body size: {len(body)} bytes")
+    logger.debug("Request body size: %d bytes", len(body))
 
     try:
-        payload_list = json.loads(body.decode("utf-8"))
+        payload_list = orjson.loads(body)
 
         if not isinstance(payload_list, list):
             logger.error("Expected array of payments, got single object")
@@ -433,16 +683,20 @@ async def receive_payment_batch(
             )
 
         if len(payload_list) > 1000:
-            logger.error(f"Batch size {len(payload_list)} exceeds limit of 1000")
+            logger.error("Batch size %d exceeds limit of 1000", len(payload_list))
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Batch size exceeds limit of 1000 payments",
             )
 
-        payments = [PaymentWebhook(**item) for item in payload_list]
+        if len(payload_list) < _BATCH_INLINE_VALIDATION_MAX:
+            payments = _BATCH_ADAPTER.validate_python(payload_list)
+        else:
+            # Валидация большого батча занимает CPU надолго - не блокируем event loop
+            payments = await asyncio.to_thread(_BATCH_ADAPTER.validate_python, payload_list)
 
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON: {e}")
+    except orjson.JSONDecodeError as e:
+        logger.error("Invalid JSON: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid JSON: {str(e)}",
@@ -450,23 +704,28 @@ async def receive_payment_batch(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Validation error: {e}")
+        logger.error("Validation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Validation error: {str(e)}",
         ) from e
 
-    logger.info("=" * 80)
-    logger.info(f"Batch validation successful: {len(payments)} payments")
-    logger.info("=" * 80)
+    logger.info("Batch validation successful: %d payments", len(payments))
+
+    if _BATCH_JOBS.locked():
+        logger.warning("Too many batch jobs in progress, rejecting batch of %d payments", len(payments))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many batch jobs in progress, retry later",
+        )
 
-    background_tasks.add_task(process_payment_batch_parallel, payments, processor)
+    background_tasks.add_task(run_payment_batch_job, payments, processor)
 
     estimated_minutes = len(payments) * 4 / 60
 
-    logger.info(f"Task accepted for background processing. Estimated time: {estimated_minutes:.1f} minutes")
+    logger.info("Task accepted for background processing. Estimated time: %.1f minutes", estimated_minutes)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={
             "status": "accepted",
@@ -479,15 +738,15 @@ async def receive_payment_batch(
 
 
 @router.get("/health")
-async def health_check() -> JSONResponse:
+async def health_check() -> ORJSONResponse:
     """
     Health check endpoint для мониторинга работоспособности сервиса.
 
     Returns:
-        JSONResponse со статусом сервиса
+        ORJSONResponse со статусом сервиса
     """
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_200_OK,
         content={
             "status": "healthy",
@@ -1,40 +1,570 @@
 """Клиент для работы с AmoCRM API."""
 
+# Горячий путь синхронизации: логирование только с отложенным %-форматированием
+# pylint: enable=logging-fstring-interpolation
+
+import asyncio
+import copy
 import logging
-from datetime import datetime
-from typing import Any
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import partial
+from typing import Any, cast
 
 import httpx
+import orjson
 from tenacity import (
-    AsyncRetrying,
+    RetryCallState,
+    retry,
+    retry_if_exception,
     retry_if_exception_type,
     stop_after_attempt,
-    wait_exponential,
+    wait_random_exponential,
 )
 
 from app.core.amocrm_mappings import (
     ALLOWED_PIPELINES,
     EXCLUDED_STATUSES,
+    OP_EXCLUDED_STATUSES,
+    OP_PIPELINES,
+    PAYMENT_LEAD_NAMES,
+    PAYMENT_NAME_EXCLUDED_STATUSES,
+    PAYMENT_NAME_PIPELINES,
     normalize_phone,
 )
+from app.core.rate_limiter import AdaptiveLimiter, AsyncTokenBucket
 from app.core.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Общий bucket на процесс: лимит AmoCRM считается на аккаунт, а не на экземпляр клиента
+_RATE_LIMITER = AsyncTokenBucket(rate=settings.AMO_RATE_LIMIT_PER_SECOND)
+
+# Full-jitter backoff: задержка случайна в [0, min(max, multiplier * 2^n)],
+# поэтому параллельные запросы после 429 не повторяются синхронно
+_RETRY_WAIT = wait_random_exponential(multiplier=settings.RETRY_WAIT_MIN, max=settings.RETRY_WAIT_MAX)
+
+
+# Одновременные запросы к AmoCRM; лимит снижается при частых 429 и восстанавливается после
+_CONCURRENCY_LIMITER = AdaptiveLimiter(settings.AMO_MAX_CONCURRENCY)
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """Проверить, что ошибка - ответ 429 Too Many Requests от AmoCRM."""
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+
+# Временные ошибки сервера AmoCRM, после которых запрос имеет смысл повторить; прочие 4xx/5xx не повторяются
+_RETRYABLE_SERVER_ERRORS = frozenset({500, 502, 503, 504})
+
+# При 5xx повторяются только эти методы: POST мог быть выполнен AmoCRM до ошибки,
+# и повтор создал бы дубль сделки, контакта, примечания или задачи
+_IDEMPOTENT_METHODS = frozenset({"GET", "PATCH"})
+
+
+def _is_retryable_status(error: BaseException) -> bool:
+    """Проверить, что ошибка - ответ 429 или временная ошибка сервера (5xx) на идемпотентный запрос."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False
+    status_code = error.response.status_code
+    return status_code == 429 or (
+        status_code in _RETRYABLE_SERVER_ERRORS and error.request.method in _IDEMPOTENT_METHODS
+    )
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """
+    Разобрать заголовок Retry-After.
+
+    Args:
+        value: Значение заголовка (секунды или HTTP-дата)
+
+    Returns:
+        Задержка в секундах или None, если заголовок отсутствует или некорректен
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _wait_retry_after_or_jitter(retry_state: RetryCallState) -> float:
+    """
+    Задержка перед повтором: Retry-After из ответа (429/5xx), иначе full-jitter backoff.
+
+    Задержка из Retry-After ограничена RETRY_WAIT_MAX, чтобы не держать воркер слишком долго.
+    """
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    if error is not None and _is_retryable_status(error):
+        retry_after = _parse_retry_after(error.response.headers.get("Retry-After"))  # type: ignore[attr-defined]
+        if retry_after is not None:
+            delay = min(retry_after, float(settings.RETRY_WAIT_MAX))
+            logger.warning("Retrying AmoCRM request in %.1f s (source: retry-after)", delay)
+            return delay
+
+    delay = float(_RETRY_WAIT(retry_state))
+    logger.warning("Retrying AmoCRM request in %.1f s (source: computed)", delay)
+    return delay
+
+
+# Кэш GET запросов в рамках одной синхронизации (см. AmoCRMClient.request_scope).
+# ContextVar, а не атрибут клиента: один клиент обслуживает параллельные оплаты,
+# и их кэши не должны пересекаться
+_REQUEST_CACHE: ContextVar[dict[tuple[str, str], asyncio.Task[dict[str, Any]]] | None] = ContextVar(
+    "amocrm_request_cache", default=None
+)
+
+
+# Сущности, данные которых видны друг через друга: поиск сделок по query ищет и по полям
+# контактов, а сделки отдают привязанные контакты. Запись в одну сбрасывает кэш обеих
+_LINKED_COLLECTIONS = frozenset({"leads", "contacts"})
+
+
+def _collection_of(endpoint: str) -> str:
+    """Получить коллекцию API из endpoint: /api/v4/leads/1/notes -> leads."""
+    parts = endpoint.split("/", 4)
+    return parts[3] if len(parts) > 3 else endpoint
+
+
+def _invalidate_request_cache(endpoint: str) -> None:
+    """
+    Сбросить кэш GET текущей request_scope для коллекции, в которую идет запись.
+
+    Ответы других коллекций остаются в кэше: например, создание задачи
+    не делает устаревшими уже полученные сделки и контакты.
+
+    Args:
+        endpoint: Endpoint POST/PATCH запроса
+    """
+    cache = _REQUEST_CACHE.get()
+    if not cache:
+        return
+
+    collection = _collection_of(endpoint)
+    affected = _LINKED_COLLECTIONS if collection in _LINKED_COLLECTIONS else frozenset({collection})
+    for key in [key for key in cache if _collection_of(key[0]) in affected]:
+        del cache[key]
+
+
+def _first_field_value(field: dict[str, Any] | None) -> Any:
+    """
+    Получить первое значение кастомного поля AmoCRM.
+
+    Args:
+        field: Элемент custom_fields_values или None
+
+    Returns:
+        values[0]["value"] или None, если поля нет или оно пустое
+    """
+    if not field or not field.get("values"):
+        return None
+    return field["values"][0]["value"]
+
+
+def _simple_field(field_id: int, value: Any) -> dict[str, Any]:
+    """
+    Собрать элемент custom_fields_values с одним значением.
+
+    Args:
+        field_id: ID кастомного поля
+        value: Значение поля
+
+    Returns:
+        {"field_id": field_id, "values": [{"value": value}]}
+    """
+    return {"field_id": field_id, "values": [{"value": value}]}
+
+
+# Простые текстовые поля сделки в порядке аргументов _lead_text_fields: (название для логов, field_id)
+_LEAD_TEXT_FIELDS = (
+    ("UTM source", settings.AMO_LEAD_FIELD_UTM_SOURCE),
+    ("UTM medium", settings.AMO_LEAD_FIELD_UTM_MEDIUM),
+    ("UTM campaign", settings.AMO_LEAD_FIELD_UTM_CAMPAIGN),
+    ("UTM content", settings.AMO_LEAD_FIELD_UTM_CONTENT),
+    ("UTM term", settings.AMO_LEAD_FIELD_UTM_TERM),
+    ("Yandex Metrika UID", settings.AMO_LEAD_FIELD_YM_UID),
+    ("referrer (domain)", settings.AMO_LEAD_FIELD_REFERRER),
+)
+
+
+def _lead_text_fields(values: tuple[str | None, ...], action: str) -> list[dict[str, Any]]:
+    """
+    Собрать custom_fields_values для простых текстовых полей сделки.
+
+    Args:
+        values: Значения в порядке _LEAD_TEXT_FIELDS (utm_source, utm_medium, utm_campaign,
+            utm_content, utm_term, ym_uid, domain); пустые пропускаются
+        action: Глагол для логов ("Adding" / "Updating")
+
+    Returns:
+        Элементы custom_fields_values для непустых значений
+    """
+    filled = [(label, field_id, value) for (label, field_id), value in zip(_LEAD_TEXT_FIELDS, values) if value]
+    if filled and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s lead text fields: %s", action, {label: value for label, _, value in filled})
+    return [_simple_field(field_id, value) for _, field_id, value in filled]
+
+
+def _contact_fields(
+    phone: str | None, email: str | None, tg_id: str | None, tg_username: str | None
+) -> list[dict[str, Any]]:
+    """
+    Собрать custom_fields_values контакта (телефон, email, telegram).
+
+    Args:
+        phone: Телефон (записывается как есть)
+        email: Email
+        tg_id: Telegram ID
+        tg_username: Telegram username
+
+    Returns:
+        Элементы custom_fields_values для непустых значений
+    """
+    fields: list[dict[str, Any]] = []
+    if phone:
+        fields.append({"field_code": "PHONE", "values": [{"value": phone, "enum_code": "WORK"}]})
+    if email:
+        fields.append({"field_code": "EMAIL", "values": [{"value": email, "enum_code": "WORK"}]})
+    if tg_id:
+        fields.append(_simple_field(settings.AMO_CONTACT_FIELD_TG_ID, tg_id))
+    if tg_username:
+        fields.append(_simple_field(settings.AMO_CONTACT_FIELD_TG_USERNAME, tg_username))
+    return fields
+
+
+def _strip_or_none(value: str | None) -> str | None:
+    """Убрать пробелы по краям; пустую строку превратить в None."""
+    if value is None:
+        return None
+    return value.strip() or None
+
+
+def _merge_unique_by_id(groups: list[list[dict[str, Any]]]) -> list[dict[str, Any]]:
+    """
+    Объединить результаты нескольких поисков без дубликатов по id.
+
+    Дубликаты отбрасываются сразу при вставке, без промежуточного общего списка;
+    сохраняется порядок первого появления.
+
+    Args:
+        groups: Результаты поисков (сущность может встречаться в нескольких)
+
+    Returns:
+        Список уникальных сущностей
+    """
+    by_id: dict[Any, dict[str, Any]] = {}
+    for group in groups:
+        for entity in group:
+            by_id.setdefault(entity["id"], entity)
+    return list(by_id.values())
+
+
+# Максимум сущностей в одном объединенном PATCH
+_PATCH_BATCH_MAX = 50
+
+
+class _PatchCoalescer:
+    """
+    Объединение PATCH запросов одной коллекции (/api/v4/leads, /api/v4/contacts).
+
+    AmoCRM принимает список сущностей в PATCH коллекции, поэтому обновления,
+    пришедшие от параллельных оплат в течение короткого окна, отправляются
+    одним запросом. Каждый вызывающий ждет результата своего батча.
+    Если батч из нескольких сущностей отклонен, сущности отправляются
+    по одной, чтобы ошибка досталась только виновнику.
+    Несколько обновлений одной сущности в один запрос не попадают:
+    они уходят последовательными запросами в порядке поступления.
+    """
+
+    def __init__(
+        self, endpoint: str, window: float, send: Callable[[list[dict[str, Any]]], Awaitable[Any]]
+    ) -> None:
+        """
+        Инициализация.
+
+        Args:
+            endpoint: Endpoint коллекции (например, /api/v4/leads), для логов
+            window: Сколько секунд копить обновления перед отправкой
+            send: Отправка PATCH коллекции со списком сущностей
+        """
+        self._send = send
+        self._endpoint = endpoint
+        self._window = window
+        self._pending: list[tuple[dict[str, Any], asyncio.Future[None]]] = []
+        self._timer: asyncio.Task[None] | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def submit(self, entity: dict[str, Any]) -> None:
+        """
+        Поставить обновление сущности в очередь и дождаться его отправки.
+
+        Args:
+            entity: Данные сущности с ключом id
+
+        Raises:
+            httpx.HTTPError: Если AmoCRM отклонил обновление
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending = []
+            self._timer = None
+            self._flushes = set()
+            self._loop = loop
+
+        future: asyncio.Future[None] = loop.create_future()
+        self._pending.append((entity, future))
+
+        if len(self._pending) >= _PATCH_BATCH_MAX:
+            batch, self._pending = self._pending, []
+            flush = asyncio.ensure_future(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+        await future
+
+    async def _flush_later(self) -> None:
+        """Отправить накопленные обновления по истечении окна."""
+        await asyncio.sleep(self._window)
+        self._timer = None
+        batch, self._pending = self._pending, []
+        await self._flush(batch)
+
+    async def _flush(self, batch: list[tuple[dict[str, Any], asyncio.Future[None]]]) -> None:
+        """
+        Отправить батч и разбудить ожидающих.
+
+        Повторные обновления одной сущности переносятся в следующие запросы,
+        чтобы AmoCRM применил их по порядку, а не одно поверх другого в одном PATCH.
+
+        Args:
+            batch: Пары (сущность, future вызывающего)
+        """
+        rounds: list[list[tuple[dict[str, Any], asyncio.Future[None]]]] = []
+        occurrences: dict[Any, int] = {}
+        for item in batch:
+            entity_id = item[0].get("id")
+            index = occurrences.get(entity_id, 0)
+            occurrences[entity_id] = index + 1
+            if index == len(rounds):
+                rounds.append([])
+            rounds[index].append(item)
+
+        for round_batch in rounds:
+            await self._send_batch(round_batch)
+
+    async def _send_batch(self, batch: list[tuple[dict[str, Any], asyncio.Future[None]]]) -> None:
+        """
+        Отправить сущности (каждая не более одного раза) одним PATCH и разбудить ожидающих.
+
+        Args:
+            batch: Пары (сущность, future вызывающего)
+        """
+        if not batch:
+            return
+
+        if len(batch) > 1:
+            logger.info("Sending %d coalesced updates to %s", len(batch), self._endpoint)
+            try:
+                await self._send([entity for entity, _ in batch])
+            except Exception as e:
+                logger.warning("Coalesced PATCH to %s failed (%s), retrying one by one", self._endpoint, e)
+            else:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                return
+
+        for entity, future in batch:
+            try:
+                await self._send([entity])
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(None)
+
+
+# Политика повторов строится один раз при импорте: 2 попытки (снижено с 3),
+# повторяются только сетевые ошибки, 429 и временные 5xx, остальные HTTP статусы - нет
+_AMO_RETRY = retry(
+    stop=stop_after_attempt(2),
+    wait=_wait_retry_after_or_jitter,
+    retry=retry_if_exception_type(httpx.RequestError) | retry_if_exception(_is_retryable_status),
+    reraise=True,
+)
+
+
+# Максимум записей в кэше найденных контактов; при переполнении вытесняется самая старая
+_CONTACT_CACHE_MAX = 4096
+
+# Максимум сделок в одном ответе AmoCRM (limit); больше ID при проверке делится на части
+_LEADS_PAGE_LIMIT = 250
+
 
 class AmoCRMClient:
     """Клиент для взаимодействия с AmoCRM API."""
 
-    def __init__(self) -> None:
-        """Инициализация клиента AmoCRM."""
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        """
+        Инициализация клиента AmoCRM.
+
+        Args:
+            transport: HTTP транспорт для httpx (опционально для тестов)
+        """
         self.base_url = settings.AMO_BASE_URL
         self.access_token = settings.AMO_ACCESS_TOKEN
         self.headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
         }
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._coalescers: dict[str, _PatchCoalescer] = {}
+        # Найденные контакты по значению query: value -> (time.monotonic() сохранения, контакт)
+        self._contact_cache: dict[str, tuple[float, dict[str, Any]]] = {}
+        # GET поиска контакта, которые выполняются прямо сейчас: value -> задача запроса
+        self._contact_inflight: dict[str, asyncio.Task[dict[str, Any]]] = {}
+        # Сколько вызовов ждут каждую задачу запроса (без ожидающих задача отменяется)
+        self._contact_waiters: dict[asyncio.Task[dict[str, Any]], int] = {}
+        # То же для задач GET в кэше request_scope
+        self._request_waiters: dict[asyncio.Task[dict[str, Any]], int] = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Получить общий HTTP клиент, создав его при первом обращении.
+
+        Один клиент на экземпляр держит пул соединений с keep-alive,
+        поэтому TCP+TLS handshake не повторяется на каждый запрос.
+        Все запросы идут на один хост, поэтому включен HTTP/2: параллельные
+        запросы мультиплексируются в одном соединении.
+
+        Returns:
+            httpx.AsyncClient с базовым URL и заголовками AmoCRM
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=30.0,
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=300),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Закрыть HTTP клиент и пул соединений."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "AmoCRMClient":
+        """Использовать клиент в async with."""
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Закрыть HTTP клиент при выходе из async with."""
+        await self.aclose()
+
+    @asynccontextmanager
+    async def request_scope(self) -> AsyncIterator[None]:
+        """
+        Область синхронизации одной оплаты с дедупликацией GET запросов.
+
+        Внутри области одинаковые GET запросы (endpoint + параметры) выполняются
+        один раз: параллельные вызовы ждут тот же запрос, последующие получают
+        готовый ответ. POST/PATCH сбрасывает кэш затронутой коллекции, чтобы не отдавать
+        устаревшие данные. Вложенные области используют внешний кэш.
+        """
+        if _REQUEST_CACHE.get() is not None:
+            yield
+            return
+
+        token = _REQUEST_CACHE.set({})
+        try:
+            yield
+        finally:
+            _REQUEST_CACHE.reset(token)
 
     async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: dict[str, Any] | list[dict[str, Any]] | None = None,
+        send: Callable[[], Awaitable[dict[str, Any]]] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Выполнить HTTP запрос к AmoCRM API (с дедупликацией GET внутри request_scope).
+
+        Args:
+            method: HTTP метод (GET, POST, PATCH)
+            endpoint: Endpoint API (например, /api/v4/contacts)
+            data: Данные для отправки (для POST/PATCH)
+            send: Чем выполнить запрос при промахе кэша (по умолчанию _send_request)
+
+        Returns:
+            Ответ от API в виде dict
+
+        Raises:
+            httpx.HTTPError: При ошибке API
+        """
+        if send is None:
+            send = partial(self._send_request, method, endpoint, data)
+
+        cache = _REQUEST_CACHE.get()
+        if cache is None:
+            return await send()
+
+        if method != "GET":
+            _invalidate_request_cache(endpoint)
+            return await send()
+
+        key = (endpoint, str(httpx.QueryParams(data or {})))  # type: ignore[arg-type]
+        task = cache.get(key)
+        if task is None:
+            task = asyncio.ensure_future(send())
+            cache[key] = task
+        else:
+            logger.debug("AmoCRM GET %s served from request cache", endpoint)
+
+        self._request_waiters[task] = self._request_waiters.get(task, 0) + 1
+        try:
+            # shield: отмена одного из ожидающих не отменяет запрос для остальных
+            return await asyncio.shield(task)
+        except Exception:
+            # Ошибки не кэшируем: следующий вызов повторит запрос
+            if cache.get(key) is task:
+                del cache[key]
+            raise
+        finally:
+            self._request_waiters[task] -= 1
+            if not self._request_waiters[task]:
+                del self._request_waiters[task]
+                if not task.done():
+                    # Все ожидающие отменены (например, в find_contact): незавершенный GET
+                    # отменяется и не остается в кэше
+                    task.cancel()
+                    if cache.get(key) is task:
+                        del cache[key]
+
+    async def _send_request(
         self, method: str, endpoint: str, data: dict[str, Any] | list[dict[str, Any]] | None = None
     ) -> dict[str, Any]:
         """
@@ -53,162 +583,279 @@ class AmoCRMClient:
         """
         url = f"{self.base_url}{endpoint}"
 
-        logger.info(f"AmoCRM API request: {method} {url}")
-        if data and method in ["POST", "PATCH"]:
-            logger.debug(f"Request data: {data}")
+        logger.info("AmoCRM API request: %s %s", method, url)
+        if data and method in ("POST", "PATCH") and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request data: %r", data)
 
-        async for attempt in AsyncRetrying(
-            stop=stop_after_attempt(2),  # Снижено с 3 до 2
-            wait=wait_exponential(multiplier=1, min=settings.RETRY_WAIT_MIN, max=settings.RETRY_WAIT_MAX),
-            retry=retry_if_exception_type(httpx.RequestError),  # Только сетевые ошибки, не HTTP статусы
-        ):
-            with attempt:
-                try:
-                    async with httpx.AsyncClient(timeout=30.0) as client:
-                        if method == "GET":
-                            response = await client.get(url, headers=self.headers, params=data)  # type: ignore
-                        elif method == "POST":
-                            response = await client.post(url, headers=self.headers, json=data)
-                        elif method == "PATCH":
-                            response = await client.patch(url, headers=self.headers, json=data)
-                        else:
-                            raise ValueError(f"Unsupported HTTP method: {method}")
+        return await self._send_once(method, endpoint, data)
 
-                        if response.status_code == 429:
-                            logger.warning("AmoCRM rate limit exceeded, retrying...")
-                            response.raise_for_status()
+    @_AMO_RETRY
+    async def _send_once(
+        self, method: str, endpoint: str, data: dict[str, Any] | list[dict[str, Any]] | None
+    ) -> dict[str, Any]:
+        """
+        Одна попытка HTTP запроса; повторы выполняет декоратор _AMO_RETRY.
 
-                        response.raise_for_status()
+        Args:
+            method: HTTP метод (GET, POST, PATCH)
+            endpoint: Endpoint API
+            data: Query параметры (GET) или тело запроса (POST/PATCH)
 
-                        logger.info(f"AmoCRM API response: {response.status_code}")
+        Returns:
+            Ответ от API в виде dict
 
-                        return response.json() if response.text else {}
+        Raises:
+            httpx.HTTPError: При ошибке API
+        """
+        await _RATE_LIMITER.acquire()
+        try:
+            client = self._get_client()
+            # Тело сериализует orjson; Content-Type: application/json уже в заголовках клиента
+            if method == "GET":
+                payload: dict[str, Any] = {"params": data}
+            else:
+                payload = {"content": orjson.dumps(data)} if data is not None else {}
+            async with _CONCURRENCY_LIMITER:
+                response = await client.request(method, endpoint, **payload)
+            await _CONCURRENCY_LIMITER.record(response.status_code == 429)
+
+            response.raise_for_status()
+
+            logger.info("AmoCRM API response: %s", response.status_code)
+            logger.debug("AmoCRM API protocol: %s", response.http_version)
+
+            return cast(dict[str, Any], orjson.loads(response.content)) if response.content else {}
+
+        except httpx.HTTPError as e:
+            if _is_rate_limited(e):
+                logger.warning("AmoCRM rate limit exceeded, retrying...")
+                raise
+            if _is_retryable_status(e):
+                logger.warning("AmoCRM server error %s, retrying...", e.response.status_code)  # type: ignore[attr-defined]
+                raise
+            logger.error("AmoCRM API error: %s", e)
+            if isinstance(e, httpx.HTTPStatusError):
+                resp = e.response
+                logger.error("Status code: %s", resp.status_code)
+                logger.error("Response text: %s", resp.text)
 
-                except httpx.HTTPError as e:
-                    logger.error(f"AmoCRM API error: {e}")
-                    if isinstance(e, httpx.HTTPStatusError):
-                        resp = e.response
-                        logger.error(f"Status code: {resp.status_code}")
-                        logger.error(f"Response text: {resp.text}")
+            raise
 
-                    raise
+    async def _patch_entity(self, collection: str, entity_id: int, data: dict[str, Any]) -> None:
+        """
+        Обновить сущность PATCH запросом, объединяя его с параллельными обновлениями.
 
-        return {}
+        При AMO_PATCH_COALESCE_WINDOW > 0 обновление отправляется через PATCH коллекции
+        вместе с обновлениями других оплат, пришедшими в течение окна.
 
-    async def find_contact_by_custom_field(self, value: str) -> dict[str, Any] | None:
+        Args:
+            collection: Endpoint коллекции (/api/v4/leads или /api/v4/contacts)
+            entity_id: ID сущности
+            data: Поля для обновления
+
+        Raises:
+            httpx.HTTPError: При ошибке API
         """
-        Найти контакт по кастомному полю через filter[query].
+        window = settings.AMO_PATCH_COALESCE_WINDOW
+        if window <= 0:
+            await self._make_request("PATCH", f"{collection}/{entity_id}", data=data)
+            return
+
+        # Запрос уйдет из чужой задачи, поэтому кэш GET текущей синхронизации сбрасываем здесь
+        _invalidate_request_cache(collection)
+
+        coalescer = self._coalescers.get(collection)
+        if coalescer is None:
+            coalescer = self._coalescers[collection] = _PatchCoalescer(
+                collection, window, lambda entities: self._send_request("PATCH", collection, data=entities)
+            )
+        await coalescer.submit({"id": entity_id, **data})
+
+    async def _find_contact_by_query(self, value: str, kind: str) -> dict[str, Any] | None:
+        """
+        Найти контакт через GET /api/v4/contacts?query=...
+
+        Повторный одинаковый запрос в пределах request_scope() берется из кэша _make_request.
+        Если GET по тому же значению уже выполняется для другой оплаты, вызов дожидается
+        его ответа вместо повторного запроса (см. _get_contacts_shared).
 
         Args:
-            field_id: ID кастомного поля (используется для логирования)
             value: Значение для поиска
+            kind: Тип значения для логов (custom value / phone / email)
 
         Returns:
-            Данные контакта или None если не найден
+            Данные первого найденного контакта или None если не найден
         """
-        logger.info(f"Searching contact by custom value {value} using filter[query]")
+        cached = self._cached_contact(value)
+        if cached is not None:
+            logger.info("Found contact by %s in cache: %s", kind, cached["id"])
+            return cached
 
+        params = {"query": value, "limit": 50}
         try:
             response = await self._make_request(
-                "GET",
-                "/api/v4/contacts",
-                data={
-                    "query": value,
-                    "limit": 50,
-                },
+                "GET", "/api/v4/contacts", data=params, send=lambda: self._get_contacts_shared(value, params, kind)
             )
 
             contacts = response.get("_embedded", {}).get("contacts", [])
 
             if not contacts:
-                logger.info(f"Contact not found by value: {value}")
+                logger.info("Contact not found by %s: %s", kind, value)
                 return None
 
-            logger.info(f"Found {len(contacts)} contacts by query={value}")
-
             if len(contacts) > 1:
-                logger.warning(f"Found {len(contacts)} contacts, taking the first one")
+                logger.warning("Found %s contacts by %s, taking the first one", len(contacts), kind)
 
             contact = contacts[0]
-            logger.info(f"Found contact: {contact['id']}")
+            logger.info("Found contact by %s: %s", kind, contact["id"])
+            self._remember_contact(value, contact)
             return contact  # type: ignore
 
         except Exception as e:
-            logger.error(f"Error finding contact by custom field: {e}")
+            logger.error("Error finding contact by %s: %s", kind, e)
             return None
 
-    async def find_contact_by_phone(self, phone: str) -> dict[str, Any] | None:
+    async def _get_contacts_shared(self, value: str, params: dict[str, Any], kind: str) -> dict[str, Any]:
         """
-        Найти контакт по телефону.
+        Выполнить GET /api/v4/contacts?query=... один раз для всех одновременных поисков значения.
+
+        Запрос выполняется в отдельной задаче с чистым кэшем request_scope: к нему
+        присоединяются оплаты из других областей, и он не должен читать или заполнять
+        кэш оплаты, которая его начала. Когда отменены все ожидающие, запрос отменяется.
 
         Args:
-            phone: Номер телефона
+            value: Значение для поиска
+            params: Параметры запроса
+            kind: Тип значения для логов (custom value / phone / email)
 
         Returns:
-            Данные контакта или None если не найден
+            Ответ от API в виде dict
         """
-        normalized_phone = normalize_phone(phone)
-        logger.info(f"Searching contact by phone: {phone} (normalized: {normalized_phone})")
+        task = self._contact_inflight.get(value)
+        if task is None:
+            context = copy_context()
+            context.run(_REQUEST_CACHE.set, None)
+            task = asyncio.get_running_loop().create_task(
+                self._send_request("GET", "/api/v4/contacts", data=params), context=context
+            )
+            self._contact_inflight[value] = task
+        else:
+            logger.debug("Waiting for in-flight contact search by %s", kind)
 
+        self._contact_waiters[task] = self._contact_waiters.get(task, 0) + 1
         try:
-            response = await self._make_request(
-                "GET",
-                "/api/v4/contacts",
-                data={"query": normalized_phone},
-            )
+            # shield: отмена одного из ожидающих (например, в find_contact) не отменяет запрос для остальных
+            return await asyncio.shield(task)
+        finally:
+            self._contact_waiters[task] -= 1
+            if not self._contact_waiters[task]:
+                # Ответ больше никому не нужен: незавершенный GET отменяется
+                del self._contact_waiters[task]
+                task.cancel()
+                if self._contact_inflight.get(value) is task:
+                    del self._contact_inflight[value]
+
+    def _cached_contact(self, value: str) -> dict[str, Any] | None:
+        """
+        Получить контакт из кэша поиска, если запись не старше AMO_CONTACT_CACHE_TTL.
 
-            contacts = response.get("_embedded", {}).get("contacts", [])
+        Возвращается копия: кэш общий для всех оплат процесса. Поля контакта могли
+        измениться в AmoCRM после сохранения, поэтому они не подходят как known_fields
+        для update_contact_fields - кэш только экономит поиск контакта.
 
-            if not contacts:
-                logger.info("Contact not found by phone")
-                return None
-
-            if len(contacts) > 1:
-                logger.warning(f"Found {len(contacts)} contacts by phone, taking the first one")
+        Args:
+            value: Значение query
 
-            contact = contacts[0]
-            logger.info(f"Found contact by phone: {contact['id']}")
-            return contact  # type: ignore
+        Returns:
+            Копия контакта или None (нет в кэше, запись устарела или кэш отключен)
+        """
+        ttl = settings.AMO_CONTACT_CACHE_TTL
+        entry = self._contact_cache.get(value)
+        if entry is None or ttl <= 0:
+            return None
 
-        except Exception as e:
-            logger.error(f"Error finding contact by phone: {e}")
+        stored_at, contact = entry
+        if time.monotonic() - stored_at >= ttl:
+            del self._contact_cache[value]
             return None
+        return copy.deepcopy(contact)
 
-    async def find_contact_by_email(self, email: str) -> dict[str, Any] | None:
+    def _remember_contact(self, value: str, contact: dict[str, Any]) -> None:
         """
-        Найти контакт по email.
+        Сохранить найденный контакт в кэш поиска.
+
+        Кэшируются только найденные контакты: отсутствие контакта не запоминается,
+        чтобы только что созданный контакт находился сразу.
 
         Args:
-            email: Email адрес
+            value: Значение query
+            contact: Найденный контакт
+        """
+        if settings.AMO_CONTACT_CACHE_TTL <= 0:
+            return
+        self._contact_cache.pop(value, None)
+        if len(self._contact_cache) >= _CONTACT_CACHE_MAX:
+            del self._contact_cache[next(iter(self._contact_cache))]
+        # Копия: вызывающий получает исходный dict и может его изменить
+        self._contact_cache[value] = (time.monotonic(), copy.deepcopy(contact))
+
+    def _forget_contact(self, contact_id: int | None = None, values: tuple[str | None, ...] = ()) -> None:
+        """
+        Удалить из кэша поиска записи контакта и записи по значениям query.
+
+        Args:
+            contact_id: ID измененного контакта
+            values: Значения query, результат поиска по которым мог измениться
+        """
+        for value in values:
+            if value:
+                self._contact_cache.pop(value, None)
+                # Результат уже начатого поиска мог устареть, следующий вызов начнет новый
+                self._contact_inflight.pop(value, None)
+        if contact_id is not None:
+            for value in [value for value, (_, contact) in self._contact_cache.items() if contact.get("id") == contact_id]:
+                del self._contact_cache[value]
+
+    async def find_contact_by_custom_field(self, value: str) -> dict[str, Any] | None:
+        """
+        Найти контакт по кастомному полю через filter[query].
+
+        Args:
+            value: Значение для поиска
 
         Returns:
             Данные контакта или None если не найден
         """
-        logger.info(f"Searching contact by email: {email}")
+        logger.info("Searching contact by custom value %s using filter[query]", value)
+        return await self._find_contact_by_query(value, "custom value")
 
-        try:
-            response = await self._make_request(
-                "GET",
-                "/api/v4/contacts",
-                data={"query": email},
-            )
+    async def find_contact_by_phone(self, phone: str, phone_is_normalized: bool = False) -> dict[str, Any] | None:
+        """
+        Найти контакт по телефону.
 
-            contacts = response.get("_embedded", {}).get("contacts", [])
+        Args:
+            phone: Номер телефона
+            phone_is_normalized: Телефон уже приведен normalize_phone (повторно не нормализуется)
 
-            if not contacts:
-                logger.info("Contact not found by email")
-                return None
+        Returns:
+            Данные контакта или None если не найден
+        """
+        normalized_phone = phone if phone_is_normalized else normalize_phone(phone)
+        logger.info("Searching contact by phone: %s (normalized: %s)", phone, normalized_phone)
+        return await self._find_contact_by_query(normalized_phone, "phone")
 
-            if len(contacts) > 1:
-                logger.warning(f"Found {len(contacts)} contacts by email, taking the first one")
+    async def find_contact_by_email(self, email: str) -> dict[str, Any] | None:
+        """
+        Найти контакт по email.
 
-            contact = contacts[0]
-            logger.info(f"Found contact by email: {contact['id']}")
-            return contact  # type: ignore
+        Args:
+            email: Email адрес
 
-        except Exception as e:
-            logger.error(f"Error finding contact by email: {e}")
-            return None
+        Returns:
+            Данные контакта или None если не найден
+        """
+        logger.info("Searching contact by email: %s", email)
+        return await self._find_contact_by_query(email, "email")
 
     async def find_contact(self, tg_id: str | None, phone: str | None, email: str | None) -> dict[str, Any] | None:
         """
@@ -222,15 +869,44 @@ class AmoCRMClient:
         Returns:
             Данные контакта или None если не найден
         """
-        logger.info(f"Finding contact: tg_id={tg_id}, phone={phone}, email={email}")
+        tg_id, phone, email = _strip_or_none(tg_id), _strip_or_none(phone), _strip_or_none(email)
+        if not (tg_id or phone or email):
+            logger.info("No contact identifiers provided, skipping search")
+            return None
+
+        logger.info("Finding contact: tg_id=%s, phone=%s, email=%s", tg_id, phone, email)
+
+        # Нормализуем один раз, поиск по телефону повторно этого не делает
+        normalized_phone = normalize_phone(phone) if phone else None
+
+        if settings.AMO_PARALLEL_LOOKUPS:
+            # Все поиски стартуют одновременно, результаты проверяются в порядке приоритета
+            # tg_id -> phone -> email; при первом совпадении остальные поиски отменяются
+            lookups = [
+                (self.find_contact_by_custom_field, tg_id),
+                (self._find_contact_by_normalized_phone, normalized_phone),
+                (self.find_contact_by_email, email),
+            ]
+            tasks = [asyncio.ensure_future(lookup(value)) for lookup, value in lookups if value]
+            try:
+                for task in tasks:
+                    contact = await task
+                    if contact:
+                        return contact
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            logger.info("Contact not found by any criteria")
+            return None
 
         if tg_id:
             contact = await self.find_contact_by_custom_field(tg_id)
             if contact:
                 return contact
 
-        if phone:
-            contact = await self.find_contact_by_phone(phone)
+        if normalized_phone:
+            contact = await self._find_contact_by_normalized_phone(normalized_phone)
             if contact:
                 return contact
 
@@ -242,12 +918,106 @@ class AmoCRMClient:
         logger.info("Contact not found by any criteria")
         return None
 
+    async def _find_contact_by_normalized_phone(self, normalized_phone: str) -> dict[str, Any] | None:
+        """Найти контакт по уже нормализованному телефону."""
+        return await self.find_contact_by_phone(normalized_phone, phone_is_normalized=True)
+
+    async def _search_leads_by_query(
+        self, query: str, label: str, pipeline_ids: list[int] | None = None
+    ) -> list[dict[str, Any]]:
+        """
+        Найти сделки через filter[query].
+
+        Args:
+            query: Строка поиска (telegram_id, нормализованный телефон или email)
+            label: Тип значения для логов
+            pipeline_ids: Искать только в этих воронках (фильтр на стороне AmoCRM)
+
+        Returns:
+            Список найденных сделок с _embedded.contacts (пустой при ошибке)
+        """
+        logger.info("Searching leads by %s: %s", label, query)
+        # with=contacts: привязанные контакты приходят сразу, отдельная проверка сделок не нужна
+        params: dict[str, Any] = {
+            "filter[query]": query,
+            "with": "contacts",
+            "limit": 50,
+        }
+        if pipeline_ids:
+            params["filter[pipeline_id][]"] = pipeline_ids
+        try:
+            response = await self._make_request("GET", "/api/v4/leads", data=params)
+        except Exception as e:
+            logger.warning("Error searching leads by %s: %s", label, e)
+            return []
+
+        found: list[dict[str, Any]] = response.get("_embedded", {}).get("leads", [])
+        logger.info("Found %d leads by %s", len(found), label)
+        return found
+
+    async def _fetch_leads_with_contacts(self, lead_ids: list[Any]) -> list[dict[str, Any] | BaseException]:
+        """
+        Загрузить сделки с привязанными контактами одним запросом на каждые _LEADS_PAGE_LIMIT ID.
+
+        Вместо GET /leads/{id}?with=contacts на каждую сделку используется
+        GET /leads?filter[id][]=...&with=contacts; части (если ID больше лимита)
+        запрашиваются одновременно.
+
+        Args:
+            lead_ids: ID сделок
+
+        Returns:
+            Ответы API в порядке lead_ids; для неудачных запросов и сделок,
+            которых нет в ответе, - исключение
+        """
+        chunks = [lead_ids[i : i + _LEADS_PAGE_LIMIT] for i in range(0, len(lead_ids), _LEADS_PAGE_LIMIT)]
+
+        async def fetch(chunk: list[Any]) -> dict[str, Any]:
+            return await self._make_request(
+                "GET",
+                "/api/v4/leads",
+                data={"filter[id][]": chunk, "with": "contacts", "limit": _LEADS_PAGE_LIMIT},
+            )
+
+        responses = await asyncio.gather(*(fetch(chunk) for chunk in chunks), return_exceptions=True)
+
+        results: list[dict[str, Any] | BaseException] = []
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, BaseException):
+                results.extend(response for _ in chunk)
+                continue
+            by_id = {lead["id"]: lead for lead in response.get("_embedded", {}).get("leads", [])}
+            results.extend(by_id.get(lead_id) or LookupError(f"Lead {lead_id} not returned by AmoCRM") for lead_id in chunk)
+        return results
+
+    async def _leads_with_contacts(self, leads: list[dict[str, Any]]) -> list[dict[str, Any] | BaseException]:
+        """
+        Получить сделки с привязанными контактами.
+
+        Сделки, у которых _embedded.contacts уже пришел в ответе поиска, используются как есть;
+        остальные догружаются через _fetch_leads_with_contacts.
+
+        Args:
+            leads: Сделки из результатов поиска
+
+        Returns:
+            Сделки с контактами в порядке leads; для незагруженных - исключение
+        """
+        results: list[dict[str, Any] | BaseException] = list(leads)
+        missing = [i for i, lead in enumerate(leads) if "contacts" not in lead.get("_embedded", {})]
+        if missing:
+            fetched = await self._fetch_leads_with_contacts([leads[i].get("id") for i in missing])
+            for i, lead_with_contacts in zip(missing, fetched):
+                results[i] = lead_with_contacts
+        return results
+
     async def find_active_lead(
         self,
         contact_id: int,
         telegram_id: str | None = None,
         phone: str | None = None,
         email: str | None = None,
+        phone_is_normalized: bool = False,
     ) -> dict[str, Any] | None:
         """
         Найти активную сделку для контакта.
@@ -260,135 +1030,107 @@ class AmoCRMClient:
             telegram_id: Telegram ID для поиска (приоритет 1)
             phone: Телефон для поиска (приоритет 2)
             email: Email для поиска (приоритет 3)
+            phone_is_normalized: Телефон уже приведен normalize_phone (повторно не нормализуется)
 
         Returns:
             Данные сделки или None если не найдена
         """
-        logger.info(f"Searching active lead for contact {contact_id}, telegram_id={telegram_id}, phone={phone}, email={email}")
+        telegram_id, phone, email = _strip_or_none(telegram_id), _strip_or_none(phone), _strip_or_none(email)
+        if not (telegram_id or phone or email):
+            logger.info("No identifiers to search leads for contact %s", contact_id)
+            return None
 
-        try:
-            leads = []
+        logger.info(
+            "Searching active lead for contact %s, telegram_id=%s, phone=%s, email=%s", contact_id, telegram_id, phone, email
+        )
 
-            if telegram_id:
-                logger.info(f"Searching leads by telegram_id: {telegram_id}")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": telegram_id,
-                            "limit": 50,
-                        },
-                    )
-                    telegram_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(telegram_leads)} leads by telegram_id")
-                    leads.extend(telegram_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by telegram_id: {e}")
-
-            if phone:
-                normalized_phone = normalize_phone(phone)
-                logger.info(f"Searching leads by phone: {phone} (normalized: {normalized_phone})")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": normalized_phone,
-                            "limit": 50,
-                        },
-                    )
-                    phone_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(phone_leads)} leads by phone")
-                    leads.extend(phone_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by phone: {e}")
-
-            if email:
-                logger.info(f"Searching leads by email: {email}")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": email,
-                            "limit": 50,
-                        },
-                    )
-                    email_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(email_leads)} leads by email")
-                    leads.extend(email_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by email: {e}")
+        try:
+            searches = [
+                ("telegram_id", telegram_id),
+                ("phone", phone if phone_is_normalized or not phone else normalize_phone(phone)),
+                ("email", email),
+            ]
+            # Поиски независимы, поэтому выполняются одновременно; порядок результатов сохраняется.
+            # Воронки фильтрует AmoCRM; этапы и контакт по-прежнему проверяются на клиенте
+            pipeline_ids = sorted(ALLOWED_PIPELINES)
+            results = await asyncio.gather(
+                *(self._search_leads_by_query(query, label, pipeline_ids) for label, query in searches if query)
+            )
+            leads = _merge_unique_by_id(results)
 
             if not leads:
                 logger.info("No leads found by telegram_id, phone or email")
                 return None
 
-            unique_leads = {lead["id"]: lead for lead in leads}.values()
-            leads = list(unique_leads)
-            logger.info(f"Total unique leads found: {len(leads)}")
+            logger.info("Total unique leads found: %s", len(leads))
 
-            verified_leads = []
-            for lead in leads:
+            # Один проход: проверка контакта, фильтр воронки/этапа и выбор самой свежей сделки
+            active_lead: dict[str, Any] | None = None
+            verified_count = 0
+            active_count = 0
+            found_pipelines: set[Any] = set()
+            filtered_pipelines: set[Any] = set()
+            filtered_count = 0
+
+            lead_details = await self._leads_with_contacts(leads)
+            for lead, lead_with_contacts in zip(leads, lead_details):
                 lead_id = lead.get("id")
-                try:
-                    lead_with_contacts = await self._make_request("GET", f"/api/v4/leads/{lead_id}", data={"with": "contacts"})
+                if isinstance(lead_with_contacts, BaseException):
+                    logger.warning("Error verifying lead %s: %s", lead_id, lead_with_contacts)
+                    continue
 
-                    embedded_contacts = lead_with_contacts.get("_embedded", {}).get("contacts", [])
-                    contact_ids = [c.get("id") for c in embedded_contacts]
+                embedded_contacts = lead_with_contacts.get("_embedded", {}).get("contacts", [])
+                contact_ids = [c.get("id") for c in embedded_contacts]
 
-                    if contact_id in contact_ids:
-                        logger.info(f"Lead {lead_id} verified: contains contact {contact_id}")
-                        verified_leads.append(lead)
-                    else:
-                        logger.info(f"Lead {lead_id} skipped: contact {contact_id} not found (contacts: {contact_ids})")
+                if contact_id not in contact_ids:
+                    logger.info("Lead %s skipped: contact %s not found (contacts: %s)", lead_id, contact_id, contact_ids)
+                    continue
+
+                logger.info("Lead %s verified: contains contact %s", lead_id, contact_id)
+                verified_count += 1
+                pipeline_id = lead.get("pipeline_id")
+                found_pipelines.add(pipeline_id)
 
-                except Exception as e:
-                    logger.warning(f"Error verifying lead {lead_id}: {e}")
+                if pipeline_id not in ALLOWED_PIPELINES:
+                    filtered_count += 1
+                    filtered_pipelines.add(pipeline_id)
                     continue
 
-            if not verified_leads:
-                logger.info("No leads matched contact_id after verification")
-                return None
+                updated_at = lead.get("updated_at", 0)
+                if lead.get("is_deleted", False) or lead.get("status_id") in EXCLUDED_STATUSES or updated_at <= 0:
+                    continue
 
-            logger.info(f"Verified leads: {len(verified_leads)}")
+                active_count += 1
+                if active_lead is None or updated_at > active_lead.get("updated_at", 0):
+                    active_lead = lead
 
-            found_pipelines = {lead.get("pipeline_id") for lead in verified_leads}
-            logger.info(f"Found leads in pipelines: {found_pipelines}")
+            if not verified_count:
+                logger.info("No leads matched contact_id after verification")
+                return None
 
-            active_leads = [
-                lead
-                for lead in verified_leads
-                if not lead.get("is_deleted", False)
-                and lead.get("pipeline_id") in ALLOWED_PIPELINES
-                and lead.get("status_id") not in EXCLUDED_STATUSES
-                and lead.get("updated_at", 0) > 0
-            ]
+            logger.info("Verified leads: %s", verified_count)
+            logger.info("Found leads in pipelines: %s", found_pipelines)
 
-            filtered_out = [lead for lead in verified_leads if lead.get("pipeline_id") not in ALLOWED_PIPELINES]
-            if filtered_out:
-                filtered_pipelines = {lead.get("pipeline_id") for lead in filtered_out}
-                logger.info(f"Filtered out {len(filtered_out)} leads from non-target pipelines: {filtered_pipelines}")
+            if filtered_count:
+                logger.info("Filtered out %s leads from non-target pipelines: %s", filtered_count, filtered_pipelines)
 
-            logger.info(f"Active leads after pipeline and status filtering: {len(active_leads)}")
+            logger.info("Active leads after pipeline and status filtering: %s", active_count)
 
-            if not active_leads:
+            if active_lead is None:
                 logger.info("No active leads found after filtering")
                 return None
 
-            active_lead = max(active_leads, key=lambda x: x.get("updated_at", 0))
-
             logger.info(
-                f"Selected active lead: ID={active_lead['id']}, "
-                f"Pipeline={active_lead.get('pipeline_id')}, "
-                f"Status={active_lead.get('status_id')}, "
-                f"Updated_at={active_lead.get('updated_at')}"
+                "Selected active lead: ID=%s, Pipeline=%s, Status=%s, Updated_at=%s",
+                active_lead["id"],
+                active_lead.get("pipeline_id"),
+                active_lead.get("status_id"),
+                active_lead.get("updated_at"),
             )
-            return active_lead  # type: ignore
+            return active_lead
 
         except Exception as e:
-            logger.error(f"Error finding active lead: {e}")
+            logger.error("Error finding active lead: %s", e)
             return None
 
     async def create_contact(
@@ -412,44 +1154,29 @@ class AmoCRMClient:
         Returns:
             ID созданного контакта
         """
-        logger.info(f"Creating contact: {name}")
-
-        contact_data: dict[str, Any] = {
-            "name": name,
-            "custom_fields_values": [],
-        }
+        logger.info("Creating contact: %s", name)
 
+        normalized_phone: str | None = None
         if phone:
             normalized_phone = normalize_phone(phone)
-            logger.info(f"Normalizing phone: {phone} → {normalized_phone}")
-            contact_data["custom_fields_values"].append(
-                {"field_code": "PHONE", "values": [{"value": normalized_phone, "enum_code": "WORK"}]}
-            )
-
-        if email:
-            contact_data["custom_fields_values"].append(
-                {"field_code": "EMAIL", "values": [{"value": email, "enum_code": "WORK"}]}
-            )
+            logger.info("Normalizing phone: %s → %s", phone, normalized_phone)
 
-        if tg_id:
-            contact_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": tg_id}]}
-            )
-
-        if tg_username:
-            contact_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_CONTACT_FIELD_TG_USERNAME, "values": [{"value": tg_username}]}
-            )
+        contact_data: dict[str, Any] = {
+            "name": name,
+            "custom_fields_values": _contact_fields(normalized_phone, email, tg_id, tg_username),
+        }
 
         try:
             response = await self._make_request("POST", "/api/v4/contacts", data=[contact_data])
 
             contact_id: int = response["_embedded"]["contacts"][0]["id"]
-            logger.info(f"Contact created: {contact_id}")
+            logger.info("Contact created: %s", contact_id)
+            # Поиск по этим значениям теперь может вернуть новый контакт
+            self._forget_contact(values=(normalized_phone, email, tg_id))
             return contact_id
 
         except Exception as e:
-            logger.error(f"Error creating contact: {e}")
+            logger.error("Error creating contact: %s", e)
             raise
 
     async def update_contact_fields(
@@ -458,6 +1185,7 @@ class AmoCRMClient:
         tg_id: str | None = None,
         tg_username: str | None = None,
         email: str | None = None,
+        known_fields: list[dict[str, Any]] | None = None,
     ) -> None:
         """
         Обновить кастомные поля контакта (идемпотентно - только пустые поля).
@@ -467,53 +1195,56 @@ class AmoCRMClient:
             tg_id: Telegram ID (обновить только если пусто)
             tg_username: Telegram username (обновить только если пусто)
             email: Email (обновить только если пусто)
+            known_fields: custom_fields_values контакта, если он только что получен
+                (тогда GET контакта не выполняется)
         """
-        logger.info(f"Updating contact {contact_id} fields")
+        if not any((tg_id, tg_username, email)):
+            logger.info("No fields to update for contact %s, skipping", contact_id)
+            return
+
+        logger.info("Updating contact %s fields", contact_id)
 
         try:
-            response = await self._make_request("GET", f"/api/v4/contacts/{contact_id}", data={"with": "contacts"})
-            current_fields = response.get("custom_fields_values", [])
+            if known_fields is None:
+                response = await self._make_request(
+                    "GET", f"/api/v4/contacts/{contact_id}", data={"with": "contacts"}
+                )
+                current_fields = response.get("custom_fields_values") or []
+            else:
+                current_fields = known_fields
 
-            current_tg_id = None
-            current_tg_username = None
-            current_email = None
+            by_id = {field["field_id"]: field for field in current_fields if "field_id" in field}
+            by_code = {field["field_code"]: field for field in current_fields if field.get("field_code")}
 
-            for field in current_fields:
-                if field["field_id"] == settings.AMO_CONTACT_FIELD_TG_ID:
-                    current_tg_id = field["values"][0]["value"] if field["values"] else None
-                elif field["field_id"] == settings.AMO_CONTACT_FIELD_TG_USERNAME:
-                    current_tg_username = field["values"][0]["value"] if field["values"] else None
-                elif field.get("field_code") == "EMAIL":
-                    current_email = field["values"][0]["value"] if field["values"] else None
+            current_tg_id = _first_field_value(by_id.get(settings.AMO_CONTACT_FIELD_TG_ID))
+            current_tg_username = _first_field_value(by_id.get(settings.AMO_CONTACT_FIELD_TG_USERNAME))
+            current_email = _first_field_value(by_code.get("EMAIL"))
 
             update_data: dict[str, Any] = {"custom_fields_values": []}
 
             if tg_id and not current_tg_id:
-                logger.info(f"Updating tg_id: {tg_id}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": tg_id}]}
-                )
+                logger.info("Updating tg_id: %s", tg_id)
+                update_data["custom_fields_values"].append(_simple_field(settings.AMO_CONTACT_FIELD_TG_ID, tg_id))
 
             if tg_username and not current_tg_username:
-                logger.info(f"Updating tg_username: {tg_username}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_CONTACT_FIELD_TG_USERNAME, "values": [{"value": tg_username}]}
-                )
+                logger.info("Updating tg_username: %s", tg_username)
+                update_data["custom_fields_values"].append(_simple_field(settings.AMO_CONTACT_FIELD_TG_USERNAME, tg_username))
 
             if email and not current_email:
-                logger.info(f"Updating email: {email}")
+                logger.info("Updating email: %s", email)
                 update_data["custom_fields_values"].append(
                     {"field_code": "EMAIL", "values": [{"value": email, "enum_code": "WORK"}]}
                 )
 
             if update_data["custom_fields_values"]:
-                await self._make_request("PATCH", f"/api/v4/contacts/{contact_id}", data=update_data)
-                logger.info(f"Contact {contact_id} fields updated")
+                await self._patch_entity("/api/v4/contacts", contact_id, update_data)
+                self._forget_contact(contact_id, (tg_id, email))
+                logger.info("Contact %s fields updated", contact_id)
             else:
-                logger.info(f"Contact {contact_id} fields are already filled, skipping update")
+                logger.info("Contact %s fields are already filled, skipping update", contact_id)
 
         except Exception as e:
-            logger.error(f"Error updating contact fields: {e}")
+            logger.error("Error updating contact fields: %s", e)
             raise
 
     async def update_contact(
@@ -536,36 +1267,27 @@ class AmoCRMClient:
             tg_id: Telegram ID
             tg_username: Telegram username (без @)
         """
-        logger.info(f"Updating contact {contact_id}")
+        logger.info("Updating contact %s", contact_id)
 
-        contact_data: dict[str, Any] = {"id": contact_id}
-        custom_fields: list[dict[str, Any]] = []
+        contact_data: dict[str, Any] = {}
+        custom_fields = _contact_fields(phone, email, tg_id, tg_username)
 
         if name:
             contact_data["name"] = name
 
-        if phone:
-            custom_fields.append({"field_code": "PHONE", "values": [{"value": phone, "enum_code": "WORK"}]})
-
-        if email:
-            custom_fields.append({"field_code": "EMAIL", "values": [{"value": email, "enum_code": "WORK"}]})
-
-        if tg_id:
-            custom_fields.append({"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": tg_id}]})
-
-        if tg_username:
-            custom_fields.append({"field_id": settings.AMO_CONTACT_FIELD_TG_USERNAME, "values": [{"value": tg_username}]})
-
         if custom_fields:
             contact_data["custom_fields_values"] = custom_fields
 
         try:
-            logger.debug(f"Contact update data: {contact_data}")
-            await self._make_request("PATCH", "/api/v4/contacts", data=[contact_data])
-            logger.info(f"Contact {contact_id} updated successfully")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Contact update data: %r", contact_data)
+            # Через _patch_entity: одновременные обновления контактов уходят одним PATCH коллекции
+            await self._patch_entity("/api/v4/contacts", contact_id, contact_data)
+            self._forget_contact(contact_id, (phone, email, tg_id))
+            logger.info("Contact %s updated successfully", contact_id)
 
         except Exception as e:
-            logger.error(f"Error updating contact: {e}")
+            logger.error("Error updating contact: %s", e)
             raise
 
     async def create_lead(
@@ -608,8 +1330,8 @@ class AmoCRMClient:
         target_pipeline_id = pipeline_id if pipeline_id is not None else settings.AMO_PIPELINE_ID
         target_status_id = status_id if status_id is not None else settings.AMO_DEFAULT_STATUS_ID
 
-        logger.info(f"Creating lead: {name} for contact {contact_id}")
-        logger.info(f"  Pipeline: {target_pipeline_id}, Status: {target_status_id}")
+        logger.info("Creating lead: %s for contact %s", name, contact_id)
+        logger.info("  Pipeline: %s, Status: %s", target_pipeline_id, target_status_id)
 
         lead_data: dict[str, Any] = {
             "name": name,
@@ -620,79 +1342,37 @@ class AmoCRMClient:
             "custom_fields_values": [],
         }
 
-        if utm_source:
-            logger.info(f"Adding UTM source: {utm_source}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_UTM_SOURCE, "values": [{"value": utm_source}]}
-            )
-
-        if utm_medium:
-            logger.info(f"Adding UTM medium: {utm_medium}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_UTM_MEDIUM, "values": [{"value": utm_medium}]}
-            )
-
-        if utm_campaign:
-            logger.info(f"Adding UTM campaign: {utm_campaign}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_UTM_CAMPAIGN, "values": [{"value": utm_campaign}]}
-            )
-
-        if utm_content:
-            logger.info(f"Adding UTM content: {utm_content}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_UTM_CONTENT, "values": [{"value": utm_content}]}
-            )
-
-        if utm_term:
-            logger.info(f"Adding UTM term: {utm_term}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_UTM_TERM, "values": [{"value": utm_term}]}
-            )
-
-        if ym_uid:
-            logger.info(f"Adding Yandex Metrika UID: {ym_uid}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_YM_UID, "values": [{"value": ym_uid}]}
-            )
-
-        if domain:
-            logger.info(f"Adding referrer (domain): {domain}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_REFERRER, "values": [{"value": domain}]}
-            )
+        lead_data["custom_fields_values"].extend(
+            _lead_text_fields((utm_source, utm_medium, utm_campaign, utm_content, utm_term, ym_uid, domain), "Adding")
+        )
 
         if user_class is not None:
             # Новое поле 806496 - textarea (записываем просто текст: "7", "8", "9", "10", "11")
-            logger.info(f"Adding class: {user_class}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_CLASS, "values": [{"value": str(user_class)}]}
-            )
+            logger.info("Adding class: %s", user_class)
+            lead_data["custom_fields_values"].append(_simple_field(settings.AMO_LEAD_FIELD_CLASS, str(user_class)))
 
         if is_parent is not None:
             role_enum_id = settings.AMO_LEAD_FIELD_ROLE_PARENT if is_parent else settings.AMO_LEAD_FIELD_ROLE_STUDENT
             role_name = "Родитель" if is_parent else "Ученик"
-            logger.info(f"Adding role: {role_name} (is_parent={is_parent})")
+            logger.info("Adding role: %s (is_parent=%s)", role_name, is_parent)
             lead_data["custom_fields_values"].append(
                 {"field_id": settings.AMO_LEAD_FIELD_ROLE, "values": [{"enum_id": role_enum_id}]}
             )
 
         if promo_code:
             promo_code_str = str(promo_code)
-            logger.info(f"Adding promo code: {promo_code_str}")
-            lead_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_PROMO_CODE, "values": [{"value": promo_code_str}]}
-            )
+            logger.info("Adding promo code: %s", promo_code_str)
+            lead_data["custom_fields_values"].append(_simple_field(settings.AMO_LEAD_FIELD_PROMO_CODE, promo_code_str))
 
         try:
             response = await self._make_request("POST", "/api/v4/leads", data=[lead_data])
 
             lead_id: int = response["_embedded"]["leads"][0]["id"]
-            logger.info(f"Lead created: {lead_id}")
+            logger.info("Lead created: %s", lead_id)
             return lead_id
 
         except Exception as e:
-            logger.error(f"Error creating lead: {e}")
+            logger.error("Error creating lead: %s", e)
             raise
 
     async def get_lead_by_id(self, lead_id: int) -> dict[str, Any] | None:
@@ -705,26 +1385,26 @@ class AmoCRMClient:
         Returns:
             Данные сделки или None если не найдена
         """
-        logger.info(f"Getting lead by ID: {lead_id}")
+        logger.info("Getting lead by ID: %s", lead_id)
 
         try:
             response = await self._make_request("GET", f"/api/v4/leads/{lead_id}", data={"with": "contacts"})
             
             # Проверяем что ответ содержит данные сделки
             if not response or "id" not in response:
-                logger.warning(f"Lead {lead_id} not found (empty response)")
+                logger.warning("Lead %s not found (empty response)", lead_id)
                 return None
             
-            logger.info(f"Lead {lead_id} found")
+            logger.info("Lead %s found", lead_id)
             return response
 
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404:
-                logger.warning(f"Lead {lead_id} not found")
+                logger.warning("Lead %s not found", lead_id)
                 return None
             raise
         except Exception as e:
-            logger.error(f"Error getting lead: {e}")
+            logger.error("Error getting lead: %s", e)
             raise
 
     async def update_lead_fields(
@@ -750,6 +1430,7 @@ class AmoCRMClient:
         user_class: int | None = None,
         is_parent: bool | None = None,
         promo_code: str | None = None,
+        known_fields: list[dict[str, Any]] | None = None,
     ) -> None:
         """
         Обновить кастомные поля сделки и бюджет одним запросом.
@@ -771,60 +1452,67 @@ class AmoCRMClient:
             utm_content: UTM content
             utm_term: UTM term
             ym_uid: Yandex Metrika UID
+            known_fields: custom_fields_values сделки, если она только что получена
+                (тогда GET сделки не выполняется)
         """
-        logger.info(f"Updating lead {lead_id} fields" + (f" and budget ({total_paid})" if total_paid else ""))
+        logger.info("Updating lead %s fields%s", lead_id, f" and budget ({total_paid})" if total_paid else "")
 
         try:
-            response = await self._make_request("GET", f"/api/v4/leads/{lead_id}")
-            current_fields = response.get("custom_fields_values") or []
-
-            current_purchase_count = 0
+            if known_fields is None:
+                response = await self._make_request("GET", f"/api/v4/leads/{lead_id}")
+                current_fields = response.get("custom_fields_values") or []
+            else:
+                current_fields = known_fields
 
-            for field in current_fields:
-                if field["field_id"] == settings.AMO_LEAD_FIELD_PURCHASE_COUNT:
-                    current_purchase_count = int(field["values"][0]["value"]) if field["values"] else 0
+            # Из текущих полей нужен только счетчик покупок, поэтому индекс по всем полям не строим
+            purchase_count_field_id = settings.AMO_LEAD_FIELD_PURCHASE_COUNT
+            purchase_count_field = next(
+                (field for field in current_fields if field.get("field_id") == purchase_count_field_id), None
+            )
+            purchase_count_value = _first_field_value(purchase_count_field)
+            current_purchase_count = int(purchase_count_value) if purchase_count_value is not None else 0
 
-            update_data: dict[str, Any] = {"custom_fields_values": []}
+            update_data: dict[str, Any] = {}
+            cfv: list[dict[str, Any]] = []
+            update_data["custom_fields_values"] = cfv
 
             if subjects:
-                logger.info(f"Updating subjects: {subjects}")
+                logger.info("Updating subjects: %s", subjects)
                 values = [{"enum_id": enum_id} for enum_id in subjects]
-                update_data["custom_fields_values"].append({"field_id": settings.AMO_LEAD_FIELD_SUBJECTS, "values": values})
+                cfv.append({"field_id": settings.AMO_LEAD_FIELD_SUBJECTS, "values": values})
 
             if direction:
-                logger.info(f"Updating direction: {direction}")
-                update_data["custom_fields_values"].append(
+                logger.info("Updating direction: %s", direction)
+                cfv.append(
                     {"field_id": settings.AMO_LEAD_FIELD_DIRECTION, "values": [{"enum_id": direction}]}
                 )
 
             if course_type:
-                logger.info(f"Updating course type: {course_type}")
-                update_data["custom_fields_values"].append(
+                logger.info("Updating course type: %s", course_type)
+                cfv.append(
                     {"field_id": settings.AMO_LEAD_FIELD_COURSE_TYPE, "values": [{"enum_id": course_type}]}
                 )
 
             # ВРЕМЕННО ОТКЛЮЧЕНО: field_id 812547 не существует в воронке
             # if last_payment_amount is not None:
             #     logger.info(f"Updating last payment amount: {last_payment_amount}")
-            #     update_data["custom_fields_values"].append(
+            #     cfv.append(
             #         {"field_id": settings.AMO_LEAD_FIELD_LAST_PAYMENT_AMOUNT, "values": [{"value": int(last_payment_amount)}]}
             #     )
 
             subjects_to_add = purchased_subjects_count if purchased_subjects_count else 1
             new_purchase_count = current_purchase_count + subjects_to_add
-            logger.info(f"Updating purchase count: {current_purchase_count} + {subjects_to_add} = {new_purchase_count}")
+            logger.info("Updating purchase count: %s + %s = %s", current_purchase_count, subjects_to_add, new_purchase_count)
 
             # Новое поле 813727 - numeric (записываем просто число)
-            update_data["custom_fields_values"].append(
-                {"field_id": settings.AMO_LEAD_FIELD_PURCHASE_COUNT, "values": [{"value": new_purchase_count}]}
-            )
+            cfv.append(_simple_field(settings.AMO_LEAD_FIELD_PURCHASE_COUNT, new_purchase_count))
 
             # ВРЕМЕННО ОТКЛЮЧЕНО: field_id 812549 не существует в воронке
             # if payment_status:
             #     logger.info(f"Updating payment status: {payment_status}")
             #     status_mapping = {"CONFIRMED": 1, "PENDING": 0, "FAILED": 2, "CANCELLED": 3}
             #     status_value = status_mapping.get(payment_status, 0)
-            #     update_data["custom_fields_values"].append(
+            #     cfv.append(
             #         {"field_id": settings.AMO_LEAD_FIELD_PAYMENT_STATUS, "values": [{"value": status_value}]}
             #     )
 
@@ -837,104 +1525,58 @@ class AmoCRMClient:
             #             timestamp = int(dt.timestamp())
             #         else:
             #             timestamp = int(last_payment_date)
-            #         update_data["custom_fields_values"].append(
+            #         cfv.append(
             #             {"field_id": settings.AMO_LEAD_FIELD_LAST_PAYMENT_DATE, "values": [{"value": timestamp}]}
             #         )
             #     except Exception as e:
             #         logger.warning(f"Failed to convert date to timestamp: {e}")
 
             if payment_id:
-                logger.info(f"Updating payment ID: {payment_id}")
+                logger.info("Updating payment ID: %s", payment_id)
                 try:
                     payment_id_numeric = int(payment_id)
-                    logger.info(f"Payment ID: '{payment_id}' → {payment_id_numeric}")
-                    update_data["custom_fields_values"].append(
-                        {"field_id": settings.AMO_LEAD_FIELD_PAYMENT_ID, "values": [{"value": payment_id_numeric}]}
-                    )
+                    logger.info("Payment ID: '%s' → %s", payment_id, payment_id_numeric)
+                    cfv.append(_simple_field(settings.AMO_LEAD_FIELD_PAYMENT_ID, payment_id_numeric))
                 except ValueError:
-                    logger.warning(f"Payment ID '{payment_id}' is not a number, skipping")
-
-            # UTM метки
-            if utm_source:
-                logger.info(f"Updating UTM source: {utm_source}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_UTM_SOURCE, "values": [{"value": utm_source}]}
-                )
-
-            if utm_medium:
-                logger.info(f"Updating UTM medium: {utm_medium}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_UTM_MEDIUM, "values": [{"value": utm_medium}]}
-                )
-
-            if utm_campaign:
-                logger.info(f"Updating UTM campaign: {utm_campaign}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_UTM_CAMPAIGN, "values": [{"value": utm_campaign}]}
-                )
-
-            if utm_content:
-                logger.info(f"Updating UTM content: {utm_content}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_UTM_CONTENT, "values": [{"value": utm_content}]}
-                )
-
-            if utm_term:
-                logger.info(f"Updating UTM term: {utm_term}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_UTM_TERM, "values": [{"value": utm_term}]}
-                )
+                    logger.warning("Payment ID '%s' is not a number, skipping", payment_id)
 
-            if ym_uid:
-                logger.info(f"Updating Yandex Metrika UID: {ym_uid}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_YM_UID, "values": [{"value": ym_uid}]}
-                )
-
-            if domain:
-                logger.info(f"Updating referrer (domain): {domain}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_REFERRER, "values": [{"value": domain}]}
-                )
+            # UTM метки, Yandex Metrika UID и referrer - простые текстовые поля
+            cfv.extend(
+                _lead_text_fields((utm_source, utm_medium, utm_campaign, utm_content, utm_term, ym_uid, domain), "Updating")
+            )
 
             if user_class is not None:
                 # Новое поле 806496 - textarea (записываем просто текст: "7", "8", "9", "10", "11")
-                logger.info(f"Updating class: {user_class}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_CLASS, "values": [{"value": str(user_class)}]}
-                )
+                logger.info("Updating class: %s", user_class)
+                cfv.append(_simple_field(settings.AMO_LEAD_FIELD_CLASS, str(user_class)))
 
             if is_parent is not None:
                 role_enum_id = settings.AMO_LEAD_FIELD_ROLE_PARENT if is_parent else settings.AMO_LEAD_FIELD_ROLE_STUDENT
                 role_name = "Родитель" if is_parent else "Ученик"
-                logger.info(f"Updating role: {role_name} (is_parent={is_parent})")
-                update_data["custom_fields_values"].append(
+                logger.info("Updating role: %s (is_parent=%s)", role_name, is_parent)
+                cfv.append(
                     {"field_id": settings.AMO_LEAD_FIELD_ROLE, "values": [{"enum_id": role_enum_id}]}
                 )
 
             if promo_code:
                 promo_code_str = str(promo_code)
-                logger.info(f"Updating promo code: {promo_code_str}")
-                update_data["custom_fields_values"].append(
-                    {"field_id": settings.AMO_LEAD_FIELD_PROMO_CODE, "values": [{"value": promo_code_str}]}
-                )
+                logger.info("Updating promo code: %s", promo_code_str)
+                cfv.append(_simple_field(settings.AMO_LEAD_FIELD_PROMO_CODE, promo_code_str))
 
             if status_id is not None:
-                logger.info(f"Updating lead status to: {status_id}")
+                logger.info("Updating lead status to: %s", status_id)
                 update_data["status_id"] = status_id
 
             if total_paid is not None:
                 update_data["price"] = total_paid
-                logger.info(f"Updating budget (total paid): {total_paid}")
+                logger.info("Updating budget (total paid): %s", total_paid)
 
-            if update_data["custom_fields_values"] or status_id is not None or total_paid is not None:
-                await self._make_request("PATCH", f"/api/v4/leads/{lead_id}", data=update_data)
-                logger.info(f"Lead {lead_id} fields" + (f" and budget ({total_paid})" if total_paid else "") + " updated")
-            else:
-                logger.info(f"No fields to update for lead {lead_id}")
+            # Счетчик покупок увеличивается при каждой оплате, поэтому PATCH нужен всегда
+            await self._patch_entity("/api/v4/leads", lead_id, update_data)
+            logger.info("Lead %s fields%s updated", lead_id, f" and budget ({total_paid})" if total_paid else "")
 
         except Exception as e:
-            logger.error(f"Error updating lead fields: {e}")
+            logger.error("Error updating lead fields: %s", e)
             raise
 
     async def update_lead(
@@ -957,7 +1599,7 @@ class AmoCRMClient:
             direction: enum_id направления курса (ЕГЭ/ОГЭ)
             purchase_count: Количество купленных курсов (число)
         """
-        logger.info(f"Updating lead {lead_id}")
+        logger.info("Updating lead %s", lead_id)
 
         update_data: dict[str, Any] = {}
         custom_fields: list[dict[str, Any]] = []
@@ -977,17 +1619,17 @@ class AmoCRMClient:
 
         if purchase_count:
             # Новое поле 813727 - numeric (записываем просто число)
-            custom_fields.append({"field_id": settings.AMO_LEAD_FIELD_PURCHASE_COUNT, "values": [{"value": purchase_count}]})
+            custom_fields.append(_simple_field(settings.AMO_LEAD_FIELD_PURCHASE_COUNT, purchase_count))
 
         if custom_fields:
             update_data["custom_fields_values"] = custom_fields
 
         try:
-            await self._make_request("PATCH", f"/api/v4/leads/{lead_id}", data=update_data)
-            logger.info(f"Lead {lead_id} updated successfully")
+            await self._patch_entity("/api/v4/leads", lead_id, update_data)
+            logger.info("Lead %s updated successfully", lead_id)
 
         except Exception as e:
-            logger.error(f"Error updating lead: {e}")
+            logger.error("Error updating lead: %s", e)
             raise
 
     async def add_lead_note(self, lead_id: int, text: str) -> None:
@@ -996,9 +1638,13 @@ class AmoCRMClient:
 
         Args:
             lead_id: ID сделки
-            text: Текст примечания
+            text: Текст примечания (пустой и из одних пробелов пропускается)
         """
-        logger.info(f"Adding note to lead {lead_id}")
+        if not text or not text.strip():
+            logger.info("No note text for lead %s, skipping", lead_id)
+            return
+
+        logger.info("Adding note to lead %s", lead_id)
 
         note_data = {
             "entity_id": lead_id,
@@ -1008,10 +1654,10 @@ class AmoCRMClient:
 
         try:
             await self._make_request("POST", f"/api/v4/leads/{lead_id}/notes", data=[note_data])
-            logger.info(f"Note added to lead {lead_id}")
+            logger.info("Note added to lead %s", lead_id)
 
         except Exception as e:
-            logger.error(f"Error adding note to lead: {e}")
+            logger.error("Error adding note to lead: %s", e)
             raise
 
     async def find_op_lead(
@@ -1025,7 +1671,7 @@ class AmoCRMClient:
         Найти сделку для OP платежей (utm_source=op) или по названию "Оплата:...".
 
         Два сценария поиска:
-        1. utm_source=op: искать в 13 воронках (без проверки названия)
+        1. utm_source=op: искать в 17 воронках (без проверки названия)
         2. Название "Оплата: ОГЭ/ЕГЭ/Средняя школа": искать в 2 воронках + проверка названия
 
         Args:
@@ -1037,57 +1683,17 @@ class AmoCRMClient:
         Returns:
             Данные сделки или None если не найдена
         """
-        logger.info(f"Lead search: is_utm_op={is_utm_op}")
+        logger.info("Lead search: is_utm_op=%s", is_utm_op)
 
-        # Определить воронки и исключаемые статусы в зависимости от сценария
+        # Определить воронки и исключаемые статусы в зависимости от сценария:
+        # 1. utm_source=op - широкий поиск в 17 воронках
+        # 2. по названию "Оплата:..." - узкий поиск в 2 воронках
         if is_utm_op:
-            # СЦЕНАРИЙ 1: utm_source=op (широкий поиск в 17 воронках)
-            allowed_pipelines = [
-                settings.AMO_PIPELINE_SITE,
-                settings.PIPELINE_SITE_TG,
-                settings.AMO_PIPELINE_YANDEX,
-                settings.AMO_PIPELINE_PARTNERS,
-                settings.PIPELINE_VK_EGE,
-                settings.PIPELINE_VK_OGE,
-                settings.PIPELINE_TG_EGE,
-                settings.PIPELINE_TG_OGE,
-                settings.PIPELINE_TG_BOTS,
-                settings.PIPELINE_TG_AI,
-                settings.PIPELINE_TG_PARENTS,
-                settings.PIPELINE_WEBINARS,
-                settings.PIPELINE_7_8_CLASS,
-                settings.PIPELINE_TG_COPY,
-                settings.PIPELINE_7_8_BRON,
-                settings.PIPELINE_GR,
-                settings.PIPELINE_CROSS,
-            ]
-
-            excluded_statuses = [
-                settings.AMO_STATUS_AUTOPAY_SITE,
-                settings.PIPELINE_SITE_TG_AUTOPAY,
-                settings.AMO_STATUS_AUTOPAY_YANDEX,
-                settings.PIPELINE_WEBINARS_AUTOPAY,
-                settings.AMO_STATUS_AUTOPAY_PARTNERS,
-                settings.PIPELINE_7_8_CLASS_AUTOPAY,
-                settings.STATUS_SUCCESS,
-                settings.STATUS_CLOSED,
-            ]
+            allowed_pipelines, excluded_statuses = OP_PIPELINES, OP_EXCLUDED_STATUSES
         else:
-            # СЦЕНАРИЙ 2: по названию "Оплата:..." (узкий поиск в 2 воронках)
-            allowed_pipelines = [
-                settings.AMO_PIPELINE_SITE,
-                settings.PIPELINE_7_8_CLASS,
+            allowed_pipelines, excluded_statuses = PAYMENT_NAME_PIPELINES, PAYMENT_NAME_EXCLUDED_STATUSES
 
-            ]
-
-            excluded_statuses = [
-                settings.AMO_STATUS_AUTOPAY_SITE,
-                settings.PIPELINE_7_8_CLASS_AUTOPAY,
-                settings.STATUS_SUCCESS,
-                settings.STATUS_CLOSED,
-            ]
-
-        logger.info(f"Searching in {len(allowed_pipelines)} pipelines, excluding {len(excluded_statuses)} statuses")
+        logger.info("Searching in %s pipelines, excluding %s statuses", len(allowed_pipelines), len(excluded_statuses))
 
         # Найти контакт
         contact = await self.find_contact(telegram_id, phone, email)
@@ -1096,146 +1702,98 @@ class AmoCRMClient:
             return None
 
         contact_id = contact["id"]
-        logger.info(f"Contact found: {contact_id}")
+        logger.info("Contact found: %s", contact_id)
 
         # Получить все сделки контакта
         try:
-            leads = []
-
-            # Поиск по telegram_id
-            if telegram_id:
-                logger.info(f"Searching leads by telegram_id: {telegram_id}")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": telegram_id,
-                            "limit": 50,
-                        },
-                    )
-                    tg_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(tg_leads)} leads by telegram_id")
-                    leads.extend(tg_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by telegram_id: {e}")
-
-            # Поиск по телефону
-            if phone:
-                normalized_phone = normalize_phone(phone)
-                logger.info(f"Searching leads by phone: {phone} (normalized: {normalized_phone})")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": normalized_phone,
-                            "limit": 50,
-                        },
-                    )
-                    phone_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(phone_leads)} leads by phone")
-                    leads.extend(phone_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by phone: {e}")
-
-            # Поиск по email
-            if email:
-                logger.info(f"Searching leads by email: {email}")
-                try:
-                    response = await self._make_request(
-                        "GET",
-                        "/api/v4/leads",
-                        data={
-                            "filter[query]": email,
-                            "limit": 50,
-                        },
-                    )
-                    email_leads = response.get("_embedded", {}).get("leads", [])
-                    logger.info(f"Found {len(email_leads)} leads by email")
-                    leads.extend(email_leads)
-                except Exception as e:
-                    logger.warning(f"Error searching leads by email: {e}")
+            searches = [
+                ("telegram_id", telegram_id),
+                ("phone", normalize_phone(phone) if phone else None),
+                ("email", email),
+            ]
+            # Поиски независимы, поэтому выполняются одновременно; порядок результатов сохраняется
+            # Воронки фильтрует AmoCRM, чтобы не передавать сделки, которые все равно будут отброшены
+            results = await asyncio.gather(
+                *(
+                    self._search_leads_by_query(query, label, sorted(allowed_pipelines))
+                    for label, query in searches
+                    if query
+                )
+            )
+            leads = _merge_unique_by_id(results)
 
             if not leads:
                 logger.info("No leads found by any criteria")
                 return None
 
-            unique_leads = {lead["id"]: lead for lead in leads}.values()
-            leads = list(unique_leads)
-            logger.info(f"Total unique leads found: {len(leads)}")
-
-            verified_leads = []
-            for lead in leads:
-                lead_id = lead.get("id")
-                try:
-                    lead_with_contacts = await self._make_request("GET", f"/api/v4/leads/{lead_id}", data={"with": "contacts"})
-
-                    embedded_contacts = lead_with_contacts.get("_embedded", {}).get("contacts", [])
-                    contact_ids = [c.get("id") for c in embedded_contacts]
+            logger.info("Total unique leads found: %s", len(leads))
 
-                    if contact_id in contact_ids:
-                        logger.info(f"Lead {lead_id} verified: contains contact {contact_id}")
-                        verified_leads.append(lead_with_contacts)
-                    else:
-                        logger.info(f"Lead {lead_id} skipped: contact {contact_id} not found")
+            # Один проход: проверка контакта, воронки/этапа, названия и выбор самой свежей сделки.
+            # Воронка уже отфильтрована в поиске, здесь - только защитная проверка;
+            # исключение этапов через filter[] AmoCRM не выразить, поэтому оно остается на клиенте
+            latest_lead: dict[str, Any] | None = None
+            latest_updated_at = 0
+            verified_count = 0
 
-                except Exception as e:
-                    logger.warning(f"Error verifying lead {lead_id}: {e}")
+            lead_ids = [lead.get("id") for lead in leads]
+            lead_details = await self._leads_with_contacts(leads)
+            for lead_id, lead in zip(lead_ids, lead_details):
+                if isinstance(lead, BaseException):
+                    logger.warning("Error verifying lead %s: %s", lead_id, lead)
                     continue
 
-            if not verified_leads:
-                logger.info("No leads matched contact_id after verification")
-                return None
-
-            filtered_leads = [
-                lead
-                for lead in verified_leads
-                if lead.get("pipeline_id") in allowed_pipelines
-                and lead.get("status_id") not in excluded_statuses
-                and not lead.get("is_deleted", False)
-            ]
-
-            logger.info(f"Leads after pipeline/status filtering: {len(filtered_leads)}")
+                embedded_contacts = lead.get("_embedded", {}).get("contacts", [])
+                if not any(c.get("id") == contact_id for c in embedded_contacts):
+                    logger.info("Lead %s skipped: contact %s not found", lead_id, contact_id)
+                    continue
 
-            if not filtered_leads:
-                logger.info("No leads found after filtering")
-                return None
+                verified_count += 1
+                logger.info("Lead %s verified: contains contact %s", lead_id, contact_id)
 
-            if not is_utm_op:
-                target_names = ["Оплата: ОГЭ", "Оплата: ЕГЭ", "Оплата: Средняя школа"]
-                name_filtered_leads = []
+                if (
+                    lead.get("pipeline_id") not in allowed_pipelines
+                    or lead.get("status_id") in excluded_statuses
+                    or lead.get("is_deleted", False)
+                ):
+                    continue
 
-                for lead in filtered_leads:
+                if not is_utm_op:
                     lead_name = lead.get("name", "")
-                    if lead_name in target_names:
-                        logger.info(f"Lead {lead['id']} matched by name: {lead_name}")
-                        name_filtered_leads.append(lead)
-
-                filtered_leads = name_filtered_leads
-
-            if not filtered_leads:
-                logger.info("No leads matched name criteria")
+                    if lead_name not in PAYMENT_LEAD_NAMES:
+                        continue
+                    logger.info("Lead %s matched by name: %s", lead_id, lead_name)
+
+                updated_at = lead.get("updated_at", 0)
+                if latest_lead is None or updated_at > latest_updated_at:
+                    latest_lead, latest_updated_at = lead, updated_at
+
+            if latest_lead is None:
+                logger.info(
+                    "No leads matched: %s verified by contact, none passed pipeline/status%s filtering",
+                    verified_count,
+                    "" if is_utm_op else "/name",
+                )
                 return None
 
-            latest_lead = max(filtered_leads, key=lambda x: x.get("updated_at", 0))
             logger.info(
-                f"Selected latest lead: ID={latest_lead['id']}, "
-                f"Name={latest_lead.get('name')}, "
-                f"Pipeline={latest_lead.get('pipeline_id')}, "
-                f"Status={latest_lead.get('status_id')}"
+                "Selected latest lead: ID=%s, Name=%s, Pipeline=%s, Status=%s",
+                latest_lead["id"],
+                latest_lead.get("name"),
+                latest_lead.get("pipeline_id"),
+                latest_lead.get("status_id"),
             )
 
-            return latest_lead  # type: ignore
+            return latest_lead
 
         except Exception as e:
-            logger.error(f"Error finding lead: {e}")
+            logger.error("Error finding lead: %s", e)
             return None
 
     async def create_task_for_contact_manager(
         self,
         lead_id: int,
         text: str,
+        responsible_user_id: int | None = None,
     ) -> int:
         """
         Создать задачу ответственному за сделку менеджеру.
@@ -1243,27 +1801,30 @@ class AmoCRMClient:
         Args:
             lead_id: ID сделки
             text: Текст задачи
+            responsible_user_id: Ответственный из уже загруженной сделки
+                (если не передан, сделка запрашивается из AmoCRM)
 
         Returns:
             ID созданной задачи
         """
-        logger.info(f"Creating task for lead {lead_id} manager")
+        logger.info("Creating task for lead %s manager", lead_id)
 
         try:
-            # Получить сделку чтобы узнать responsible_user_id
-            lead_response = await self._make_request("GET", f"/api/v4/leads/{lead_id}")
-            responsible_user_id = lead_response.get("responsible_user_id")
+            if responsible_user_id is None:
+                # Получить сделку чтобы узнать responsible_user_id
+                lead_response = await self._make_request("GET", f"/api/v4/leads/{lead_id}")
+                responsible_user_id = lead_response.get("responsible_user_id")
 
             if not responsible_user_id:
-                logger.warning(f"Lead {lead_id} has no responsible_user_id, cannot create task")
+                logger.warning("Lead %s has no responsible_user_id, cannot create task", lead_id)
                 raise ValueError(f"Lead {lead_id} has no responsible_user_id")
 
-            logger.info(f"Lead manager: user_id={responsible_user_id}")
+            logger.info("Lead manager: user_id=%s", responsible_user_id)
 
             # Создать задачу
             task_data = {
                 "text": text,
-                "complete_till": int(datetime.now().timestamp()) + 86400,  # +1 день
+                "complete_till": int(time.time()) + 86400,  # +1 день
                 "entity_id": lead_id,
                 "entity_type": "leads",
                 "responsible_user_id": responsible_user_id,
@@ -1272,10 +1833,10 @@ class AmoCRMClient:
 
             response = await self._make_request("POST", "/api/v4/tasks", data=[task_data])
             task_id: int = response["_embedded"]["tasks"][0]["id"]
-            logger.info(f"Task created: {task_id} for user {responsible_user_id}")
+            logger.info("Task created: %s for user %s", task_id, responsible_user_id)
 
             return task_id
 
         except Exception as e:
-            logger.error(f"Error creating task for contact manager: {e}")
+            logger.error("Error creating task for contact manager: %s", e)
             raise
@@ -1,12 +1,21 @@
 """Маппинг enum_id для полей AmoCRM со списками выбора."""
 
+from functools import lru_cache
+
 from app.core.settings import settings
 
+# Таблица str.translate, удаляющая все не-цифры из первых 256 символов (скобки, пробелы, "+", "-")
+_NON_DIGITS = str.maketrans("", "", "".join(chr(code) for code in range(256) if not chr(code).isdigit()))
+
 
+@lru_cache(maxsize=4096)
 def normalize_phone(phone: str) -> str:
     """
     Нормализация телефона к единому формату (только цифры, начинается с 7).
 
+    Результат кэшируется: один и тот же телефон нормализуется многократно
+    за время синхронизации одной оплаты (поиск контакта, сделки, создание).
+
     Примеры:
         +7 (987) 672-60-10 → 79876726010
         +79876726010       → 79876726010
@@ -22,7 +31,10 @@ def normalize_phone(phone: str) -> str:
     if not phone:
         return phone
 
-    digits = "".join(filter(str.isdigit, phone))
+    digits = phone.translate(_NON_DIGITS)
+    if not digits.isdigit():
+        # Остались символы вне latin-1 (редкий случай) - отбираем цифры посимвольно
+        digits = "".join(filter(str.isdigit, digits))
 
     if not digits:
         return phone
@@ -36,19 +48,78 @@ def normalize_phone(phone: str) -> str:
     return digits
 
 
-EXCLUDED_STATUSES = [
-    settings.AMO_STATUS_AUTOPAY_SITE,
-    settings.AMO_STATUS_AUTOPAY_YANDEX,
-    settings.AMO_STATUS_AUTOPAY_PARTNERS,
-    settings.STATUS_SUCCESS,
-    settings.STATUS_CLOSED,
-]
+EXCLUDED_STATUSES = frozenset(
+    {
+        settings.AMO_STATUS_AUTOPAY_SITE,
+        settings.AMO_STATUS_AUTOPAY_YANDEX,
+        settings.AMO_STATUS_AUTOPAY_PARTNERS,
+        settings.STATUS_SUCCESS,
+        settings.STATUS_CLOSED,
+    }
+)
 
-ALLOWED_PIPELINES = [
-    settings.AMO_PIPELINE_SITE,  # Сайт
-    settings.AMO_PIPELINE_PARTNERS,  # Партнеры
-    settings.AMO_PIPELINE_YANDEX,  # Яндекс
-]
+ALLOWED_PIPELINES = frozenset(
+    {
+        settings.AMO_PIPELINE_SITE,  # Сайт
+        settings.AMO_PIPELINE_PARTNERS,  # Партнеры
+        settings.AMO_PIPELINE_YANDEX,  # Яндекс
+    }
+)
+
+# Поиск сделки для OP платежей (utm_source=op): широкий поиск в 17 воронках
+OP_PIPELINES = frozenset(
+    {
+        settings.AMO_PIPELINE_SITE,
+        settings.PIPELINE_SITE_TG,
+        settings.AMO_PIPELINE_YANDEX,
+        settings.AMO_PIPELINE_PARTNERS,
+        settings.PIPELINE_VK_EGE,
+        settings.PIPELINE_VK_OGE,
+        settings.PIPELINE_TG_EGE,
+        settings.PIPELINE_TG_OGE,
+        settings.PIPELINE_TG_BOTS,
+        settings.PIPELINE_TG_AI,
+        settings.PIPELINE_TG_PARENTS,
+        settings.PIPELINE_WEBINARS,
+        settings.PIPELINE_7_8_CLASS,
+        settings.PIPELINE_TG_COPY,
+        settings.PIPELINE_7_8_BRON,
+        settings.PIPELINE_GR,
+        settings.PIPELINE_CROSS,
+    }
+)
+
+OP_EXCLUDED_STATUSES = frozenset(
+    {
+        settings.AMO_STATUS_AUTOPAY_SITE,
+        settings.PIPELINE_SITE_TG_AUTOPAY,
+        settings.AMO_STATUS_AUTOPAY_YANDEX,
+        settings.PIPELINE_WEBINARS_AUTOPAY,
+        settings.AMO_STATUS_AUTOPAY_PARTNERS,
+        settings.PIPELINE_7_8_CLASS_AUTOPAY,
+        settings.STATUS_SUCCESS,
+        settings.STATUS_CLOSED,
+    }
+)
+
+# Поиск сделки по названию "Оплата: ...": узкий поиск в 2 воронках
+PAYMENT_NAME_PIPELINES = frozenset(
+    {
+        settings.AMO_PIPELINE_SITE,
+        settings.PIPELINE_7_8_CLASS,
+    }
+)
+
+PAYMENT_NAME_EXCLUDED_STATUSES = frozenset(
+    {
+        settings.AMO_STATUS_AUTOPAY_SITE,
+        settings.PIPELINE_7_8_CLASS_AUTOPAY,
+        settings.STATUS_SUCCESS,
+        settings.STATUS_CLOSED,
+    }
+)
+
+PAYMENT_LEAD_NAMES = frozenset({"Оплата: ОГЭ", "Оплата: ЕГЭ", "Оплата: Средняя школа"})
 
 SUBJECTS_MAPPING: dict[str, int] = {
     "Обществознание": settings.AMO_SUBJECT_OBSHCHESTVO,
@@ -71,6 +142,40 @@ SUBJECTS_MAPPING: dict[str, int] = {
     "Математика": settings.AMO_LEAD_FIELD_SUBJECT_MATH_7_8,
 }
 
+
+def _normalize_subject_name(name: str) -> str:
+    """Привести название предмета к ключу поиска: без регистра, лишних и неразрывных пробелов."""
+    return " ".join(name.replace("\u00a0", " ").split()).casefold()
+
+
+# Те же предметы по нормализованному названию: "биология  огэ" и "Биология ОГЭ" совпадают
+_SUBJECTS_BY_NORMALIZED_NAME: dict[str, int] = {
+    _normalize_subject_name(name): enum_id for name, enum_id in SUBJECTS_MAPPING.items()
+}
+
+
+CLASS_TO_DIRECTION: dict[int, int] = {
+    7: settings.AMO_DIRECTION_CLASS_7,  # "Математика 7 класс 2к26"
+    8: settings.AMO_DIRECTION_CLASS_8,  # "Математика 8 класс 2к26"
+    9: settings.AMO_DIRECTION_CLASS_9,  # "Весенний курс 2к26 ОГЭ"
+    10: settings.AMO_DIRECTION_CLASS_10,  # "Весенний курс 2к26 ЕГЭ 10 класс"
+    11: settings.AMO_DIRECTION_CLASS_11,  # "Весенний курс 2к26 ЕГЭ 11 класс"
+}
+
+
+def get_subject_enum_id(subject_name: str) -> int | None:
+    """
+    Получить enum_id предмета по названию (без учета регистра и лишних пробелов).
+
+    Args:
+        subject_name: Название предмета
+
+    Returns:
+        enum_id для AmoCRM или None, если предмет неизвестен
+    """
+    return _SUBJECTS_BY_NORMALIZED_NAME.get(_normalize_subject_name(subject_name)) or None
+
+
 def get_subject_enum_ids(subject_names: list[str]) -> list[int]:
     """
     Получить список enum_id для предметов.
@@ -81,12 +186,7 @@ def get_subject_enum_ids(subject_names: list[str]) -> list[int]:
     Returns:
         Список enum_id для AmoCRM (пропускает неизвестные предметы)
     """
-    enum_ids = []
-    for name in subject_names:
-        enum_id = SUBJECTS_MAPPING.get(name)
-        if enum_id:
-            enum_ids.append(enum_id)
-    return enum_ids
+    return [enum_id for enum_id in map(get_subject_enum_id, subject_names) if enum_id]
 
 
 def get_direction_enum_id_by_class(user_class: int) -> int | None:
@@ -99,19 +199,16 @@ def get_direction_enum_id_by_class(user_class: int) -> int | None:
     Returns:
         enum_id для AmoCRM или None если класс не поддерживается
     """
-    class_to_direction = {
-        7: settings.AMO_DIRECTION_CLASS_7,   # "Математика 7 класс 2к26"
-        8: settings.AMO_DIRECTION_CLASS_8,   # "Математика 8 класс 2к26"
-        9: settings.AMO_DIRECTION_CLASS_9,   # "Весенний курс 2к26 ОГЭ"
-        10: settings.AMO_DIRECTION_CLASS_10, # "Весенний курс 2к26 ЕГЭ 10 класс"
-        11: settings.AMO_DIRECTION_CLASS_11, # "Весенний курс 2к26 ЕГЭ 11 класс"
-    }
-    return class_to_direction.get(user_class)
+    return CLASS_TO_DIRECTION.get(user_class)
 
 
+@lru_cache(maxsize=1024)
 def get_direction_enum_id_by_course_name(course_name: str) -> int | None:
     """
     Получить enum_id направления по названию курса.
+
+    Результат кэшируется: названий курсов немного, и одни и те же
+    приходят в каждой оплате.
     
     Логика (приоритет по порядку):
     1. Марафон 2к26 ЕГЭ → 1368150
@@ -129,7 +226,7 @@ def get_direction_enum_id_by_course_name(course_name: str) -> int | None:
     course_lower = course_name.lower()
     
     # ПРИОРИТЕТ 1: Марафон 2к26 ЕГЭ
-    if "марафон 2к26" in course_lower or "марафон" in course_lower:
+    if "марафон" in course_lower:
         return settings.AMO_DIRECTION_MARATHON_2026  # Марафон 2к26 ЕГЭ (1368150)
     
     # ПРИОРИТЕТ 2: Годовой курс 2к27
@@ -144,7 +241,7 @@ def get_direction_enum_id_by_course_name(course_name: str) -> int | None:
             return settings.AMO_DIRECTION_ANNUAL_2027_CLASS_8   # Годовой курс 2к27 ОГЭ 8 класс (1381133)
     
     # ПРИОРИТЕТ 3: Весенний курс 2к26
-    if "весенний курс" in course_lower or "весенний курс 2к26" in course_lower:
+    if "весенний курс" in course_lower:
         if "11 класс" in course_lower:
             return settings.AMO_DIRECTION_CLASS_11  # Весенний курс 2к26 ЕГЭ 11 класс (1380927)
         elif "10 класс" in course_lower:
@@ -161,9 +258,12 @@ def get_direction_enum_id_by_course_name(course_name: str) -> int | None:
     return None
 
 
+@lru_cache(maxsize=1024)
 def get_course_type_enum_id(course_name: str) -> int | None:
     """
     Определить тип курса (Standart/PRO) по названию.
+
+    Результат кэшируется, как и в get_direction_enum_id_by_course_name.
     
     Работает ТОЛЬКО для новых курсов:
     - Марафон 2к26 ЕГЭ
@@ -188,7 +288,6 @@ def get_course_type_enum_id(course_name: str) -> int | None:
     
     # Проверяем только для новых курсов
     is_new_course = (
-        "марафон 2к26" in course_lower or
         "марафон" in course_lower or
         "годовой курс 2к27" in course_lower or
         "годовой 2к27" in course_lower or
@@ -0,0 +1,49 @@
+"""Настройка логирования без блокировки event loop."""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_LISTENER: QueueListener | None = None
+
+
+def setup_logging(level: str) -> QueueListener:
+    """
+    Настроить корневой логгер через QueueHandler + QueueListener.
+
+    Подстановка аргументов в сообщение (QueueHandler.prepare) выполняется
+    в вызывающем потоке, а в отдельный поток listener вынесены только
+    сборка итоговой строки по LOG_FORMAT и запись в stderr.
+    Повторный вызов меняет только уровень и возвращает уже запущенный listener.
+
+    Args:
+        level: Уровень логирования (DEBUG, INFO, WARNING, ERROR)
+
+    Returns:
+        Запущенный QueueListener (останавливается автоматически при выходе)
+    """
+    global _LISTENER  # pylint: disable=global-statement
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper()))
+
+    if _LISTENER is not None:
+        return _LISTENER
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+
+    _LISTENER = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _LISTENER.start()
+    # Дописать оставшиеся в очереди записи при завершении процесса
+    atexit.register(_LISTENER.stop)
+
+    return _LISTENER
@@ -0,0 +1,236 @@
+"""Асинхронные ограничители частоты и параллельности запросов к внешним API."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket для ограничения частоты запросов в asyncio.
+
+    Токены пополняются лениво по монотонным часам при каждом обращении,
+    поэтому фоновая задача не нужна. Ожидающие обслуживаются по очереди
+    через asyncio.Lock.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """
+        Инициализация bucket.
+
+        Args:
+            rate: Скорость пополнения (токенов в секунду)
+            capacity: Максимальное количество токенов (по умолчанию равно rate)
+
+        Raises:
+            ValueError: Если rate или capacity не положительные
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        capacity = rate if capacity is None else capacity
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive, got {capacity}")
+
+        self._rate = float(rate)
+        self._capacity = float(capacity)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def rate(self) -> float:
+        """Скорость пополнения (токенов в секунду)."""
+        return self._rate
+
+    @property
+    def capacity(self) -> float:
+        """Максимальное количество токенов."""
+        return self._capacity
+
+    def _get_lock(self) -> asyncio.Lock:
+        """Получить Lock, привязанный к текущему event loop."""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self) -> None:
+        """Начислить токены за время, прошедшее с последнего обращения."""
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self._capacity, self._tokens + elapsed * self._rate)
+            self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """
+        Дождаться и забрать токены из bucket.
+
+        Args:
+            tokens: Количество токенов (не больше capacity)
+
+        Raises:
+            ValueError: Если запрошено больше токенов, чем вмещает bucket
+        """
+        if tokens > self._capacity:
+            raise ValueError(f"Cannot acquire {tokens} tokens, capacity is {self._capacity}")
+
+        # Lock держится и во время ожидания: следующие ждут своей очереди, а не опрашивают bucket
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self._tokens) / self._rate)
+
+
+class DynamicLimiter:
+    """
+    Ограничитель числа одновременных задач с изменяемым лимитом.
+
+    В отличие от asyncio.Semaphore, лимит можно менять во время работы
+    через set_max(): счетчик задач в работе и лимит защищены asyncio.Condition.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        """
+        Инициализация ограничителя.
+
+        Args:
+            max_concurrency: Максимальное число одновременных задач
+
+        Raises:
+            ValueError: Если лимит меньше 1
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be >= 1, got {max_concurrency}")
+
+        self._max = max_concurrency
+        self._in_flight = 0
+        self._condition: asyncio.Condition | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def max_concurrency(self) -> int:
+        """Текущий лимит одновременных задач."""
+        return self._max
+
+    @property
+    def in_flight(self) -> int:
+        """Число задач в работе."""
+        return self._in_flight
+
+    def _get_condition(self) -> asyncio.Condition:
+        """Получить Condition, привязанный к текущему event loop."""
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self) -> None:
+        """Дождаться свободного слота и занять его."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self._max)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        """Освободить слот и разбудить одну ожидающую задачу."""
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify(1)
+
+    async def set_max(self, max_concurrency: int) -> None:
+        """
+        Изменить лимит одновременных задач.
+
+        При уменьшении лимита задачи в работе не прерываются,
+        новые просто ждут, пока их число не опустится ниже лимита.
+
+        Args:
+            max_concurrency: Новый лимит
+
+        Raises:
+            ValueError: Если лимит меньше 1
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be >= 1, got {max_concurrency}")
+
+        condition = self._get_condition()
+        async with condition:
+            self._max = max_concurrency
+            logger.info("Concurrency limit changed: max=%d, in_flight=%d", self._max, self._in_flight)
+            condition.notify_all()
+
+    async def __aenter__(self) -> "DynamicLimiter":
+        """Занять слот в async with."""
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Освободить слот при выходе из async with."""
+        await self.release()
+
+
+class AdaptiveLimiter(DynamicLimiter):
+    """
+    DynamicLimiter, который сам подстраивает лимит по ответам 429 (AIMD).
+
+    Если доля 429 среди последних window ответов превышает threshold,
+    лимит уменьшается вдвое. После recover_after успешных ответов подряд
+    лимит увеличивается на 1, но не выше исходного.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        window: int = 20,
+        threshold: float = 0.1,
+        recover_after: int = 20,
+    ) -> None:
+        """
+        Инициализация ограничителя.
+
+        Args:
+            max_concurrency: Исходный (и максимальный) лимит одновременных задач
+            window: Сколько последних ответов учитывается при расчете доли 429
+            threshold: Доля 429, при превышении которой лимит уменьшается
+            recover_after: Сколько успешных ответов подряд нужно для увеличения лимита
+        """
+        super().__init__(max_concurrency)
+        self._ceiling = max_concurrency
+        self._threshold = threshold
+        self._recover_after = recover_after
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._successes = 0
+
+    async def record(self, rate_limited: bool) -> None:
+        """
+        Учесть результат запроса.
+
+        Args:
+            rate_limited: True если сервер ответил 429
+        """
+        self._outcomes.append(rate_limited)
+
+        if rate_limited:
+            self._successes = 0
+            if self._max > 1 and sum(self._outcomes) / len(self._outcomes) > self._threshold:
+                logger.warning("Too many 429 responses, reducing concurrency to %d", max(1, self._max // 2))
+                await self.set_max(max(1, self._max // 2))
+                self._outcomes.clear()
+            return
+
+        self._successes += 1
+        if self._successes >= self._recover_after and self._max < self._ceiling:
+            self._successes = 0
+            await self.set_max(self._max + 1)
@@ -144,6 +144,45 @@ class Settings(BaseSettings):
     RETRY_WAIT_MIN: int = Field(default=2, description="Минимальное время ожидания между попытками (сек)", ge=1)
     RETRY_WAIT_MAX: int = Field(default=10, description="Максимальное время ожидания между попытками (сек)", ge=1)
 
+    AMO_RATE_LIMIT_PER_SECOND: float = Field(
+        default=7.0, description="Максимум запросов в секунду к AmoCRM API (token bucket)", gt=0
+    )
+
+    # Ограничение входящих запросов по IP (формат limits: "60/minute")
+    RATE_LIMIT_PAYMENT: str = Field(default="60/minute", description="Лимит запросов к /webhook/payment с одного IP")
+    RATE_LIMIT_BATCH: str = Field(default="5/minute", description="Лимит запросов к /webhook/payment-batch с одного IP")
+    MAX_CONCURRENT_BATCH_JOBS: int = Field(
+        default=2, description="Максимум одновременно выполняемых batch задач", ge=1
+    )
+    BATCH_MAX_CONCURRENCY: int = Field(
+        default=3, description="Сколько оплат одного батча обрабатывается одновременно", ge=1, le=10
+    )
+
+    AMO_MAX_CONCURRENCY: int = Field(
+        default=5,
+        description="Максимум одновременных запросов к AmoCRM (автоматически снижается при ответах 429)",
+        ge=1,
+    )
+    AMO_PARALLEL_LOOKUPS: bool = Field(
+        default=False,
+        description="Искать контакт по tg_id/телефону/email одновременно (до 3 запросов на оплату). "
+        "False - последовательно с остановкой на первом найденном (меньше запросов)",
+    )
+    AMO_PATCH_COALESCE_WINDOW: float = Field(
+        default=0,
+        description="Окно (сек) для объединения PATCH контактов/сделок из параллельных оплат в один запрос. "
+        "Каждый PATCH ждет окно, даже без параллельных оплат. 0 - отправлять каждый PATCH отдельно",
+        ge=0,
+    )
+
+    AMO_CONTACT_CACHE_TTL: float = Field(
+        default=0,
+        description="Время (сек) хранения найденных контактов в кэше поиска. "
+        "Сбрасывается при создании/обновлении контакта этим процессом, но не видит правок, "
+        "слияний и удалений в самом AmoCRM. 0 - кэш отключен",
+        ge=0,
+    )
+
     LOG_LEVEL: str = Field(default="INFO", description="Уровень логирования (DEBUG, INFO, WARNING, ERROR)")
 
     # Webhook security
@@ -127,10 +127,10 @@ class EventLogger:
                 
                 self._db_initialized = True
 
-                logger.info(f"База данных инициализирована: {self.db_path}")
+                logger.info("База данных инициализирована: %s", self.db_path)
 
             except Exception as e:
-                logger.error(f"Ошибка при инициализации базы данных: {e}")
+                logger.error("Ошибка при инициализации базы данных: %s", e)
                 raise
 
     async def is_payment_processed(self, payment_id: str) -> bool:
@@ -157,14 +157,14 @@ class EventLogger:
             exists = count > 0
 
             if exists:
-                logger.warning(f"Платеж {payment_id} уже обработан (дубликат)")
+                logger.warning("Платеж %s уже обработан (дубликат)", payment_id)
             else:
-                logger.debug(f"Платеж {payment_id} еще не обработан")
+                logger.debug("Платеж %s еще не обработан", payment_id)
 
             return exists
 
         except Exception as e:
-            logger.error(f"Ошибка при проверке дубликата: {e}")
+            logger.error("Ошибка при проверке дубликата: %s", e)
             raise
 
     async def log_payment(
@@ -232,13 +232,13 @@ class EventLogger:
 
                 await db.commit()
 
-            logger.info(f"Платеж {payment_id} залогирован: " f"status={status}, contact={contact_id}, lead={lead_id}")
+            logger.info("Платеж %s залогирован: status=%s, contact=%s, lead=%s", payment_id, status, contact_id, lead_id)
 
         except aiosqlite.IntegrityError as e:
-            logger.warning(f"Попытка повторной записи платежа {payment_id}: {e}")
+            logger.warning("Попытка повторной записи платежа %s: %s", payment_id, e)
             raise
         except Exception as e:
-            logger.error(f"Ошибка при логировании платежа: {e}")
+            logger.error("Ошибка при логировании платежа: %s", e)
             raise
 
     async def get_payment_by_id(self, payment_id: str) -> dict | None:
@@ -266,7 +266,7 @@ class EventLogger:
                     return None
 
         except Exception as e:
-            logger.error(f"Ошибка при получении платежа: {e}")
+            logger.error("Ошибка при получении платежа: %s", e)
             raise
 
     async def get_payments_for_date(self, date: str) -> list[dict]:
@@ -296,7 +296,7 @@ class EventLogger:
                     return [dict(row) for row in rows]
 
         except Exception as e:
-            logger.error(f"Ошибка при получении платежей за дату: {e}")
+            logger.error("Ошибка при получении платежей за дату: %s", e)
             raise
 
     async def get_stats(self) -> dict:
@@ -360,7 +360,7 @@ class EventLogger:
                 }
 
         except Exception as e:
-            logger.error(f"Ошибка при получении статистики: {e}")
+            logger.error("Ошибка при получении статистики: %s", e)
             raise
 
     async def cleanup_old_records(self, days: int = 30) -> int:
@@ -398,9 +398,9 @@ class EventLogger:
 
                 await db.commit()
 
-                logger.info(f"Удалено старых записей (старше {days} дней): {count_before}")
+                logger.info("Удалено старых записей (старше %s дней): %s", days, count_before)
                 return count_before
 
         except Exception as e:
-            logger.error(f"Ошибка при очистке старых записей: {e}")
+            logger.error("Ошибка при очистке старых записей: %s", e)
             raise
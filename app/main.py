@@ -1,28 +1,49 @@
 """Главное FastAPI приложение для приема webhook от платформы оплаты."""
 
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.middleware import SlowAPIMiddleware
 
+from app.api.webhook_payment import get_payment_processor, limiter
 from app.api.webhook_payment import router as webhook_router
+from app.core.logging_setup import setup_logging
 from app.core.settings import settings
 
-logging.basicConfig(
-    level=getattr(logging, settings.LOG_LEVEL.upper()),
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+setup_logging(settings.LOG_LEVEL)
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Жизненный цикл приложения: закрыть пул соединений AmoCRM при остановке."""
+    yield
+    if get_payment_processor.cache_info().currsize:
+        await get_payment_processor().client.aclose()
+        logger.info("AmoCRM HTTP client closed")
+
+
 app = FastAPI(
     title="Platform Payment Sync",
     description="Сервис для автоматической фиксации оплат из платформы pl.el-ed.ru в amoCRM",
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)  # type: ignore[arg-type]
+app.add_middleware(SlowAPIMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.ALLOWED_ORIGINS.split(","),
@@ -35,11 +56,11 @@ app.include_router(webhook_router)
 
 logger.info("=" * 80)
 logger.info("Platform Payment Sync Service started")
-logger.info(f"Log level: {settings.LOG_LEVEL}")
-logger.info(f"AmoCRM Base URL: {settings.AMO_BASE_URL}")
-logger.info(f"Target Pipeline ID: {settings.AMO_PIPELINE_ID}")
-logger.info(f"CREATE_IF_NOT_FOUND: {settings.CREATE_IF_NOT_FOUND}")
-logger.info(f"Allowed CORS origins: {settings.ALLOWED_ORIGINS}")
+logger.info("Log level: %s", settings.LOG_LEVEL)
+logger.info("AmoCRM Base URL: %s", settings.AMO_BASE_URL)
+logger.info("Target Pipeline ID: %s", settings.AMO_PIPELINE_ID)
+logger.info("CREATE_IF_NOT_FOUND: %s", settings.CREATE_IF_NOT_FOUND)
+logger.info("Allowed CORS origins: %s", settings.ALLOWED_ORIGINS)
 logger.info("=" * 80)
 
 
@@ -5,7 +5,12 @@ from dataclasses import dataclass
 from datetime import datetime
 
 from app.core.amocrm_client import AmoCRMClient
-from app.core.amocrm_mappings import SUBJECTS_MAPPING, get_direction_enum_id_by_class, get_direction_enum_id_by_course_name, get_course_type_enum_id
+from app.core.amocrm_mappings import (
+    get_course_type_enum_id,
+    get_direction_enum_id_by_class,
+    get_direction_enum_id_by_course_name,
+    get_subject_enum_id,
+)
 from app.core.settings import settings
 from app.db.event_logger import EventLogger
 from app.models.payment_webhook import PaymentUTM, PaymentWebhook
@@ -73,8 +78,9 @@ class PaymentProcessor:
         """
         if user_class in [7, 8]:
             logger.info(
-                f"Класс {user_class} обнаружен → воронка '7/8 класс' "
-                f"(ID={settings.PIPELINE_7_8_CLASS}) → Автооплаты ООО (ID={settings.PIPELINE_7_8_CLASS_AUTOPAY})"
+                "Класс %s обнаружен → воронка '7/8 класс' "
+                "(ID=%s) → Автооплаты ООО (ID=%s)",
+                user_class, settings.PIPELINE_7_8_CLASS, settings.PIPELINE_7_8_CLASS_AUTOPAY,
             )
             return (
                 settings.PIPELINE_7_8_CLASS,
@@ -84,14 +90,15 @@ class PaymentProcessor:
         utm_source = (utm.source or "").lower()
         utm_medium = (utm.medium or "").lower()
 
-        logger.info(f"Определение воронки: user_class={user_class}, utm_source='{utm_source}', utm_medium='{utm_medium}'")
+        logger.info("Определение воронки: user_class=%s, utm_source='%s', utm_medium='%s'", user_class, utm_source, utm_medium)
 
         partner_sources = settings.PARTNER_SOURCES.split(",")
         for partner in partner_sources:
             if partner.strip().lower() in utm_source:
                 logger.info(
-                    f"UTM совпали: ПАРТНЕРЫ (ID={settings.AMO_PIPELINE_PARTNERS}, "
-                    f"utm_source содержит '{partner}') → Автооплаты ООО"
+                    "UTM совпали: ПАРТНЕРЫ (ID=%s, "
+                    "utm_source содержит '%s') → Автооплаты ООО",
+                    settings.AMO_PIPELINE_PARTNERS, partner,
                 )
                 return (
                     settings.AMO_PIPELINE_PARTNERS,
@@ -102,15 +109,16 @@ class PaymentProcessor:
         for medium in yandex_mediums:
             if medium.strip().lower() in utm_medium:
                 logger.info(
-                    f"UTM совпали: Сайт Яндекс (ID={settings.AMO_PIPELINE_YANDEX}, "
-                    f"utm_medium содержит '{medium}') → Автооплаты ООО"
+                    "UTM совпали: Сайт Яндекс (ID=%s, "
+                    "utm_medium содержит '%s') → Автооплаты ООО",
+                    settings.AMO_PIPELINE_YANDEX, medium,
                 )
                 return (
                     settings.AMO_PIPELINE_YANDEX,
                     settings.AMO_STATUS_AUTOPAY_YANDEX,
                 )
 
-        logger.info(f"UTM НЕ совпали: Сайт (ID={settings.AMO_PIPELINE_SITE}, по умолчанию) → Автооплаты ООО")
+        logger.info("UTM НЕ совпали: Сайт (ID=%s, по умолчанию) → Автооплаты ООО", settings.AMO_PIPELINE_SITE)
         return (
             settings.AMO_PIPELINE_SITE,
             settings.AMO_STATUS_AUTOPAY_SITE,
@@ -120,6 +128,22 @@ class PaymentProcessor:
         """
         Обработать оплату с платформы.
 
+        Все запросы к AmoCRM выполняются в одной request_scope клиента,
+        поэтому повторные одинаковые GET запросы не уходят в API.
+
+        Args:
+            payment: Данные об оплате
+
+        Returns:
+            ProcessResult с результатом обработки
+        """
+        async with self.client.request_scope():
+            return await self._process_payment(payment)
+
+    async def _process_payment(self, payment: PaymentWebhook) -> ProcessResult:
+        """
+        Обработать оплату с платформы.
+
         Шаги обработки:
         1. Проверка дубликата по payment_id
         2. Матчинг контакта (tg_id → phone → email)
@@ -138,13 +162,13 @@ class PaymentProcessor:
         """
         payment_id = payment.payment_id or "unknown"
         logger.info("=" * 80)
-        logger.info(f"Начало обработки оплаты: payment_id={payment_id}")
+        logger.info("Начало обработки оплаты: payment_id=%s", payment_id)
         logger.info("=" * 80)
 
         try:
             # Шаг 1: Проверка дубликата по payment_id
             if await self.event_logger.is_payment_processed(payment_id):
-                logger.warning(f"Payment {payment_id} already processed (duplicate)")
+                logger.warning("Payment %s already processed (duplicate)", payment_id)
                 return ProcessResult(
                     status="duplicate",
                     message=f"Payment {payment_id} already processed",
@@ -166,15 +190,15 @@ class PaymentProcessor:
             # ШАГ 0: ЕСЛИ amo_payment_id указан - прямой поиск по ID сделки
             if amo_payment_id is not None:
                 logger.info("=" * 80)
-                logger.info(f"ШАГ 0: amo_payment_id={amo_payment_id} указан - прямой поиск сделки по ID")
+                logger.info("ШАГ 0: amo_payment_id=%s указан - прямой поиск сделки по ID", amo_payment_id)
                 logger.info("=" * 80)
 
                 existing_lead = await self.client.get_lead_by_id(amo_payment_id)
 
                 if existing_lead:
-                    logger.info(f"Сделка найдена по amo_payment_id: {existing_lead['id']}")
+                    logger.info("Сделка найдена по amo_payment_id: %s", existing_lead['id'])
                 else:
-                    logger.error(f"Сделка {amo_payment_id} не найдена в AmoCRM!")
+                    logger.error("Сделка %s не найдена в AmoCRM!", amo_payment_id)
                     raise ValueError(f"Lead {amo_payment_id} not found")
 
             # ЕСЛИ amo_payment_id НЕ указан - стандартная логика поиска
@@ -192,7 +216,7 @@ class PaymentProcessor:
                 )
 
                 if existing_lead:
-                    logger.info(f"Сделка с названием 'Оплата:...' найдена: {existing_lead['id']}")
+                    logger.info("Сделка с названием 'Оплата:...' найдена: %s", existing_lead['id'])
 
             # ШАГ 2: ЕСЛИ utm_source=op И сделка не найдена на шаге 1
             if amo_payment_id is None and is_op_utm and not existing_lead:
@@ -208,7 +232,7 @@ class PaymentProcessor:
                 )
 
                 if existing_lead:
-                    logger.info(f"OP сделка найдена в расширенном поиске: {existing_lead['id']}")
+                    logger.info("OP сделка найдена в расширенном поиске: %s", existing_lead['id'])
 
             # ШАГ 2.1: ЕСЛИ single_course_pay=True И сделка не найдена на шагах 1-2
             if amo_payment_id is None and single_course_pay and not existing_lead:
@@ -224,7 +248,7 @@ class PaymentProcessor:
                 )
 
                 if existing_lead:
-                    logger.info(f"Сделка найдена для single_course_pay: {existing_lead['id']}")
+                    logger.info("Сделка найдена для single_course_pay: %s", existing_lead['id'])
 
             # ШАГ 2.5: ЕСЛИ СДЕЛКА НАЙДЕНА - проверить, не в необработанном ли этапе
             # ИСКЛЮЧЕНИЕ: Если single_course_pay=True ИЛИ amo_payment_id указан - НЕ игнорируем, обновляем как есть
@@ -245,8 +269,9 @@ class PaymentProcessor:
                 if current_status in unprocessed:
                     logger.info("=" * 80)
                     logger.info(
-                        f"СДЕЛКА {existing_lead['id']} В НЕОБРАБОТАННОМ ЭТАПЕ "
-                        f"(pipeline={current_pipeline}, status={current_status})"
+                        "СДЕЛКА %s В НЕОБРАБОТАННОМ ЭТАПЕ "
+                        "(pipeline=%s, status=%s)",
+                        existing_lead['id'], current_pipeline, current_status,
                     )
                     logger.info("ИГНОРИРУЕМ её → создаем новую сделку в автооплатах")
                     logger.info("=" * 80)
@@ -267,33 +292,42 @@ class PaymentProcessor:
                 contact_id = embedded_contacts[0]["id"] if embedded_contacts else None
 
                 if not contact_id:
-                    logger.error(f"Lead {lead_id} has no contacts!")
+                    logger.error("Lead %s has no contacts!", lead_id)
                     raise ValueError(f"Lead {lead_id} has no contacts")
 
                 logger.info(
-                    f"Обновляем сделку: lead_id={lead_id}, contact_id={contact_id}, "
-                    f"pipeline={current_pipeline}, status={current_status}"
+                    "Обновляем сделку: lead_id=%s, contact_id=%s, "
+                    "pipeline=%s, status=%s",
+                    lead_id, contact_id, current_pipeline, current_status,
                 )
 
                 # Обновить только поля платежа (БЕЗ status_id и БЕЗ перезаписи UTM!)
-                await self._update_lead_fields(lead_id, payment, status_id=None, skip_utm=True)
+                # Сделка получена в этом же запросе - ее поля (счетчик покупок) уже известны
+                await self._update_lead_fields(
+                    lead_id,
+                    payment,
+                    status_id=None,
+                    skip_utm=True,
+                    known_fields=existing_lead.get("custom_fields_values") or [],
+                )
 
                 # Добавить примечание
                 await self._add_payment_note(lead_id, payment)
 
                 # Создать задачу для менеджера сделки
-                logger.info(f"Создание задачи для менеджера сделки {lead_id}")
+                logger.info("Создание задачи для менеджера сделки %s", lead_id)
                 try:
                     task_id = await self.client.create_task_for_contact_manager(
                         lead_id=lead_id,
                         text="Пришел платеж. Проверь все данные на корректность и отправь сделку в нужный этап",
+                        responsible_user_id=existing_lead.get("responsible_user_id"),
                     )
-                    logger.info(f"Задача создана: task_id={task_id}")
+                    logger.info("Задача создана: task_id=%s", task_id)
                 except Exception as task_error:
-                    logger.error(f"Ошибка создания задачи: {task_error}")
+                    logger.error("Ошибка создания задачи: %s", task_error)
                     # Продолжаем выполнение, задача не критична
 
-                logger.info(f"Платеж {payment_id} обработан успешно (существующая сделка обновлена)")
+                logger.info("Платеж %s обработан успешно (существующая сделка обновлена)", payment_id)
                 logger.info("=" * 80)
 
                 await self.event_logger.log_payment(
@@ -327,7 +361,7 @@ class PaymentProcessor:
             user_class = payment.course_order.user.user_class
             pipeline_id, status_id = self.determine_pipeline_and_status(utm, user_class)
 
-            logger.info(f"Целевая воронка: pipeline_id={pipeline_id}, status_id={status_id}")
+            logger.info("Целевая воронка: pipeline_id=%s, status_id=%s", pipeline_id, status_id)
 
             # ========================================================================
             # СТАРАЯ ЛОГИКА (ЗАКОММЕНТИРОВАНА): Поиск существующего контакта
@@ -364,7 +398,7 @@ class PaymentProcessor:
                 tg_id=tg_id,
                 tg_username=tg_username,
             )
-            logger.info(f"Новый контакт создан: ID={contact_id}")
+            logger.info("Новый контакт создан: ID=%s", contact_id)
 
             # ========================================================================
             # СТАРАЯ ЛОГИКА (ЗАКОММЕНТИРОВАНА): Поиск существующей сделки
@@ -385,7 +419,7 @@ class PaymentProcessor:
             # ========================================================================
 
             # НОВАЯ ЛОГИКА: Всегда создавать новую сделку
-            logger.info(f"Создание новой сделки в воронке {pipeline_id} (этап {status_id})...")
+            logger.info("Создание новой сделки в воронке %s (этап %s)...", pipeline_id, status_id)
 
             user_name = f"{user.first_name} {user.last_name}".strip() or "Клиент без имени"
             lead_name = f"Оплата платформы - {user_name}"
@@ -420,18 +454,19 @@ class PaymentProcessor:
                 is_parent=is_parent_value,
                 promo_code=promo_code_value,
             )
-            logger.info(f"Новая сделка создана: ID={lead_id}")
+            logger.info("Новая сделка создана: ID=%s", lead_id)
 
             lead = {"id": lead_id}
             is_lead_created = True
 
             # Шаг 5: Обновление полей сделки (skip_utm=True, т.к. UTM уже установлены в create_lead)
-            await self._update_lead_fields(lead_id, payment, status_id, skip_utm=True)
+            # Сделка только что создана без счетчика покупок - GET перед обновлением не нужен
+            await self._update_lead_fields(lead_id, payment, status_id, skip_utm=True, known_fields=[])
 
             # Шаг 6: Создание примечания
             await self._add_payment_note(lead_id, payment)
 
-            logger.info(f"Payment {payment_id} processed successfully")
+            logger.info("Payment %s processed successfully", payment_id)
             logger.info("=" * 80)
 
             await self.event_logger.log_payment(
@@ -455,7 +490,7 @@ class PaymentProcessor:
             )
 
         except Exception as e:
-            logger.error(f"Error processing payment {payment_id}: {e}", exc_info=True)
+            logger.error("Error processing payment %s: %s", payment_id, e, exc_info=True)
 
             try:
                 await self.event_logger.log_payment(
@@ -467,7 +502,7 @@ class PaymentProcessor:
                     payload=payment.model_dump_json(),
                 )
             except Exception as log_error:
-                logger.error(f"Failed to log error to database: {log_error}")
+                logger.error("Failed to log error to database: %s", log_error)
 
             return ProcessResult(
                 status="error",
@@ -495,12 +530,12 @@ class PaymentProcessor:
         phone = user.phone or None
         email = user.email or None
 
-        logger.info(f"Поиск контакта: tg_id={tg_id}, phone={phone}, email={email}")
+        logger.info("Поиск контакта: tg_id=%s, phone=%s, email=%s", tg_id, phone, email)
 
         contact = await self.client.find_contact(tg_id=tg_id, phone=phone, email=email)
 
         if contact:
-            logger.info(f"Контакт найден: ID={contact['id']}")
+            logger.info("Контакт найден: ID=%s", contact['id'])
             return contact
 
         logger.warning("Контакт не найден")
@@ -521,7 +556,7 @@ class PaymentProcessor:
             tg_username=tg_username,
         )
 
-        logger.info(f"Контакт создан: ID={contact_id}")
+        logger.info("Контакт создан: ID=%s", contact_id)
         return contact_id
 
     async def _update_contact_fields(self, contact_id: int, payment: PaymentWebhook) -> None:
@@ -541,7 +576,7 @@ class PaymentProcessor:
             logger.info("Нет данных для обновления контакта")
             return
 
-        logger.info(f"Обновление полей контакта {contact_id}...")
+        logger.info("Обновление полей контакта %s...", contact_id)
         await self.client.update_contact_fields(
             contact_id=contact_id,
             tg_id=tg_id,
@@ -571,12 +606,12 @@ class PaymentProcessor:
         phone = user.phone or None
         email = user.email or None
 
-        logger.info(f"Поиск активной сделки для контакта {contact_id}...")
+        logger.info("Поиск активной сделки для контакта %s...", contact_id)
 
         lead = await self.client.find_active_lead(contact_id=contact_id, telegram_id=telegram_id, phone=phone, email=email)
 
         if lead:
-            logger.info(f"Активная сделка найдена: ID={lead['id']}, Pipeline={lead.get('pipeline_id')}")
+            logger.info("Активная сделка найдена: ID=%s, Pipeline=%s", lead['id'], lead.get('pipeline_id'))
             return (lead, False)  # Найдена, не создана
 
         logger.warning("Активная сделка не найдена")
@@ -585,7 +620,7 @@ class PaymentProcessor:
             logger.warning("CREATE_IF_NOT_FOUND=False, сделка не будет создана")
             return None
 
-        logger.info(f"Создание новой сделки в воронке {pipeline_id} (этап {status_id}) с UTM метками...")
+        logger.info("Создание новой сделки в воронке %s (этап %s) с UTM метками...", pipeline_id, status_id)
 
         user_name = f"{user.first_name} {user.last_name}".strip() or "Клиент без имени"
         lead_name = f"Оплата платформы - {user_name}"
@@ -622,11 +657,16 @@ class PaymentProcessor:
             promo_code=promo_code_value,
         )
 
-        logger.info(f"✓ Сделка создана: ID={lead_id}")
+        logger.info("✓ Сделка создана: ID=%s", lead_id)
         return ({"id": lead_id}, True)  # Создана
 
     async def _update_lead_fields(
-        self, lead_id: int, payment: PaymentWebhook, status_id: int | None, skip_utm: bool = False
+        self,
+        lead_id: int,
+        payment: PaymentWebhook,
+        status_id: int | None,
+        skip_utm: bool = False,
+        known_fields: list[dict] | None = None,
     ) -> None:
         """
         Обновить кастомные поля сделки.
@@ -647,8 +687,9 @@ class PaymentProcessor:
             payment: Данные об оплате
             status_id: ID этапа для обновления сделки (если None - этап не меняется)
             skip_utm: Если True - не обновлять UTM метки (используется после create_lead)
+            known_fields: custom_fields_values сделки, если она уже получена (чтобы не запрашивать ее повторно)
         """
-        logger.info(f"Обновление полей сделки {lead_id}...")
+        logger.info("Обновление полей сделки %s...", lead_id)
 
         subjects_enum_ids = []
         direction_enum_id = None
@@ -666,10 +707,10 @@ class PaymentProcessor:
                         course_type_enum_id = get_course_type_enum_id(course_name)
                     
                     if direction_enum_id:
-                        logger.info(f"Direction determined by course name: '{course_name}' → {direction_enum_id}")
+                        logger.info("Direction determined by course name: '%s' → %s", course_name, direction_enum_id)
                         break
         except Exception as e:
-            logger.warning(f"Error determining direction by course name: {e}")
+            logger.warning("Error determining direction by course name: %s", e)
 
         # Приоритет 2: Если по названию не определили, пробуем по классу пользователя
         if direction_enum_id is None:
@@ -678,9 +719,9 @@ class PaymentProcessor:
                 try:
                     direction_enum_id = get_direction_enum_id_by_class(user_class)
                     if direction_enum_id:
-                        logger.info(f"Direction determined by user class: {user_class} → {direction_enum_id}")
+                        logger.info("Direction determined by user class: %s → %s", user_class, direction_enum_id)
                 except Exception as e:
-                    logger.warning(f"Error determining direction by class: {e}")
+                    logger.warning("Error determining direction by class: %s", e)
 
         # Приоритет 3 (Fallback): Старая логика по project (ЕГЭ/ОГЭ)
         if direction_enum_id is None:
@@ -689,29 +730,29 @@ class PaymentProcessor:
                     project_name = item.course.subject.project
                     if project_name == "ОГЭ":
                         direction_enum_id = settings.AMO_DIRECTION_OGE
-                        logger.info(f"Direction determined by project (fallback): 'ОГЭ' → {direction_enum_id}")
+                        logger.info("Direction determined by project (fallback): 'ОГЭ' → %s", direction_enum_id)
                         break
                     elif project_name == "ЕГЭ":
                         direction_enum_id = settings.AMO_DIRECTION_EGE
-                        logger.info(f"Direction determined by project (fallback): 'ЕГЭ' → {direction_enum_id}")
+                        logger.info("Direction determined by project (fallback): 'ЕГЭ' → %s", direction_enum_id)
                         break
             except Exception as e:
-                logger.warning(f"Error determining direction by project: {e}")
+                logger.warning("Error determining direction by project: %s", e)
 
         # Последний fallback: ЕГЭ по умолчанию
         if direction_enum_id is None:
             direction_enum_id = settings.AMO_DIRECTION_EGE
-            logger.warning(f"Direction not determined, using ultimate fallback: EGE → {direction_enum_id}")
+            logger.warning("Direction not determined, using ultimate fallback: EGE → %s", direction_enum_id)
 
         # Собираем предметы
         for item in payment.course_order.course_order_items:
             subject_name = item.course.subject.name
 
-            subject_enum_id = SUBJECTS_MAPPING.get(subject_name)
+            subject_enum_id = get_subject_enum_id(subject_name)
             if subject_enum_id:
                 subjects_enum_ids.append(subject_enum_id)
             else:
-                logger.warning(f"Предмет '{subject_name}' не найден в маппинге")
+                logger.warning("Предмет '%s' не найден в маппинге", subject_name)
 
         subjects_enum_ids = list(set(subjects_enum_ids))
         
@@ -766,12 +807,13 @@ class PaymentProcessor:
             user_class=user_class_value,
             is_parent=is_parent_value,
             promo_code=promo_code_value,
+            known_fields=known_fields,
         )
 
         if status_id:
-            logger.info(f"Поля сделки {lead_id} обновлены, бюджет установлен {amount}, переведена в этап {status_id}")
+            logger.info("Поля сделки %s обновлены, бюджет установлен %s, переведена в этап %s", lead_id, amount, status_id)
         else:
-            logger.info(f"Поля сделки {lead_id} обновлены, бюджет установлен {amount}, этап НЕ изменен (OP платеж)")
+            logger.info("Поля сделки %s обновлены, бюджет установлен %s, этап НЕ изменен (OP платеж)", lead_id, amount)
 
     async def _add_payment_note(self, lead_id: int, payment: PaymentWebhook) -> None:
         """
@@ -796,7 +838,7 @@ class PaymentProcessor:
             lead_id: ID сделки
             payment: Данные об оплате
         """
-        logger.info(f"Создание примечания в сделке {lead_id}...")
+        logger.info("Создание примечания в сделке %s...", lead_id)
 
         user = payment.course_order.user
         order = payment.course_order
@@ -810,7 +852,7 @@ class PaymentProcessor:
             datetime_utc = dt.isoformat() + "Z"
             datetime_local = dt.strftime("%Y-%m-%d %H:%M:%S") + " (Moscow)"
         except Exception as e:
-            logger.warning(f"Ошибка парсинга даты: {e}")
+            logger.warning("Ошибка парсинга даты: %s", e)
             datetime_local = datetime_str
             datetime_utc = datetime_str
 
@@ -859,4 +901,4 @@ class PaymentProcessor:
 
         await self.client.add_lead_note(lead_id, note_text)
 
-        logger.info(f"✓ Примечание добавлено в сделку {lead_id}")
+        logger.info("✓ Примечание добавлено в сделку %s", lead_id)
@@ -0,0 +1,45 @@
+"""Тесты добавления примечаний к сделке на подставном транспорте httpx (без реального AmoCRM)."""
+
+import json
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+
+
+def make_handler(seen: list[httpx.Request]):
+    """Обработчик: успешное создание примечаний."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json={"_embedded": {"notes": [{"id": 1}]}})
+
+    return handler
+
+
+class TestAddLeadNoteMocked:
+    """Тесты add_lead_note."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("text", ["", "   \n"])
+    async def test_empty_note_skipped(self, text: str):
+        """Пустое примечание не отправляется."""
+        seen: list[httpx.Request] = []
+
+        async with AmoCRMClient(transport=httpx.MockTransport(make_handler(seen))) as client:
+            await client.add_lead_note(1, text)
+
+        assert not seen
+
+    @pytest.mark.asyncio
+    async def test_note_sent(self):
+        """Непустое примечание уходит одним POST в примечания сделки."""
+        seen: list[httpx.Request] = []
+
+        async with AmoCRMClient(transport=httpx.MockTransport(make_handler(seen))) as client:
+            await client.add_lead_note(7, "first")
+
+        assert len(seen) == 1
+        assert seen[0].url.path == "/api/v4/leads/7/notes"
+        assert json.loads(seen[0].content) == [{"entity_id": 7, "note_type": "common", "params": {"text": "first"}}]
@@ -0,0 +1,47 @@
+"""Тесты создания задачи менеджеру на подставном транспорте httpx (без реального AmoCRM)."""
+
+import json
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+
+
+def make_handler(seen: list[httpx.Request]):
+    """Обработчик: сделка с ответственным 77 и успешное создание задачи."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        if request.method == "GET":
+            return httpx.Response(200, json={"id": 1, "responsible_user_id": 77})
+        return httpx.Response(200, json={"_embedded": {"tasks": [{"id": 500}]}})
+
+    return handler
+
+
+class TestCreateTaskMocked:
+    """Тесты create_task_for_contact_manager."""
+
+    @pytest.mark.asyncio
+    async def test_known_responsible_skips_lead_get(self):
+        """Переданный responsible_user_id используется без GET сделки."""
+        seen: list[httpx.Request] = []
+
+        async with AmoCRMClient(transport=httpx.MockTransport(make_handler(seen))) as client:
+            task_id = await client.create_task_for_contact_manager(1, "text", responsible_user_id=88)
+
+        assert task_id == 500
+        assert [request.method for request in seen] == ["POST"]
+        assert json.loads(seen[0].content)[0]["responsible_user_id"] == 88
+
+    @pytest.mark.asyncio
+    async def test_responsible_fetched_when_unknown(self):
+        """Без responsible_user_id ответственный берется из сделки."""
+        seen: list[httpx.Request] = []
+
+        async with AmoCRMClient(transport=httpx.MockTransport(make_handler(seen))) as client:
+            await client.create_task_for_contact_manager(1, "text")
+
+        assert [request.method for request in seen] == ["GET", "POST"]
+        assert json.loads(seen[1].content)[0]["responsible_user_id"] == 77
@@ -0,0 +1,445 @@
+"""Тесты поиска контакта и сделки на подставном транспорте httpx (без реального AmoCRM)."""
+
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import _REQUEST_CACHE, AmoCRMClient
+from app.core.amocrm_mappings import ALLOWED_PIPELINES
+
+CONTACTS_BY_QUERY = {
+    "123456": [{"id": 1}],
+    "79991234567": [{"id": 2}],
+    "user@example.com": [{"id": 3}],
+}
+
+
+def contacts_handler(request: httpx.Request) -> httpx.Response:
+    """Вернуть контакты по значению query."""
+    contacts = CONTACTS_BY_QUERY.get(request.url.params.get("query", ""), [])
+    if not contacts:
+        return httpx.Response(204)
+    return httpx.Response(200, json={"_embedded": {"contacts": contacts}})
+
+
+class TestFindContactMocked:
+    """Тесты приоритета tg_id -> phone -> email."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("parallel", [True, False])
+    async def test_priority_tg_id_first(self, parallel: bool):
+        """При совпадении по нескольким полям выбирается контакт по tg_id."""
+        with patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", parallel):
+            async with AmoCRMClient(transport=httpx.MockTransport(contacts_handler)) as client:
+                contact = await client.find_contact("123456", "+7 999 123-45-67", "user@example.com")
+
+        assert contact == {"id": 1}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("parallel", [True, False])
+    async def test_falls_back_to_email(self, parallel: bool):
+        """Если tg_id и телефон не найдены, используется email."""
+        with patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", parallel):
+            async with AmoCRMClient(transport=httpx.MockTransport(contacts_handler)) as client:
+                contact = await client.find_contact("000", "+7 000 000-00-00", "user@example.com")
+
+        assert contact == {"id": 3}
+
+    @pytest.mark.asyncio
+    async def test_not_found(self):
+        """Если контакт не найден ни по одному полю, возвращается None."""
+        async with AmoCRMClient(transport=httpx.MockTransport(contacts_handler)) as client:
+            assert await client.find_contact(None, "+7 000 000-00-00", None) is None
+
+    @pytest.mark.asyncio
+    async def test_no_identifiers_skips_requests(self):
+        """Без tg_id, телефона и email (или с пустыми строками) запросы не выполняются."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(204)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            assert await client.find_contact(None, "  ", "") is None
+            assert await client.find_active_lead(contact_id=1, telegram_id="", phone=None, email=" ") is None
+
+        assert seen == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("parallel", [True, False])
+    async def test_phone_normalized_once(self, parallel: bool):
+        """Телефон нормализуется один раз в find_contact и не нормализуется повторно."""
+        with (
+            patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", parallel),
+            patch("app.core.amocrm_client.normalize_phone", return_value="79991234567") as mock_normalize,
+        ):
+            async with AmoCRMClient(transport=httpx.MockTransport(contacts_handler)) as client:
+                contact = await client.find_contact(None, "+7 999 123-45-67", None)
+
+        assert contact == {"id": 2}
+        mock_normalize.assert_called_once_with("+7 999 123-45-67")
+
+
+    @pytest.mark.asyncio
+    async def test_parallel_returns_without_waiting_lower_priority(self):
+        """Найденный по tg_id контакт возвращается, не дожидаясь поиска по телефону и email."""
+        never = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.params.get("query") != "123456":
+                await never.wait()
+            return contacts_handler(request)
+
+        with patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", True):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                contact = await asyncio.wait_for(
+                    client.find_contact("123456", "+7 999 123-45-67", "user@example.com"), timeout=5
+                )
+
+        assert contact == {"id": 1}
+
+
+    @pytest.mark.asyncio
+    async def test_repeated_lookup_cached_within_request_scope(self):
+        """Одинаковый поиск контакта в пределах request_scope выполняется одним запросом."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            async with client.request_scope():
+                first = await client.find_contact_by_email("user@example.com")
+                second = await client.find_contact_by_custom_field("user@example.com")
+
+        assert first == second == {"id": 3}
+        assert len(seen) == 1
+
+
+class TestFindActiveLeadMocked:
+    """Тесты поиска активной сделки."""
+
+    @pytest.mark.asyncio
+    async def test_merges_searches_and_verifies_contact(self):
+        """Результаты поисков объединяются, выбирается самая свежая сделка с контактом."""
+        pipeline_id = next(iter(ALLOWED_PIPELINES))
+        leads = {
+            10: {"id": 10, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100},
+            11: {"id": 11, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 200},
+            12: {"id": 12, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 300},
+        }
+        leads_by_query = {"123456": [leads[10], leads[11]], "79991234567": [leads[11], leads[12]]}
+        contacts_by_lead = {10: [{"id": 5}], 11: [{"id": 5}], 12: [{"id": 6}]}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if "filter[query]" in request.url.params:
+                found = leads_by_query.get(request.url.params["filter[query]"], [])
+                return httpx.Response(200, json={"_embedded": {"leads": found}})
+            lead_ids = [int(lead_id) for lead_id in request.url.params.get_list("filter[id][]")]
+            found = [{**leads[lead_id], "_embedded": {"contacts": contacts_by_lead[lead_id]}} for lead_id in lead_ids]
+            return httpx.Response(200, json={"_embedded": {"leads": found}})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_active_lead(5, telegram_id="123456", phone="+7 999 123-45-67")
+
+        assert lead is not None
+        assert lead["id"] == 11
+
+    @pytest.mark.asyncio
+    async def test_verification_error_skips_lead(self):
+        """Ошибка при проверке одной сделки не мешает выбрать другую."""
+        pipeline_id = next(iter(ALLOWED_PIPELINES))
+        leads = [
+            {"id": 20, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 500},
+            {"id": 21, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100},
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if "filter[query]" in request.url.params:
+                return httpx.Response(200, json={"_embedded": {"leads": leads}})
+            # Сделки 20 нет в ответе проверки
+            return httpx.Response(200, json={"_embedded": {"leads": [{**leads[1], "_embedded": {"contacts": [{"id": 5}]}}]}})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_active_lead(5, email="user@example.com")
+
+        assert lead is not None
+        assert lead["id"] == 21
+
+    @pytest.mark.asyncio
+    async def test_embedded_contacts_skip_verification_request(self):
+        """Если поиск вернул _embedded.contacts, сделки повторно не запрашиваются."""
+        pipeline_id = next(iter(ALLOWED_PIPELINES))
+        seen: list[httpx.Request] = []
+        leads = [
+            {"id": 30, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100, "_embedded": {"contacts": [{"id": 5}]}},
+            {"id": 31, "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 200, "_embedded": {"contacts": [{"id": 6}]}},
+        ]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={"_embedded": {"leads": leads}})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_active_lead(5, email="user@example.com")
+
+        assert lead is not None
+        assert lead["id"] == 30
+        assert len(seen) == 1
+        assert seen[0].url.params["with"] == "contacts"
+        assert sorted(map(int, seen[0].url.params.get_list("filter[pipeline_id][]"))) == sorted(ALLOWED_PIPELINES)
+
+
+class TestContactCacheMocked:
+    """Тесты кэша найденных контактов между оплатами."""
+
+    @pytest.fixture(autouse=True)
+    def contact_cache_ttl(self):
+        """Включить кэш контактов (по умолчанию отключен)."""
+        with patch("app.core.amocrm_client.settings.AMO_CONTACT_CACHE_TTL", 300):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_cached_contact_is_copy(self):
+        """Изменение полученного контакта не меняет запись в кэше."""
+        async with AmoCRMClient(transport=httpx.MockTransport(contacts_handler)) as client:
+            first = await client.find_contact_by_email("user@example.com")
+            first["name"] = "changed"
+            second = await client.find_contact_by_email("user@example.com")
+            second["id"] = 0
+
+            assert await client.find_contact_by_email("user@example.com") == {"id": 3}
+
+    @pytest.mark.asyncio
+    async def test_found_contact_cached_between_scopes(self):
+        """Повторный поиск того же значения в другой оплате берется из кэша."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            for _ in range(2):
+                async with client.request_scope():
+                    assert await client.find_contact_by_email("user@example.com") == {"id": 3}
+
+        assert len(seen) == 1
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_not_cached(self):
+        """Отсутствие контакта не кэшируется."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            assert await client.find_contact_by_email("missing@example.com") is None
+            assert await client.find_contact_by_email("missing@example.com") is None
+
+        assert len(seen) == 2
+
+    @pytest.mark.asyncio
+    async def test_update_contact_invalidates_cache(self):
+        """После обновления контакта поиск снова идет в AmoCRM."""
+        seen: list[str] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request.method)
+            if request.method == "PATCH":
+                return httpx.Response(200, json={})
+            return contacts_handler(request)
+
+        with patch("app.core.amocrm_client.settings.AMO_PATCH_COALESCE_WINDOW", 0):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                await client.find_contact_by_email("user@example.com")
+                await client.update_contact(3, name="New name")
+                await client.find_contact_by_email("user@example.com")
+
+        assert seen == ["GET", "PATCH", "GET"]
+
+    @pytest.mark.asyncio
+    async def test_zero_ttl_disables_cache(self):
+        """AMO_CONTACT_CACHE_TTL=0 отключает кэш."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return contacts_handler(request)
+
+        with patch("app.core.amocrm_client.settings.AMO_CONTACT_CACHE_TTL", 0):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                await client.find_contact_by_email("user@example.com")
+                await client.find_contact_by_email("user@example.com")
+
+        assert len(seen) == 2
+
+
+class TestContactSingleFlightMocked:
+    """Тесты объединения одновременных поисков одного значения."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_share_request(self):
+        """Одновременные поиски одного значения из разных оплат делают один GET."""
+        seen: list[httpx.Request] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            await asyncio.sleep(0.01)
+            return contacts_handler(request)
+
+        async def lookup(client: AmoCRMClient) -> dict | None:
+            async with client.request_scope():
+                return await client.find_contact_by_email("missing@example.com")
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            results = await asyncio.gather(*(lookup(client) for _ in range(3)))
+            assert client._contact_inflight == {}
+
+        assert results == [None, None, None]
+        assert len(seen) == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_lookup_does_not_use_starter_request_cache(self):
+        """Общий GET двух пересекающихся request_scope не читает и не заполняет кэш начавшей его оплаты."""
+        seen: list[httpx.Request] = []
+        release = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            if request.url.params.get("query") == "user@example.com":
+                await release.wait()
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            send_request = client._send_request
+            caches: list[object] = []
+
+            async def recording_send(method: str, endpoint: str, data: object = None) -> dict:
+                caches.append(_REQUEST_CACHE.get())
+                return await send_request(method, endpoint, data)
+
+            client._send_request = recording_send  # type: ignore[method-assign]
+
+            async def first_payment() -> tuple[dict | None, dict | None]:
+                async with client.request_scope():
+                    contact = await client.find_contact_by_email("user@example.com")
+                    # Контакт, которого нет в кэше второй оплаты
+                    other = await client.find_contact_by_phone("79991234567", phone_is_normalized=True)
+                    return contact, other
+
+            async def second_payment() -> tuple[dict | None, dict | None]:
+                async with client.request_scope():
+                    await asyncio.sleep(0.01)
+                    contact = await client.find_contact_by_email("user@example.com")
+                    # Повтор в своей области берется из своего кэша
+                    again = await client.find_contact_by_email("user@example.com")
+                    return contact, again
+
+            first, second = asyncio.create_task(first_payment()), asyncio.create_task(second_payment())
+            await asyncio.sleep(0.02)
+            release.set()
+
+            assert await first == ({"id": 3}, {"id": 2})
+            assert await second == ({"id": 3}, {"id": 3})
+
+        assert [request.url.params["query"] for request in seen] == ["user@example.com", "79991234567"]
+        # Общие GET выполняются без кэша request_scope какой-либо оплаты
+        assert caches == [None, None]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_lookup(self):
+        """Отмена одного ожидающего не прерывает поиск для остальных."""
+        seen: list[httpx.Request] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            await asyncio.sleep(0.01)
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            first = asyncio.ensure_future(client.find_contact_by_email("user@example.com"))
+            second = asyncio.ensure_future(client.find_contact_by_email("user@example.com"))
+            await asyncio.sleep(0)
+            first.cancel()
+
+            assert await second == {"id": 3}
+
+        assert len(seen) == 1
+
+    @pytest.mark.asyncio
+    async def test_lookup_cancelled_with_last_waiter(self):
+        """Отмена последнего ожидающего прерывает GET поиска."""
+        started = asyncio.Event()
+        finished: list[httpx.Request] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            started.set()
+            await asyncio.sleep(10)
+            finished.append(request)
+            return contacts_handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lookup = asyncio.ensure_future(client.find_contact_by_email("user@example.com"))
+            await started.wait()
+            lookup.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await lookup
+            await asyncio.sleep(0)
+
+            assert client._contact_inflight == {}
+            assert client._contact_waiters == {}
+
+        assert finished == []
+
+    @pytest.mark.asyncio
+    async def test_parallel_find_contact_cancels_lower_priority_lookups(self):
+        """При совпадении по tg_id незавершенные поиски по телефону и email прерываются."""
+        finished: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            query = request.url.params.get("query", "")
+            if query != "123456":
+                await asyncio.sleep(10)
+            finished.append(query)
+            return contacts_handler(request)
+
+        with patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", True):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                contact = await client.find_contact("123456", "+7 999 123-45-67", "user@example.com")
+                await asyncio.sleep(0)
+
+                assert client._contact_inflight == {}
+
+        assert contact == {"id": 1}
+        assert finished == ["123456"]
+
+    @pytest.mark.asyncio
+    async def test_parallel_find_contact_cancels_lookups_in_request_scope(self):
+        """Внутри request_scope при совпадении по tg_id GET по телефону и email тоже прерываются."""
+        finished: list[str] = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            query = request.url.params.get("query", "")
+            if query != "123456":
+                await asyncio.sleep(10)
+            finished.append(query)
+            return contacts_handler(request)
+
+        with patch("app.core.amocrm_client.settings.AMO_PARALLEL_LOOKUPS", True):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                async with client.request_scope():
+                    contact = await client.find_contact("123456", "+7 999 123-45-67", "user@example.com")
+                    await asyncio.sleep(0.01)
+
+                    assert client._contact_inflight == {}
+                    assert client._request_waiters == {}
+
+        assert contact == {"id": 1}
+        assert finished == ["123456"]
@@ -83,14 +83,14 @@ async def test_find_op_lead_by_utm() -> None:
     logger.info(f"Telegram ID: {TEST_OP_CONTACT_TG_ID}")
     logger.info(f"Phone: {TEST_OP_CONTACT_PHONE}")
     logger.info(f"Email: {TEST_OP_CONTACT_EMAIL}")
-    logger.info("Режим: is_utm_op=True (расширенный поиск в 13 воронках)")
+    logger.info("Режим: is_utm_op=True (расширенный поиск в 17 воронках)")
     logger.info("=" * 80)
 
     client = AmoCRMClient()
 
     try:
         # Расширенный поиск для utm_source=op
-        logger.info("\n1. Расширенный поиск сделки в 13 воронках...")
+        logger.info("\n1. Расширенный поиск сделки в 17 воронках...")
         logger.info("   Воронки: Сайт, Сайт TG, VK ЕГЭ, VK ОГЭ, TG ЕГЭ, TG ОГЭ,")
         logger.info("            TG БОТЫ, TG AI, TG Родители, Вебинары, 7/8 класс,")
         logger.info("            Яндекс, Партнеры")
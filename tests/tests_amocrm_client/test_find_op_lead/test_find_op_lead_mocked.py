@@ -0,0 +1,145 @@
+"""Тесты find_op_lead на подставном транспорте httpx (без реального AmoCRM)."""
+
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+from app.core.settings import settings
+
+CONTACT_ID = 5
+
+
+def make_handler(leads: dict[int, dict], leads_by_query: dict[str, list[int]], contacts_by_lead: dict[int, list[int]]):
+    """Собрать обработчик запросов: поиск контакта, поиск сделок и сделки с контактами."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/v4/contacts":
+            return httpx.Response(200, json={"_embedded": {"contacts": [{"id": CONTACT_ID}]}})
+        if "filter[query]" in request.url.params:
+            found = [leads[lead_id] for lead_id in leads_by_query.get(request.url.params["filter[query]"], [])]
+            return httpx.Response(200, json={"_embedded": {"leads": found}})
+        lead_ids = [int(lead_id) for lead_id in request.url.params.get_list("filter[id][]")]
+        found = [
+            {**leads[lead_id], "_embedded": {"contacts": [{"id": contact_id} for contact_id in contacts_by_lead[lead_id]]}}
+            for lead_id in lead_ids
+            if lead_id in contacts_by_lead
+        ]
+        return httpx.Response(200, json={"_embedded": {"leads": found}})
+
+    return handler
+
+
+class TestFindOpLeadMocked:
+    """Тесты поиска сделки для OP платежей и платежей по названию."""
+
+    @pytest.mark.asyncio
+    async def test_utm_op_selects_latest_verified_lead(self):
+        """Результаты всех поисков объединяются, выбирается самая свежая сделка контакта."""
+        pipeline_id = settings.AMO_PIPELINE_SITE
+        leads = {
+            10: {"id": 10, "name": "A", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100},
+            11: {"id": 11, "name": "B", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 300},
+            12: {"id": 12, "name": "C", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 500},
+        }
+        handler = make_handler(
+            leads,
+            leads_by_query={"123456": [10, 11], "user@example.com": [11, 12]},
+            contacts_by_lead={10: [CONTACT_ID], 11: [CONTACT_ID], 12: [6]},
+        )
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_op_lead("123456", None, "user@example.com", is_utm_op=True)
+
+        assert lead is not None
+        assert lead["id"] == 11
+
+    @pytest.mark.asyncio
+    async def test_name_scenario_filters_by_name_and_skips_errors(self):
+        """Во втором сценарии учитываются только сделки "Оплата: ...", сделки без ответа проверки пропускаются."""
+        pipeline_id = settings.AMO_PIPELINE_SITE
+        leads = {
+            20: {"id": 20, "name": "Оплата: ЕГЭ", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100},
+            21: {"id": 21, "name": "Другая сделка", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 900},
+            22: {"id": 22, "name": "Оплата: ОГЭ", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 800},
+        }
+        handler = make_handler(
+            leads,
+            leads_by_query={"123456": [20, 21, 22]},
+            contacts_by_lead={20: [CONTACT_ID], 21: [CONTACT_ID]},
+        )
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_op_lead("123456", None, None, is_utm_op=False)
+
+        assert lead is not None
+        assert lead["id"] == 20
+
+    @pytest.mark.asyncio
+    async def test_verification_batched_in_chunks(self):
+        """Проверка сделок идет одним запросом на каждые _LEADS_PAGE_LIMIT ID."""
+        pipeline_id = settings.AMO_PIPELINE_SITE
+        leads = {
+            lead_id: {"id": lead_id, "name": "A", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": lead_id}
+            for lead_id in range(1, 6)
+        }
+        handler = make_handler(
+            leads,
+            leads_by_query={"123456": list(leads)},
+            contacts_by_lead={lead_id: [CONTACT_ID] for lead_id in leads},
+        )
+        verify_requests: list[httpx.Request] = []
+
+        def counting_handler(request: httpx.Request) -> httpx.Response:
+            if "filter[id][]" in request.url.params:
+                verify_requests.append(request)
+            return handler(request)
+
+        with patch("app.core.amocrm_client._LEADS_PAGE_LIMIT", 2):
+            async with AmoCRMClient(transport=httpx.MockTransport(counting_handler)) as client:
+                lead = await client.find_op_lead("123456", None, None, is_utm_op=True)
+
+        assert lead is not None
+        assert lead["id"] == 5
+        assert sorted(len(request.url.params.get_list("filter[id][]")) for request in verify_requests) == [1, 2, 2]
+
+    @pytest.mark.asyncio
+    async def test_search_filters_pipelines_on_server(self):
+        """Поиск сделок передает допустимые воронки в filter[pipeline_id][]."""
+        search_requests: list[httpx.Request] = []
+        handler = make_handler({}, leads_by_query={}, contacts_by_lead={})
+
+        def recording_handler(request: httpx.Request) -> httpx.Response:
+            if "filter[query]" in request.url.params:
+                search_requests.append(request)
+            return handler(request)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(recording_handler)) as client:
+            assert await client.find_op_lead("123456", None, None, is_utm_op=False) is None
+
+        assert len(search_requests) == 1
+        assert sorted(search_requests[0].url.params.get_list("filter[pipeline_id][]")) == sorted(
+            [str(settings.AMO_PIPELINE_SITE), str(settings.PIPELINE_7_8_CLASS)]
+        )
+
+    @pytest.mark.asyncio
+    async def test_excluded_status_and_deleted_leads_ignored(self):
+        """Сделки в исключенных этапах и удаленные не выбираются, даже если они свежее."""
+        pipeline_id = settings.AMO_PIPELINE_SITE
+        leads = {
+            30: {"id": 30, "name": "A", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 100},
+            31: {"id": 31, "name": "B", "pipeline_id": pipeline_id, "status_id": settings.STATUS_SUCCESS, "updated_at": 900},
+            32: {"id": 32, "name": "C", "pipeline_id": pipeline_id, "status_id": 1, "updated_at": 800, "is_deleted": True},
+        }
+        handler = make_handler(
+            leads,
+            leads_by_query={"123456": [30, 31, 32]},
+            contacts_by_lead={lead_id: [CONTACT_ID] for lead_id in leads},
+        )
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            lead = await client.find_op_lead("123456", None, None, is_utm_op=True)
+
+        assert lead is not None
+        assert lead["id"] == 30
@@ -0,0 +1,245 @@
+"""Тесты HTTP слоя AmoCRMClient на подставном транспорте httpx."""
+
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+from app.core.amocrm_client import AmoCRMClient, _parse_retry_after
+from app.core.settings import settings
+
+
+class TestMakeRequest:
+    """Тесты _make_request без обращения к реальному AmoCRM."""
+
+    @pytest.mark.asyncio
+    async def test_reuses_single_http_client(self):
+        """Все запросы идут через один httpx.AsyncClient с заголовками AmoCRM."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={"id": 1})
+
+        client = AmoCRMClient(transport=httpx.MockTransport(handler))
+
+        await client._make_request("GET", "/api/v4/leads/1", data={"with": "contacts"})
+        http_client = client._client
+        await client._make_request("PATCH", "/api/v4/leads/1", data={"price": 100})
+
+        assert client._client is http_client
+        assert str(seen[0].url) == f"{settings.AMO_BASE_URL}/api/v4/leads/1?with=contacts"
+        assert seen[1].method == "PATCH"
+        assert seen[1].headers["Authorization"] == f"Bearer {settings.AMO_ACCESS_TOKEN}"
+
+        await client.aclose()
+        assert client._client is None
+
+    @pytest.mark.asyncio
+    async def test_context_manager_closes_client(self):
+        """async with закрывает HTTP клиент."""
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, json={}))
+
+        async with AmoCRMClient(transport=transport) as client:
+            await client._make_request("GET", "/api/v4/contacts")
+            http_client = client._client
+
+        assert http_client is not None and http_client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_empty_body_returns_empty_dict(self):
+        """Пустой ответ (204) возвращается как пустой dict."""
+        transport = httpx.MockTransport(lambda request: httpx.Response(204))
+
+        async with AmoCRMClient(transport=transport) as client:
+            assert await client._make_request("GET", "/api/v4/leads") == {}
+
+    @pytest.mark.asyncio
+    async def test_retries_after_rate_limit(self):
+        """Ответ 429 повторяется, следующий успешный ответ возвращается."""
+        responses = iter([httpx.Response(429), httpx.Response(200, json={"id": 7})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        with patch("app.core.amocrm_client._RETRY_WAIT", wait_none()):
+            async with AmoCRMClient(transport=transport) as client:
+                assert await client._make_request("GET", "/api/v4/leads/7") == {"id": 7}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("status_code", [500, 502, 503, 504])
+    async def test_retries_after_server_error(self, status_code: int):
+        """Временная ошибка сервера (5xx) повторяется."""
+        responses = iter([httpx.Response(status_code), httpx.Response(200, json={"id": 7})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        with patch("app.core.amocrm_client._RETRY_WAIT", wait_none()):
+            async with AmoCRMClient(transport=transport) as client:
+                assert await client._make_request("GET", "/api/v4/leads/7") == {"id": 7}
+
+    @pytest.mark.asyncio
+    async def test_post_server_error_not_retried(self):
+        """POST при 5xx не повторяется: AmoCRM мог уже создать сущность."""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(502)
+
+        with patch("app.core.amocrm_client._RETRY_WAIT", wait_none()):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                with pytest.raises(httpx.HTTPStatusError):
+                    await client._make_request("POST", "/api/v4/leads", data=[{"name": "x"}])
+
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_post_retried_after_rate_limit(self):
+        """POST при 429 повторяется: запрос не был выполнен."""
+        responses = iter([httpx.Response(429), httpx.Response(200, json={"_embedded": {"leads": [{"id": 7}]}})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        with patch("app.core.amocrm_client._RETRY_WAIT", wait_none()):
+            async with AmoCRMClient(transport=transport) as client:
+                response = await client._make_request("POST", "/api/v4/leads", data=[{"name": "x"}])
+
+        assert response == {"_embedded": {"leads": [{"id": 7}]}}
+
+    @pytest.mark.asyncio
+    async def test_http_error_not_retried(self):
+        """Ошибки 4xx (кроме 429) не повторяются и пробрасываются как есть."""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(400, json={"title": "Bad Request"})
+
+        with patch("app.core.amocrm_client._RETRY_WAIT", wait_none()):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                with pytest.raises(httpx.HTTPStatusError):
+                    await client._make_request("POST", "/api/v4/leads", data=[{"name": "x"}])
+
+        assert calls == 1
+
+    @pytest.mark.asyncio
+    async def test_honors_retry_after(self):
+        """Задержка перед повтором берется из Retry-After."""
+        responses = iter([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(200, json={})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        with patch("app.core.amocrm_client._RETRY_WAIT") as jitter:
+            async with AmoCRMClient(transport=transport) as client:
+                assert await client._make_request("GET", "/api/v4/leads") == {}
+
+        jitter.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_honors_retry_after_on_service_unavailable(self):
+        """Retry-After учитывается и в ответе 503."""
+        responses = iter([httpx.Response(503, headers={"Retry-After": "0"}), httpx.Response(200, json={})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        with patch("app.core.amocrm_client._RETRY_WAIT") as jitter:
+            async with AmoCRMClient(transport=transport) as client:
+                assert await client._make_request("GET", "/api/v4/leads") == {}
+
+        jitter.assert_not_called()
+
+    @pytest.mark.parametrize(
+        ("value", "expected"),
+        [("3", 3.0), ("-1", 0.0), ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0), ("soon", None), (None, None)],
+    )
+    def test_parse_retry_after(self, value: str | None, expected: float | None):
+        """Retry-After в секундах и в виде HTTP-даты."""
+        assert _parse_retry_after(value) == expected
+
+
+class TestRequestScope:
+    """Тесты дедупликации GET запросов внутри request_scope."""
+
+    @pytest.mark.asyncio
+    async def test_identical_gets_sent_once(self):
+        """Одинаковые GET (в том числе параллельные) уходят в API один раз."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={"id": len(seen)})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            async with client.request_scope():
+                first, second = await asyncio.gather(
+                    client._make_request("GET", "/api/v4/contacts", data={"query": "79990000000"}),
+                    client._make_request("GET", "/api/v4/contacts", data={"query": "79990000000"}),
+                )
+                third = await client._make_request("GET", "/api/v4/contacts", data={"query": "79990000000"})
+                other = await client._make_request("GET", "/api/v4/contacts", data={"query": "a@b.ru"})
+
+        assert first == second == third == {"id": 1}
+        assert other == {"id": 2}
+        assert len(seen) == 2
+
+    @pytest.mark.asyncio
+    async def test_write_invalidates_cache(self):
+        """POST/PATCH сбрасывает кэш, следующий GET идет в API."""
+        seen: list[str] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request.method)
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            async with client.request_scope():
+                await client._make_request("GET", "/api/v4/leads/1")
+                await client._make_request("PATCH", "/api/v4/leads/1", data={"price": 1})
+                await client._make_request("GET", "/api/v4/leads/1")
+
+        assert seen == ["GET", "PATCH", "GET"]
+
+    @pytest.mark.asyncio
+    async def test_write_keeps_cache_of_unrelated_collection(self):
+        """Запись в задачи не сбрасывает кэш сделок, запись в контакты - сбрасывает."""
+        seen: list[str] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(f"{request.method} {request.url.path}")
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            async with client.request_scope():
+                await client._make_request("GET", "/api/v4/leads/1")
+                await client._make_request("POST", "/api/v4/tasks", data=[{"text": "x"}])
+                await client._make_request("GET", "/api/v4/leads/1")
+                await client._make_request("PATCH", "/api/v4/contacts/2", data={"name": "y"})
+                await client._make_request("GET", "/api/v4/leads/1")
+
+        assert seen == ["GET /api/v4/leads/1", "POST /api/v4/tasks", "PATCH /api/v4/contacts/2", "GET /api/v4/leads/1"]
+
+    @pytest.mark.asyncio
+    async def test_no_cache_outside_scope(self):
+        """Вне request_scope каждый GET уходит в API."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client._make_request("GET", "/api/v4/leads/1")
+            await client._make_request("GET", "/api/v4/leads/1")
+
+        assert len(seen) == 2
+
+    @pytest.mark.asyncio
+    async def test_errors_not_cached(self):
+        """Ошибочный ответ не кэшируется, повторный GET идет в API."""
+        responses = iter([httpx.Response(400), httpx.Response(200, json={"id": 1})])
+        transport = httpx.MockTransport(lambda request: next(responses))
+
+        async with AmoCRMClient(transport=transport) as client:
+            async with client.request_scope():
+                with pytest.raises(httpx.HTTPStatusError):
+                    await client._make_request("GET", "/api/v4/leads/1")
+                assert await client._make_request("GET", "/api/v4/leads/1") == {"id": 1}
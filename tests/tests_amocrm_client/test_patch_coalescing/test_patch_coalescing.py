@@ -0,0 +1,117 @@
+"""Тесты объединения PATCH запросов сделок и контактов из параллельных оплат."""
+
+import asyncio
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+
+
+class TestPatchCoalescing:
+    """Тесты _patch_entity и _PatchCoalescer на подставном транспорте httpx."""
+
+    @pytest.fixture(autouse=True)
+    def coalesce_window(self):
+        """Включить объединение PATCH (по умолчанию отключено)."""
+        with patch("app.core.amocrm_client.settings.AMO_PATCH_COALESCE_WINDOW", 0.02):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_same_entity_updates_sent_in_order(self):
+        """Обновления одной сделки не попадают в один PATCH и уходят в порядке поступления."""
+        seen: list[list[dict]] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(json.loads(request.content))
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await asyncio.gather(
+                client.update_lead(1, price=100),
+                client.update_lead(2, price=200),
+                client.update_lead(1, price=300),
+            )
+
+        assert [sorted(lead["id"] for lead in body) for body in seen] == [[1, 2], [1]]
+        assert seen[1] == [{"id": 1, "price": 300}]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_updates_sent_in_one_request(self):
+        """Параллельные обновления сделок уходят одним PATCH /api/v4/leads."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await asyncio.gather(*(client.update_lead(lead_id, price=lead_id * 100) for lead_id in (1, 2, 3)))
+
+        assert len(seen) == 1
+        assert seen[0].url.path == "/api/v4/leads"
+        body = json.loads(seen[0].content)
+        assert sorted(body, key=lambda lead: lead["id"]) == [
+            {"id": 1, "price": 100},
+            {"id": 2, "price": 200},
+            {"id": 3, "price": 300},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_contact_updates_sent_in_one_request(self):
+        """Параллельные update_contact уходят одним PATCH /api/v4/contacts."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await asyncio.gather(*(client.update_contact(contact_id, name=f"c{contact_id}") for contact_id in (1, 2)))
+
+        assert len(seen) == 1
+        assert seen[0].url.path == "/api/v4/contacts"
+        body = json.loads(seen[0].content)
+        assert sorted(body, key=lambda contact: contact["id"]) == [{"id": 1, "name": "c1"}, {"id": 2, "name": "c2"}]
+
+    @pytest.mark.asyncio
+    async def test_rejected_batch_retried_one_by_one(self):
+        """Отклоненный батч отправляется по одной сущности, ошибка достается только виновнику."""
+        seen: list[list[dict]] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            seen.append(body)
+            if any(lead["id"] == 2 for lead in body):
+                return httpx.Response(400, json={"title": "Bad Request"})
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            results = await asyncio.gather(
+                client.update_lead(1, price=100),
+                client.update_lead(2, price=200),
+                return_exceptions=True,
+            )
+
+        assert results[0] is None
+        assert isinstance(results[1], httpx.HTTPStatusError)
+        assert len(seen) == 3
+        assert len(seen[0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_zero_window_sends_per_entity(self):
+        """При нулевом окне каждая сделка обновляется отдельным PATCH /api/v4/leads/{id}."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        with patch("app.core.amocrm_client.settings.AMO_PATCH_COALESCE_WINDOW", 0):
+            async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+                await asyncio.gather(client.update_lead(1, price=100), client.update_lead(2, price=200))
+
+        assert sorted(request.url.path for request in seen) == ["/api/v4/leads/1", "/api/v4/leads/2"]
+
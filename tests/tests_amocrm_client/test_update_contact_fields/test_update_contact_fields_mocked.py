@@ -0,0 +1,84 @@
+"""Тесты обновления полей контакта на подставном транспорте httpx (без реального AmoCRM)."""
+
+import json
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+from app.core.settings import settings
+
+
+class TestUpdateContactFieldsMocked:
+    """Тесты пропуска лишних запросов в update_contact_fields."""
+
+    @pytest.mark.asyncio
+    async def test_nothing_to_update_skips_requests(self):
+        """Без данных для обновления запросы к API не выполняются."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_contact_fields(contact_id=1)
+
+        assert seen == []
+
+    @pytest.mark.asyncio
+    async def test_known_fields_skip_get(self):
+        """Переданные known_fields используются вместо GET контакта."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        known_fields = [{"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": "111"}]}]
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_contact_fields(
+                contact_id=1, tg_id="222", tg_username="user", known_fields=known_fields
+            )
+
+        assert [request.method for request in seen] == ["PATCH"]
+        fields = json.loads(seen[0].content)["custom_fields_values"]
+        assert fields == [{"field_id": settings.AMO_CONTACT_FIELD_TG_USERNAME, "values": [{"value": "user"}]}]
+
+    @pytest.mark.asyncio
+    async def test_filled_fields_not_patched(self):
+        """Если все поля уже заполнены, выполняется только GET."""
+        seen: list[httpx.Request] = []
+        contact = {
+            "custom_fields_values": [
+                {"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": "111"}]},
+                {"field_id": 0, "field_code": "EMAIL", "values": [{"value": "a@b.ru"}]},
+            ]
+        }
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json=contact)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_contact_fields(contact_id=1, tg_id="222", email="c@d.ru")
+
+        assert [request.method for request in seen] == ["GET"]
+
+    @pytest.mark.asyncio
+    async def test_empty_field_values_treated_as_unset(self):
+        """Поле без значений считается пустым и заполняется."""
+        seen: list[httpx.Request] = []
+        contact = {"custom_fields_values": [{"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": []}]}
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json=contact)
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_contact_fields(contact_id=1, tg_id="222")
+
+        assert [request.method for request in seen] == ["GET", "PATCH"]
+        fields = json.loads(seen[1].content)["custom_fields_values"]
+        assert fields == [{"field_id": settings.AMO_CONTACT_FIELD_TG_ID, "values": [{"value": "222"}]}]
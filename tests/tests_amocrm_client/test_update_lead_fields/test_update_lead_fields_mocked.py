@@ -0,0 +1,54 @@
+"""Тесты обновления полей сделки на подставном транспорте httpx (без реального AmoCRM)."""
+
+import json
+
+import httpx
+import pytest
+
+from app.core.amocrm_client import AmoCRMClient
+from app.core.settings import settings
+
+
+class TestUpdateLeadFieldsMocked:
+    """Тесты сборки PATCH в update_lead_fields."""
+
+    @pytest.mark.asyncio
+    async def test_text_fields_and_purchase_count(self):
+        """Непустые текстовые поля попадают в PATCH, счетчик покупок увеличивается."""
+        seen: list[httpx.Request] = []
+        lead = {
+            "id": 1,
+            "custom_fields_values": [{"field_id": settings.AMO_LEAD_FIELD_PURCHASE_COUNT, "values": [{"value": "2"}]}],
+        }
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json=lead if request.method == "GET" else {})
+
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_lead_fields(1, utm_source="op", utm_medium="", ym_uid="42", domain="site.ru")
+
+        assert [request.method for request in seen] == ["GET", "PATCH"]
+        fields = {field["field_id"]: field["values"] for field in json.loads(seen[1].content)["custom_fields_values"]}
+        assert fields[settings.AMO_LEAD_FIELD_PURCHASE_COUNT] == [{"value": 3}]
+        assert fields[settings.AMO_LEAD_FIELD_UTM_SOURCE] == [{"value": "op"}]
+        assert fields[settings.AMO_LEAD_FIELD_YM_UID] == [{"value": "42"}]
+        assert fields[settings.AMO_LEAD_FIELD_REFERRER] == [{"value": "site.ru"}]
+        assert settings.AMO_LEAD_FIELD_UTM_MEDIUM not in fields
+
+    @pytest.mark.asyncio
+    async def test_known_fields_skip_lead_get(self):
+        """Переданные поля сделки используются без GET, счетчик считается от них."""
+        seen: list[httpx.Request] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            seen.append(request)
+            return httpx.Response(200, json={})
+
+        known_fields = [{"field_id": settings.AMO_LEAD_FIELD_PURCHASE_COUNT, "values": [{"value": "4"}]}]
+        async with AmoCRMClient(transport=httpx.MockTransport(handler)) as client:
+            await client.update_lead_fields(1, purchased_subjects_count=2, known_fields=known_fields)
+
+        assert [request.method for request in seen] == ["PATCH"]
+        fields = {field["field_id"]: field["values"] for field in json.loads(seen[0].content)["custom_fields_values"]}
+        assert fields[settings.AMO_LEAD_FIELD_PURCHASE_COUNT] == [{"value": 6}]
@@ -0,0 +1,33 @@
+"""Тесты определения направления и типа курса по названию."""
+
+from app.core.amocrm_mappings import get_course_type_enum_id, get_direction_enum_id_by_course_name
+from app.core.settings import settings
+
+
+class TestDirectionByCourseName:
+    """Тесты get_direction_enum_id_by_course_name."""
+
+    def test_priorities(self):
+        """Марафон важнее класса, годовой курс и весенний курс выбирают enum по классу."""
+        assert get_direction_enum_id_by_course_name("Марафон 2к26 ЕГЭ 11 класс") == settings.AMO_DIRECTION_MARATHON_2026
+        assert get_direction_enum_id_by_course_name("Годовой курс 2к27 10 класс") == settings.AMO_DIRECTION_ANNUAL_2027_CLASS_10
+        assert get_direction_enum_id_by_course_name("Весенний курс 2к26 9 класс") == settings.AMO_DIRECTION_CLASS_9
+        assert get_direction_enum_id_by_course_name("Математика 7 класс 2к26") == settings.AMO_DIRECTION_CLASS_7
+
+    def test_unknown_course(self):
+        """Старые и неизвестные курсы не определяют направление."""
+        assert get_direction_enum_id_by_course_name("Годовой курс 2к27") is None
+        assert get_direction_enum_id_by_course_name("Интенсив по химии") is None
+
+
+class TestCourseTypeByCourseName:
+    """Тесты get_course_type_enum_id."""
+
+    def test_new_courses(self):
+        """Для новых курсов PRO определяется по названию, иначе Standart."""
+        assert get_course_type_enum_id("Марафон PRO") == settings.AMO_COURSE_TYPE_PRO
+        assert get_course_type_enum_id("Весенний курс 2к26 11 класс") == settings.AMO_COURSE_TYPE_STANDART
+
+    def test_old_course(self):
+        """Для старых курсов тип не заполняется."""
+        assert get_course_type_enum_id("Интенсив по химии") is None
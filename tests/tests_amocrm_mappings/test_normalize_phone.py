@@ -0,0 +1,25 @@
+"""Тесты нормализации телефона."""
+
+import pytest
+
+from app.core.amocrm_mappings import normalize_phone
+
+
+class TestNormalizePhone:
+    """Тесты normalize_phone."""
+
+    @pytest.mark.parametrize(
+        ("phone", "expected"),
+        [
+            ("+7 (987) 672-60-10", "79876726010"),
+            ("+79876726010", "79876726010"),
+            ("8 (987) 672-60-10", "79876726010"),
+            ("9876726010", "79876726010"),
+            ("тел. 8 987 672 60 10", "79876726010"),
+            ("нет номера", "нет номера"),
+            ("", ""),
+        ],
+    )
+    def test_normalize(self, phone: str, expected: str):
+        """Все форматы приводятся к 7XXXXXXXXXX, строка без цифр возвращается как есть."""
+        assert normalize_phone(phone) == expected
@@ -0,0 +1,19 @@
+"""Тесты поиска enum_id предметов по названию."""
+
+from app.core.amocrm_mappings import SUBJECTS_MAPPING, get_subject_enum_id, get_subject_enum_ids
+
+
+class TestSubjectEnumIds:
+    """Тесты get_subject_enum_id и get_subject_enum_ids."""
+
+    def test_exact_names(self):
+        """Точные названия находятся как в SUBJECTS_MAPPING."""
+        assert all(get_subject_enum_id(name) == enum_id for name, enum_id in SUBJECTS_MAPPING.items())
+
+    def test_case_and_spaces_ignored(self):
+        """Регистр, лишние и неразрывные пробелы не мешают поиску."""
+        assert get_subject_enum_id("  биология\u00a0 ОГЭ ") == SUBJECTS_MAPPING["Биология ОГЭ"]
+
+    def test_unknown_subjects_skipped(self):
+        """Неизвестные предметы пропускаются."""
+        assert get_subject_enum_ids(["Химия", "Астрология"]) == [SUBJECTS_MAPPING["Химия"]]
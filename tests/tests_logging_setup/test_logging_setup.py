@@ -0,0 +1,30 @@
+"""Тесты настройки логирования через очередь."""
+
+import logging
+from logging.handlers import QueueHandler
+
+from app.core.logging_setup import setup_logging
+
+
+class TestSetupLogging:
+    """Тесты setup_logging."""
+
+    def test_root_logs_through_queue(self):
+        """Корневой логгер пишет через QueueHandler, listener запущен."""
+        listener = setup_logging("INFO")
+
+        root = logging.getLogger()
+        assert any(isinstance(handler, QueueHandler) for handler in root.handlers)
+        assert listener._thread is not None  # type: ignore[attr-defined]
+
+    def test_repeated_setup_reuses_listener(self):
+        """Повторный вызов меняет уровень, но не создает второй listener и handler."""
+        first = setup_logging("INFO")
+        second = setup_logging("WARNING")
+
+        root = logging.getLogger()
+        assert first is second
+        assert root.level == logging.WARNING
+        assert sum(isinstance(handler, QueueHandler) for handler in root.handlers) == 1
+
+        setup_logging("INFO")
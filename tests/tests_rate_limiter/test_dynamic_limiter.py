@@ -0,0 +1,79 @@
+"""Тесты DynamicLimiter."""
+
+import asyncio
+
+import pytest
+
+from app.core.rate_limiter import AdaptiveLimiter, DynamicLimiter
+
+
+class TestDynamicLimiter:
+    """Тесты ограничения параллельности с изменяемым лимитом."""
+
+    @pytest.mark.asyncio
+    async def test_limits_in_flight(self):
+        """Одновременно работает не больше max_concurrency задач."""
+        limiter = DynamicLimiter(2)
+        peak = 0
+
+        async def task() -> None:
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*[task() for _ in range(6)])
+
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_set_max_releases_waiters(self):
+        """Увеличение лимита пропускает ожидающие задачи."""
+        limiter = DynamicLimiter(1)
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        await limiter.set_max(2)
+        await asyncio.wait_for(waiter, timeout=1)
+
+        assert limiter.in_flight == 2
+
+    def test_invalid_limit(self):
+        """Лимит меньше 1 отклоняется."""
+        with pytest.raises(ValueError):
+            DynamicLimiter(0)
+
+
+class TestAdaptiveLimiter:
+    """Тесты автоматической подстройки лимита по ответам 429."""
+
+    @pytest.mark.asyncio
+    async def test_halves_on_rate_limit_and_recovers(self):
+        """Частые 429 уменьшают лимит вдвое, серия успехов возвращает его."""
+        limiter = AdaptiveLimiter(8, window=10, threshold=0.1, recover_after=3)
+
+        await limiter.record(False)
+        await limiter.record(True)
+        assert limiter.max_concurrency == 4
+
+        for _ in range(3):
+            await limiter.record(False)
+        assert limiter.max_concurrency == 5
+
+        for _ in range(30):
+            await limiter.record(False)
+        assert limiter.max_concurrency == 8
+
+    @pytest.mark.asyncio
+    async def test_never_below_one(self):
+        """Лимит не опускается ниже 1."""
+        limiter = AdaptiveLimiter(2, window=1, threshold=0.0)
+
+        for _ in range(5):
+            await limiter.record(True)
+
+        assert limiter.max_concurrency == 1
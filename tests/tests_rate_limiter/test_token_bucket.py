@@ -0,0 +1,58 @@
+"""Тесты AsyncTokenBucket."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.rate_limiter import AsyncTokenBucket
+
+
+class TestAsyncTokenBucket:
+    """Тесты ограничения частоты через token bucket."""
+
+    @pytest.mark.asyncio
+    async def test_burst_up_to_capacity_is_immediate(self):
+        """Запросы в пределах capacity не ждут."""
+        bucket = AsyncTokenBucket(rate=5, capacity=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+
+        assert time.monotonic() - start < 0.1
+
+    @pytest.mark.asyncio
+    async def test_waits_for_refill_when_empty(self):
+        """После исчерпания bucket запрос ждет пополнения."""
+        bucket = AsyncTokenBucket(rate=20, capacity=1)
+        await bucket.acquire()
+
+        start = time.monotonic()
+        await bucket.acquire()
+
+        assert time.monotonic() - start >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_concurrent_acquires_respect_rate(self):
+        """Параллельные запросы не превышают заданную скорость."""
+        bucket = AsyncTokenBucket(rate=50, capacity=1)
+
+        start = time.monotonic()
+        await asyncio.gather(*[bucket.acquire() for _ in range(6)])
+
+        # Первый токен есть сразу, остальные 5 приходят по 1/50 сек
+        assert time.monotonic() - start >= 0.09
+
+    def test_invalid_rate(self):
+        """Неположительная скорость отклоняется."""
+        with pytest.raises(ValueError):
+            AsyncTokenBucket(rate=0)
+
+    @pytest.mark.asyncio
+    async def test_acquire_more_than_capacity(self):
+        """Запрос больше capacity отклоняется."""
+        bucket = AsyncTokenBucket(rate=1, capacity=2)
+
+        with pytest.raises(ValueError):
+            await bucket.acquire(3)
@@ -0,0 +1,189 @@
+"""Тесты batch endpoint /webhook/payment-batch (валидация без обращения к AmoCRM)."""
+
+import asyncio
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.webhook_payment import _BATCH_JOBS, limiter, process_payment_batch_parallel, run_payment_batch_job
+from app.models.payment_webhook import PaymentWebhook
+from app.services.payment_processor import ProcessResult
+
+
+@pytest.fixture
+def real_webhook_data() -> dict:
+    """Загрузить реальные данные из amo.json."""
+    json_path = Path(__file__).parent / "amo.json"
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def client() -> TestClient:
+    """FastAPI TestClient со сброшенными счетчиками rate limit."""
+    limiter.reset()
+    return TestClient(app)
+
+
+class TestPaymentBatch:
+    """Тесты приема и валидации батча оплат."""
+
+    def test_batch_accepted(self, client: TestClient, real_webhook_data: dict):
+        """Валидный батч принимается и передается в фоновую обработку."""
+        body = json.dumps([real_webhook_data, real_webhook_data]).encode("utf-8")
+
+        with patch("app.api.webhook_payment.process_payment_batch_parallel") as mock_batch:
+            response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 202
+        assert response.json()["total"] == 2
+
+        payments = mock_batch.call_args[0][0]
+        assert len(payments) == 2
+        assert all(isinstance(payment, PaymentWebhook) for payment in payments)
+
+    def test_batch_rejects_single_object(self, client: TestClient, real_webhook_data: dict):
+        """Одиночный объект вместо массива отклоняется."""
+        body = json.dumps(real_webhook_data).encode("utf-8")
+
+        response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 400
+        assert "Expected array of payments" in response.json()["detail"]
+
+    def test_batch_rejects_invalid_item(self, client: TestClient, real_webhook_data: dict):
+        """Невалидный элемент батча отклоняет весь батч."""
+        body = json.dumps([real_webhook_data, {"course_order": {}}]).encode("utf-8")
+
+        response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 400
+        assert "Validation error" in response.json()["detail"]
+
+    def test_batch_rejects_invalid_json(self, client: TestClient):
+        """Некорректный JSON отклоняется."""
+        response = client.post("/webhook/payment-batch", content=b"[{")
+
+        assert response.status_code == 400
+        assert "Invalid JSON" in response.json()["detail"]
+
+
+class TestProcessPaymentBatchParallel:
+    """Тесты фоновой обработки батча пулом воркеров."""
+
+    @pytest.mark.asyncio
+    async def test_counts_all_statuses(self, real_webhook_data: dict):
+        """Каждая оплата обработана ровно один раз, статусы посчитаны."""
+        payments = [PaymentWebhook(**real_webhook_data) for _ in range(40)]
+        statuses = ["success", "duplicate", "skipped", "error"] * 10
+
+        processor = MagicMock()
+        processor.process_payment = AsyncMock(side_effect=[ProcessResult(status=s) for s in statuses])
+
+        result = await process_payment_batch_parallel(payments, processor)
+
+        assert processor.process_payment.await_count == 40
+        assert result["total"] == 40
+        assert result["succeeded"] == 10
+        assert result["duplicates"] == 10
+        assert result["skipped"] == 10
+        assert result["failed"] == 10
+        assert [r["status"] for r in result["results"]] == statuses
+
+    @pytest.mark.asyncio
+    async def test_processor_exception_counted_as_failed(self, real_webhook_data: dict):
+        """Исключение процессора не останавливает батч."""
+        payments = [PaymentWebhook(**real_webhook_data) for _ in range(3)]
+
+        processor = MagicMock()
+        processor.process_payment = AsyncMock(
+            side_effect=[ProcessResult(status="success"), RuntimeError("boom"), ProcessResult(status="success")]
+        )
+
+        result = await process_payment_batch_parallel(payments, processor)
+
+        assert result["succeeded"] == 2
+        assert result["failed"] == 1
+        assert [r["status"] for r in result["results"]] == ["success", "error", "success"]
+        assert result["results"][1]["error"] == "boom"
+
+
+class TestPaymentBatchSizeLimit:
+    """Тесты ограничения размера тела батча."""
+
+    def test_batch_body_over_limit(self, client: TestClient, real_webhook_data: dict):
+        """Батч больше лимита отклоняется с 413."""
+        body = json.dumps([real_webhook_data] * 3).encode("utf-8")
+
+        with patch("app.api.webhook_payment._MAX_BATCH_BODY_BYTES", len(body) - 1):
+            response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 413
+
+
+class TestPaymentBatchLargeValidation:
+    """Тесты валидации больших батчей вне event loop."""
+
+    def test_large_batch_validated_in_thread(self, client: TestClient, real_webhook_data: dict):
+        """Большой батч валидируется в отдельном потоке и принимается."""
+        body = json.dumps([real_webhook_data] * 25).encode("utf-8")
+
+        with (
+            patch("app.api.webhook_payment.process_payment_batch_parallel") as mock_batch,
+            patch("app.api.webhook_payment.asyncio.to_thread", wraps=asyncio.to_thread) as mock_to_thread,
+        ):
+            response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 202
+        assert response.json()["total"] == 25
+        mock_to_thread.assert_called_once()
+        assert len(mock_batch.call_args[0][0]) == 25
+
+    def test_large_batch_invalid_item(self, client: TestClient, real_webhook_data: dict):
+        """Ошибка валидации из потока возвращается как 400."""
+        body = json.dumps([real_webhook_data] * 20 + [{"course_order": {}}]).encode("utf-8")
+
+        response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 400
+        assert "Validation error" in response.json()["detail"]
+
+
+class TestPaymentBatchLimits:
+    """Тесты ограничения входящих batch запросов."""
+
+    def test_batch_rate_limited_per_ip(self, client: TestClient, real_webhook_data: dict):
+        """Запросы сверх лимита с одного IP получают 429."""
+        body = json.dumps([real_webhook_data]).encode("utf-8")
+
+        with patch("app.api.webhook_payment.process_payment_batch_parallel"):
+            statuses = [client.post("/webhook/payment-batch", content=body).status_code for _ in range(6)]
+
+        assert statuses[:5] == [202] * 5
+        assert statuses[5] == 429
+
+    def test_batch_rejected_when_jobs_busy(self, client: TestClient, real_webhook_data: dict):
+        """Если все слоты batch задач заняты, новый батч получает 429."""
+        body = json.dumps([real_webhook_data]).encode("utf-8")
+
+        with patch("app.api.webhook_payment._BATCH_JOBS") as mock_jobs:
+            mock_jobs.locked.return_value = True
+            response = client.post("/webhook/payment-batch", content=body)
+
+        assert response.status_code == 429
+        assert "Too many batch jobs" in response.json()["detail"]
+
+    @pytest.mark.asyncio
+    async def test_job_slot_released_when_job_raises(self):
+        """Слот batch задачи освобождается, даже если обработка батча упала."""
+        with patch(
+            "app.api.webhook_payment.process_payment_batch_parallel", AsyncMock(side_effect=RuntimeError("boom"))
+        ):
+            for _ in range(3):
+                await run_payment_batch_job([], MagicMock())
+
+        assert not _BATCH_JOBS.locked()
@@ -9,6 +9,7 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 
+from app.api.webhook_payment import get_payment_processor, limiter, verify_hmac_signature
 from app.main import app
 from app.core.settings import settings
 
@@ -39,10 +40,20 @@ def valid_signature(real_webhook_body: bytes) -> str:
 
 @pytest.fixture
 def client() -> TestClient:
-    """FastAPI TestClient."""
+    """FastAPI TestClient со сброшенными счетчиками rate limit."""
+    limiter.reset()
     return TestClient(app)
 
 
+@pytest.fixture
+def mock_processor():
+    """Подменить PaymentProcessor в dependency injection."""
+    processor = AsyncMock()
+    app.dependency_overrides[get_payment_processor] = lambda: processor
+    yield processor
+    app.dependency_overrides.pop(get_payment_processor, None)
+
+
 class TestWebhookSignature:
     """Тесты проверки HMAC-подписи с реальными данными из amo.json."""
 
@@ -59,36 +70,53 @@ class TestWebhookSignature:
         assert all(c in "0123456789abcdef" for c in calculated_signature)
 
     def test_webhook_with_valid_signature_mocked(
-        self, client: TestClient, real_webhook_body: bytes, valid_signature: str
+        self, client: TestClient, real_webhook_body: bytes, valid_signature: str, mock_processor: AsyncMock
     ):
         """Проверить, что webhook с валидной подписью проходит аутентификацию (мокируем AmoCRM)."""
-        with patch("app.api.webhook_payment.PaymentProcessor") as mock_processor_class:
-            mock_processor = AsyncMock()
-            mock_processor.process_payment.return_value = AsyncMock(
-                status="success",
-                message="Payment processed successfully",
-                contact_id=60000001,
-                lead_id=40000001,
-                error=None,
-            )
-            mock_processor_class.return_value = mock_processor
+        mock_processor.process_payment.return_value = AsyncMock(
+            status="success",
+            message="Payment processed successfully",
+            contact_id=60000001,
+            lead_id=40000001,
+            error=None,
+        )
 
-            response = client.post(
-                "/webhook/payment",
-                content=real_webhook_body,
-                headers={
-                    "X-WEBHOOK-SECRET": valid_signature,
-                    "Content-Type": "application/json",
-                },
-            )
+        response = client.post(
+            "/webhook/payment",
+            content=real_webhook_body,
+            headers={
+                "X-WEBHOOK-SECRET": valid_signature,
+                "Content-Type": "application/json",
+            },
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "success"
+        assert "payment_id" in data
+        assert data["payment_id"] == "7166790691"
+
+        mock_processor.process_payment.assert_called_once()
+
+    def test_webhook_accepted_for_background_processing(
+        self, client: TestClient, real_webhook_body: bytes, valid_signature: str, mock_processor: AsyncMock
+    ):
+        """Проверить, что с ?async=1 оплата принимается с 202 и обрабатывается в фоне."""
+        mock_processor.process_payment.return_value = AsyncMock(status="success", error=None)
+
+        response = client.post(
+            "/webhook/payment?async=1",
+            content=real_webhook_body,
+            headers={
+                "X-WEBHOOK-SECRET": valid_signature,
+                "Content-Type": "application/json",
+            },
+        )
 
-            assert response.status_code == 200
-            data = response.json()
-            assert data["status"] == "success"
-            assert "payment_id" in data
-            assert data["payment_id"] == "7166790691"
+        assert response.status_code == 202
+        assert response.json() == {"status": "accepted", "payment_id": "7166790691"}
 
-            mock_processor.process_payment.assert_called_once()
+        mock_processor.process_payment.assert_called_once()
 
     def test_webhook_with_invalid_signature(
         self, client: TestClient, real_webhook_body: bytes
@@ -119,14 +147,15 @@ class TestWebhookSignature:
         assert response.status_code == 401
         assert "Missing X-WEBHOOK-SECRET header" in response.json()["detail"]
 
-    def test_signature_is_case_sensitive(
-        self, client: TestClient, real_webhook_body: bytes, valid_signature: str
+    def test_signature_is_case_insensitive(
+        self, client: TestClient, real_webhook_body: bytes, valid_signature: str, mock_processor: AsyncMock
     ):
-        """Проверить, что подпись чувствительна к регистру."""
+        """Проверить, что hex подпись принимается в любом регистре."""
+        mock_processor.process_payment.return_value = AsyncMock(status="success", error=None)
         uppercase_signature = valid_signature.upper()
 
         response = client.post(
-            "/webhook/payment",
+            "/webhook/payment?async=1",
             content=real_webhook_body,
             headers={
                 "X-WEBHOOK-SECRET": uppercase_signature,
@@ -134,7 +163,7 @@ class TestWebhookSignature:
             },
         )
 
-        assert response.status_code == 401
+        assert response.status_code == 202
 
     def test_signature_changes_with_body_modification(
         self, real_webhook_data: dict, valid_signature: str
@@ -226,3 +255,50 @@ class TestWebhookSignature:
         print(f"Pretty signature:  {pretty_sig}")
         print(f"Unicode signature: {unicode_sig}")
 
+    @pytest.mark.parametrize("key", [b"", b"short", b"k" * 64, b"long" * 40])
+    def test_verify_hmac_signature_matches_hmac_new(self, real_webhook_body: bytes, key: bytes):
+        """Проверить, что клон закэшированного HMAC дает ту же подпись, что и hmac.new."""
+
+        signature = hmac.new(key=key, msg=real_webhook_body, digestmod=hashlib.sha256).hexdigest()
+
+        assert verify_hmac_signature(real_webhook_body, signature, key)
+        assert not verify_hmac_signature(real_webhook_body + b" ", signature, key)
+
+    def test_oversized_body_rejected(self, client: TestClient):
+        """Тело больше лимита отклоняется с 413 до проверки подписи."""
+        body = b"{" + b" " * (256 * 1024) + b"}"
+
+        response = client.post("/webhook/payment", content=body, headers={"X-WEBHOOK-SECRET": "0" * 64})
+
+        assert response.status_code == 413
+
+    @pytest.mark.parametrize("signature", ["zz" * 32, "abc", "", "a" * 66, "ab " * 21 + "a"])
+    def test_verify_hmac_signature_rejects_malformed(self, real_webhook_body: bytes, signature: str):
+        """Подпись, не являющаяся hex строкой, отклоняется без исключений."""
+        assert verify_hmac_signature(real_webhook_body, signature, settings.WEBHOOK_SECRET.encode("utf-8")) is False
+
+    def test_malformed_signature_rejected_before_body(self, client: TestClient, real_webhook_body: bytes):
+        """Подпись неверной длины отклоняется до хеширования тела."""
+        with patch("app.api.webhook_payment.new_hmac") as mock_hmac:
+            response = client.post(
+                "/webhook/payment",
+                content=real_webhook_body,
+                headers={"X-WEBHOOK-SECRET": "deadbeef"},
+            )
+
+        assert response.status_code == 401
+        assert "Invalid HMAC signature" in response.json()["detail"]
+        mock_hmac.assert_not_called()
+
+    @pytest.mark.parametrize(
+        ("body", "detail"),
+        [(b'{"course_order": ', "Invalid JSON"), (b'{"course_order": {}}', "Validation error")],
+    )
+    def test_invalid_payload_with_valid_signature(self, client: TestClient, body: bytes, detail: str):
+        """Некорректный JSON и невалидные данные с верной подписью возвращают 400."""
+        signature = hmac.new(settings.WEBHOOK_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+        response = client.post("/webhook/payment", content=body, headers={"X-WEBHOOK-SECRET": signature})
+
+        assert response.status_code == 400
+        assert detail in response.json()["detail"]